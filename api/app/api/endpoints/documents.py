@@ -4,13 +4,15 @@ Document endpoints for the DocuAgent API.
 This module provides API endpoints for document operations.
 """
 
-import json
 import os
+import shutil
 import uuid
 from datetime import datetime
 from typing import Any, List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.api.dependencies.auth import get_api_key
@@ -26,6 +28,21 @@ from app.services.document_processor import process_document, get_processing_sta
 
 router = APIRouter()
 
+# Size of the chunks uploads are copied to disk in
+UPLOAD_COPY_CHUNK_BYTES = 1 << 20
+
+
+def _save_upload(file: UploadFile, file_path: str) -> None:
+    """
+    Copy an uploaded file to disk in large chunks, without reading it whole.
+
+    Args:
+        file: The uploaded file.
+        file_path: Path to save the file to.
+    """
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f, UPLOAD_COPY_CHUNK_BYTES)
+
 
 @router.post("/upload", response_model=DocumentSchema, status_code=status.HTTP_201_CREATED)
 async def upload_document(
@@ -52,8 +69,8 @@ async def upload_document(
     options_dict = {}
     if options:
         try:
-            options_dict = json.loads(options)
-        except json.JSONDecodeError:
+            options_dict = orjson.loads(options)
+        except orjson.JSONDecodeError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid options JSON",
@@ -77,8 +94,7 @@ async def upload_document(
 
     # Save the uploaded file
     file_path = os.path.join(settings.UPLOAD_FOLDER, f"{document_id}_{file.filename}")
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    await run_in_threadpool(_save_upload, file, file_path)
 
     # Create document in database
     db_document = Document(
@@ -96,15 +112,14 @@ async def upload_document(
     # Process document asynchronously
     from app.services.document_processor import process_document_async
 
-    job_id = await process_document_async(
+    # Reuse this request's session, which also records the job ID on the document
+    await process_document_async(
         document_path=file_path,
         template_id=template.id if template else None,
         options=options_dict,
+        db=db,
+        document=db_document,
     )
-
-    # Update document with job ID
-    db_document.job_id = job_id
-    db.commit()
     db.refresh(db_document)
 
     return db_document
@@ -159,7 +174,7 @@ async def get_job_status(
         Dict: The job status.
     """
     # Get job status
-    job_status = await get_processing_status(job_id)
+    job_status = await get_processing_status(job_id, db=db)
 
     # Check if job exists
     if job_status["status"] == "not_found":
@@ -223,10 +238,10 @@ def get_document_results(
         try:
             return {
                 "document_id": document_id,
-                "extraction_results": json.loads(document.extraction_results),
+                "extraction_results": orjson.loads(document.extraction_results),
                 "template_id": document.template.template_id if document.template else None,
             }
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             pass
 
     # Fallback to mock results if no results or invalid JSON
@@ -10,6 +10,7 @@ import time
 from datetime import datetime
 from typing import Any, Dict
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
@@ -71,16 +72,15 @@ async def license_status(
         )
     
     # Get license information
-    license_info = license_validator.get_license_info(api_key.key)
+    license_info = await license_validator.get_license_info(api_key.key)
     
     # Get cache information
     cache_file = os.path.join(settings.MODEL_PATH, ".license_cache")
     cache_info = {}
     if os.path.exists(cache_file):
         try:
-            import json
-            with open(cache_file, "r") as f:
-                cache_info = json.load(f)
+            with open(cache_file, "rb") as f:
+                cache_info = orjson.loads(f.read())
         except Exception:
             pass
     
@@ -41,6 +41,8 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = os.environ.get("POSTGRES_PASSWORD", "claryai")
     POSTGRES_DB: str = os.environ.get("POSTGRES_DB", "claryai")
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
     def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
@@ -58,11 +60,20 @@ class Settings(BaseSettings):
     # Model settings
     MODEL_PATH: str = os.environ.get("MODEL_PATH", "/app/models")
     OCR_MODEL: str = os.environ.get("OCR_MODEL", "tesseract")
+    OCR_CONCURRENCY: int = int(os.environ.get("OCR_CONCURRENCY", str(os.cpu_count() or 1)))
+    PARTITION_WORKERS: int = int(os.environ.get("PARTITION_WORKERS", "2"))
     LAYOUT_MODEL: str = os.environ.get("LAYOUT_MODEL", "layoutlm")
     LLM_MODEL: str = os.environ.get("LLM_MODEL", "llama-3-8b")
     LLM_GPU_LAYERS: int = int(os.environ.get("LLM_GPU_LAYERS", "-1"))  # -1 for auto-detect
     LLM_CONTEXT_LENGTH: int = int(os.environ.get("LLM_CONTEXT_LENGTH", "4096"))
     LLM_BATCH_SIZE: int = int(os.environ.get("LLM_BATCH_SIZE", "512"))
+    LLM_DOWNLOAD_WORKERS: int = int(os.environ.get("LLM_DOWNLOAD_WORKERS", "8"))
+    LLM_PRELOAD: bool = True  # Load the LLM at startup instead of on first use
+    # Stop generating once a response holds complete JSON; streamed requests
+    # hold the model and skip the batched generation queue
+    LLM_STREAM_RESPONSES: bool = False
+    EXTRACTION_CONCURRENCY: int = int(os.environ.get("EXTRACTION_CONCURRENCY", "4"))
+    MAX_CONCURRENT_WORKFLOWS: int = int(os.environ.get("MAX_CONCURRENT_WORKFLOWS", "4"))
 
     # Storage settings
     UPLOAD_FOLDER: str = os.environ.get("UPLOAD_FOLDER", "/app/data/uploads")
@@ -77,6 +88,7 @@ class Settings(BaseSettings):
     LICENSE_VALIDATION_ENABLED: bool = True
     LICENSE_SERVER_URL: str = os.environ.get("LICENSE_SERVER_URL", "https://api.claryai.com/license")
     LICENSE_CHECK_INTERVAL: int = 24  # hours
+    LICENSE_HASH_ALGO: str = os.environ.get("LICENSE_HASH_ALGO", "sha256")  # sha256 or blake3
     CONTAINER_ID: str = os.environ.get("CONTAINER_ID", "")
 
     # API key tiers and limits
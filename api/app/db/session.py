@@ -4,14 +4,22 @@ Database session management for the DocuAgent API.
 This module provides SQLAlchemy session management for the application.
 """
 
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Iterator, Optional
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
 
 # Create SQLAlchemy engine
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -32,3 +40,43 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Provide a database session for a unit of work outside request handlers.
+    
+    The session is committed if the block succeeds, rolled back if it raises,
+    and always closed, returning its connection to the pool.
+    
+    Yields:
+        Session: A SQLAlchemy session.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def use_session(db: Optional[Session] = None) -> ContextManager[Session]:
+    """
+    Use a caller's database session, or open one scoped to a block.
+    
+    A caller's session is left open for the caller to manage, so a request
+    handler can pass its own session down instead of checking out another.
+    
+    Args:
+        db: Optional database session.
+        
+    Returns:
+        ContextManager[Session]: Context manager yielding the session.
+    """
+    if db is not None:
+        return nullcontext(db)
+    return session_scope()
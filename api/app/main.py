@@ -7,12 +7,21 @@ This module initializes the FastAPI application.
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from app.api.api import api_router
 from app.core.config import settings
 from app.db.session import engine
+from app.ml.processors.document_preprocessor import shutdown_partition_pool
 from app.models import Base
+from app.services.document_processor import (
+    close_callback_client,
+    shutdown_extraction_agents,
+)
+from app.services.workflow_service import (
+    shutdown_workflow_executors,
+    warm_up_workflow_executors,
+)
 
 
 # Configure logging
@@ -38,6 +47,9 @@ def create_app() -> FastAPI:
         openapi_url=f"{settings.API_V1_STR}/openapi.json",
         docs_url=f"{settings.API_V1_STR}/docs",
         redoc_url=f"{settings.API_V1_STR}/redoc",
+        # Serialize responses with orjson, which is faster than the stdlib
+        # encoder and handles datetimes natively
+        default_response_class=ORJSONResponse,
     )
 
     # Add CORS middleware
@@ -62,6 +74,17 @@ def create_app() -> FastAPI:
     # Include API router
     app.include_router(api_router, prefix=settings.API_V1_STR)
 
+    # Load the LLM before the first request, and release it on shutdown
+    app.add_event_handler("startup", warm_up_workflow_executors)
+    app.add_event_handler("shutdown", shutdown_workflow_executors)
+    app.add_event_handler("shutdown", shutdown_extraction_agents)
+
+    # Close pooled callback connections on shutdown
+    app.add_event_handler("shutdown", close_callback_client)
+
+    # Stop the document partitioning worker processes on shutdown
+    app.add_event_handler("shutdown", shutdown_partition_pool)
+
     # Health check endpoint
     @app.get("/health")
     async def health_check():
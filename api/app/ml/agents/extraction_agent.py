@@ -4,6 +4,7 @@ Extraction agent for the Clary AI API.
 This module provides agentic extraction capabilities.
 """
 
+import asyncio
 import logging
 import os
 from typing import Any, Dict, List, Optional
@@ -11,6 +12,7 @@ from typing import Any, Dict, List, Optional
 from app.core.config import settings
 from app.ml.agents.workflow_engine import WorkflowEngine
 from app.ml.agents.reasoning_engine import ReasoningEngine
+from app.ml.llm.model_manager import ModelManager
 
 
 # Configure logging
@@ -24,16 +26,23 @@ class ExtractionAgent:
     This class provides methods for extracting information using LLMs.
     """
 
-    def __init__(self, model_name: str = "llama-3-8b"):
+    def __init__(
+        self,
+        model_name: str = "llama-3-8b",
+        model_manager: Optional[ModelManager] = None,
+    ):
         """
         Initialize the extraction agent.
 
         Args:
             model_name: Name of the LLM model to use.
+            model_manager: Optional model manager shared with other agents.
         """
         self.model_name = model_name
         self.workflow_engine = WorkflowEngine()
-        self.reasoning_engine = ReasoningEngine(model_name=model_name)
+        self.reasoning_engine = ReasoningEngine(
+            model_name=model_name, model_manager=model_manager
+        )
         logger.info(f"Initialized extraction agent with model: {model_name}")
 
     async def extract(
@@ -78,28 +87,26 @@ class ExtractionAgent:
                 document_type=layout_result.get("document_type"),
             )
 
-            # Determine fields to extract based on document type and template
+            # Determine fields and tables to extract based on document type and template
             fields_to_extract = await self._get_fields_to_extract(
                 document_understanding, template_id
             )
-
-            # Extract fields
-            extracted_fields = await self.reasoning_engine.extract_fields(
-                document_text=ocr_result.get("text", ""),
-                document_layout=layout_result,
-                fields_to_extract=fields_to_extract,
-            )
-
-            # Determine tables to extract based on document type and template
             tables_to_extract = await self._get_tables_to_extract(
                 document_understanding, template_id
             )
 
-            # Extract tables
-            extracted_tables = await self.reasoning_engine.extract_tables(
-                document_text=ocr_result.get("text", ""),
-                document_layout=layout_result,
-                tables_to_extract=tables_to_extract,
+            # Extract fields and tables concurrently
+            extracted_fields, extracted_tables = await asyncio.gather(
+                self.reasoning_engine.extract_fields(
+                    document_text=ocr_result.get("text", ""),
+                    document_layout=layout_result,
+                    fields_to_extract=fields_to_extract,
+                ),
+                self.reasoning_engine.extract_tables(
+                    document_text=ocr_result.get("text", ""),
+                    document_layout=layout_result,
+                    tables_to_extract=tables_to_extract,
+                ),
             )
 
             # Combine results
@@ -215,6 +222,10 @@ class ExtractionAgent:
         Returns:
             float: Overall confidence score.
         """
+        # Nothing to average
+        if not extracted_fields and not extracted_tables:
+            return 0.0
+
         # Calculate average confidence of fields
         field_confidences = [
             field.get("confidence", 0.0) for field in extracted_fields.values()
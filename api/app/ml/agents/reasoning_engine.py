@@ -4,6 +4,7 @@ Reasoning engine for the Clary AI API.
 This module provides LLM-based reasoning capabilities for document processing.
 """
 
+import functools
 import logging
 import os
 import json
@@ -26,16 +27,27 @@ class ReasoningEngine:
     This class provides LLM-based reasoning capabilities for document processing.
     """
 
-    def __init__(self, model_name: str = None):
+    def __init__(
+        self,
+        model_name: str = None,
+        model_manager: Optional[ModelManager] = None,
+        streaming: Optional[bool] = None,
+    ):
         """
         Initialize the reasoning engine.
 
         Args:
             model_name: Name of the LLM model to use.
+            model_manager: Optional model manager to share with other engines,
+                so their requests use the same loaded models and batch worker.
+            streaming: Whether to stream LLM responses and stop generating once
+                they hold a complete JSON object. Defaults to the
+                LLM_STREAM_RESPONSES setting.
         """
         self.model_name = model_name or settings.LLM_MODEL
+        self.streaming = settings.LLM_STREAM_RESPONSES if streaming is None else streaming
         self.model_path = os.path.join(settings.MODEL_PATH, "llm")
-        self.model_manager = None
+        self.model_manager = model_manager
         self.prompt_manager = None
         self.document_understanding = None
         self.context = {}
@@ -44,7 +56,7 @@ class ReasoningEngine:
 
     async def initialize(self):
         """Initialize the LLM components."""
-        if self.model_manager is not None:
+        if self.document_understanding is not None:
             return
 
         logger.info("Initializing reasoning engine components")
@@ -52,8 +64,9 @@ class ReasoningEngine:
         # Create model directory if it doesn't exist
         os.makedirs(self.model_path, exist_ok=True)
 
-        # Initialize model manager
-        self.model_manager = ModelManager(model_dir=self.model_path)
+        # Initialize model manager unless one is shared
+        if self.model_manager is None:
+            self.model_manager = ModelManager(model_dir=self.model_path)
 
         # Initialize prompt manager
         templates_dir = os.path.join(settings.MODEL_PATH, "templates")
@@ -65,6 +78,7 @@ class ReasoningEngine:
             model_manager=self.model_manager,
             prompt_manager=self.prompt_manager,
             default_model=self.model_name,
+            streaming=self.streaming,
         )
 
         # Preload model
@@ -478,7 +492,7 @@ class ReasoningEngine:
     def clear_context(self) -> None:
         """Clear the context."""
         logger.info("Clearing context")
-        self.context = {}
+        self.context.clear()
 
         # Clear document understanding context if initialized
         if self.document_understanding:
@@ -496,3 +510,27 @@ class ReasoningEngine:
         self.clear_context()
 
         logger.info("Reasoning engine shut down successfully")
+
+
+@functools.lru_cache(maxsize=4)
+def get_engine(
+    model_name: Optional[str] = None,
+    model_manager: Optional[ModelManager] = None,
+) -> ReasoningEngine:
+    """
+    Get a reasoning engine shared by all callers in this process.
+    
+    Scripts and test runs that check the same model repeatedly reuse one
+    engine, so its model is loaded once. An engine keeps per-document state
+    in its context, so callers should clear the context when done rather
+    than shut the engine down, and must not share it between concurrent
+    documents.
+    
+    Args:
+        model_name: Name of the LLM model to use.
+        model_manager: Optional model manager to share with other engines.
+        
+    Returns:
+        ReasoningEngine: Shared reasoning engine.
+    """
+    return ReasoningEngine(model_name=model_name, model_manager=model_manager)
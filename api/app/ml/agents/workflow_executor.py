@@ -6,24 +6,32 @@ This module provides workflow execution capabilities for document processing.
 
 import asyncio
 import datetime
-import json
+import graphlib
 import logging
 from typing import Any, Dict, List, Optional
 
+import orjson
 from sqlalchemy.orm import Session
 
 from app.models.workflow import Workflow, Task, TaskStatus, TaskType
 from app.models.template import Template
-from app.ml.processors.document_preprocessor import DocumentPreprocessor
-from app.ml.processors.pdf_extractor import PDFExtractor
-from app.ml.processors.ocr_processor import OCRProcessor
-from app.ml.processors.layout_processor import LayoutProcessor
+from app.ml.processors.ocr_processor import IMAGE_EXTENSIONS
 from app.ml.agents.reasoning_engine import ReasoningEngine
+from app.ml.llm.model_manager import ModelManager
+from app.services.document_processor import (
+    get_document_preprocessor,
+    get_layout_processor,
+    get_ocr_processor,
+    get_pdf_extractor,
+)
 
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Options for stored extraction results; models can return numpy scalars
+_RESULTS_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
 
 class WorkflowExecutor:
     """
@@ -32,20 +40,30 @@ class WorkflowExecutor:
     This class executes document processing workflows.
     """
 
-    def __init__(self, db_session: Session, max_concurrency: int = 4):
+    def __init__(
+        self,
+        db_session: Optional[Session] = None,
+        max_concurrency: int = 4,
+        model_manager: Optional[ModelManager] = None,
+    ):
         """
         Initialize the workflow executor.
 
         Args:
-            db_session: Database session.
+            db_session: Database session, or None if each workflow is
+                executed with its own session.
             max_concurrency: Maximum number of concurrent tasks.
+            model_manager: Optional model manager to share with other executors.
         """
         self.db_session = db_session
         self.max_concurrency = max_concurrency
 
         # Initialize reasoning engine
         from app.core.config import settings
-        self.reasoning_engine = ReasoningEngine(model_name=settings.LLM_MODEL)
+        self.reasoning_engine = ReasoningEngine(
+            model_name=settings.LLM_MODEL,
+            model_manager=model_manager,
+        )
 
         # Initialize task executors
         self.task_executors = {
@@ -61,18 +79,30 @@ class WorkflowExecutor:
 
         logger.info(f"Initialized workflow executor with max concurrency: {max_concurrency}")
 
-    async def execute_workflow(self, workflow_id: str) -> Dict[str, Any]:
+    async def execute_workflow(
+        self,
+        workflow_id: str,
+        db_session: Optional[Session] = None,
+    ) -> Dict[str, Any]:
         """
         Execute a document processing workflow.
 
         Args:
             workflow_id: ID of the workflow to execute.
+            db_session: Optional database session to execute the workflow
+                with, replacing the executor's session.
 
         Returns:
             Dict[str, Any]: Workflow execution results.
         """
         logger.info(f"Executing workflow: {workflow_id}")
 
+        if db_session is not None:
+            self.db_session = db_session
+
+        # Drop any context left over from the executor's previous workflow
+        self.reasoning_engine.clear_context()
+
         # Get workflow from database
         workflow = self.db_session.query(Workflow).filter(Workflow.id == workflow_id).first()
         if not workflow:
@@ -81,7 +111,7 @@ class WorkflowExecutor:
         # Update workflow status
         workflow.status = TaskStatus.RUNNING
         workflow.updated_at = datetime.datetime.now(datetime.timezone.utc)
-        self.db_session.commit()
+        self._commit_status(workflow_id)
 
         try:
             # Get tasks in execution order
@@ -102,7 +132,7 @@ class WorkflowExecutor:
             # Update workflow status
             workflow.status = TaskStatus.COMPLETED
             workflow.completed_at = datetime.datetime.now(datetime.timezone.utc)
-            self.db_session.commit()
+            self._commit_status(workflow_id)
 
             # Return workflow results
             return self._get_workflow_results(workflow)
@@ -112,11 +142,24 @@ class WorkflowExecutor:
             workflow.status = TaskStatus.FAILED
             workflow.error = str(e)
             workflow.updated_at = datetime.datetime.now(datetime.timezone.utc)
-            self.db_session.commit()
+            self._commit_status(workflow_id)
 
             logger.error(f"Error executing workflow: {e}")
             raise
 
+    def _commit_status(self, workflow_id: str) -> None:
+        """
+        Commit a workflow or task status change and drop the cached status.
+
+        Args:
+            workflow_id: ID of the workflow whose state changed.
+        """
+        # Imported here since the workflow service imports this module
+        from app.services.workflow_service import invalidate_workflow_status
+
+        self.db_session.commit()
+        invalidate_workflow_status(workflow_id)
+
     def _get_execution_order(self, workflow: Workflow) -> List[Task]:
         """
         Get tasks in execution order using topological sort.
@@ -129,38 +172,19 @@ class WorkflowExecutor:
         """
         # Build dependency graph
         tasks_by_id = {task.id: task for task in workflow.tasks}
-        dependencies = {task.id: set() for task in workflow.tasks}
+        sorter = graphlib.TopologicalSorter()
 
         for task in workflow.tasks:
-            for dependency in task.dependencies:
-                dependencies[task.id].add(dependency.dependency_task_id)
-
-        # Topological sort
-        visited = set()
-        temp_visited = set()
-        order = []
-
-        def visit(task_id: str):
-            if task_id in temp_visited:
-                raise ValueError("Circular dependency detected in workflow tasks")
-            if task_id in visited:
-                return
-
-            temp_visited.add(task_id)
-
-            for dep_id in dependencies[task_id]:
-                visit(dep_id)
-
-            temp_visited.remove(task_id)
-            visited.add(task_id)
-            order.append(tasks_by_id[task_id])
-
-        for task_id in tasks_by_id:
-            if task_id not in visited:
-                visit(task_id)
+            sorter.add(
+                task.id,
+                *(dependency.dependency_task_id for dependency in task.dependencies),
+            )
 
-        # Reverse to get correct execution order
-        return list(reversed(order))
+        # Topological sort, dependencies first
+        try:
+            return [tasks_by_id[task_id] for task_id in sorter.static_order()]
+        except graphlib.CycleError as e:
+            raise ValueError("Circular dependency detected in workflow tasks") from e
 
     async def _execute_task_with_semaphore(
         self,
@@ -194,7 +218,7 @@ class WorkflowExecutor:
         # Update task status
         task.status = TaskStatus.RUNNING
         task.started_at = datetime.datetime.now(datetime.timezone.utc)
-        self.db_session.commit()
+        self._commit_status(task.workflow_id)
 
         try:
             # Execute task based on type
@@ -208,7 +232,7 @@ class WorkflowExecutor:
             task.result = result
             task.status = TaskStatus.COMPLETED
             task.completed_at = datetime.datetime.now(datetime.timezone.utc)
-            self.db_session.commit()
+            self._commit_status(task.workflow_id)
 
             logger.info(f"Task completed: {task.id}")
 
@@ -217,7 +241,7 @@ class WorkflowExecutor:
             task.status = TaskStatus.FAILED
             task.error = str(e)
             task.updated_at = datetime.datetime.now(datetime.timezone.utc)
-            self.db_session.commit()
+            self._commit_status(task.workflow_id)
 
             logger.error(f"Error executing task: {task.id} - {e}")
             raise
@@ -237,8 +261,8 @@ class WorkflowExecutor:
         if not document_path:
             raise ValueError("Document path not specified in task parameters")
 
-        # Initialize document preprocessor
-        document_preprocessor = DocumentPreprocessor()
+        # Get the shared document preprocessor
+        document_preprocessor = get_document_preprocessor()
 
         # Process document
         preprocess_result = await document_preprocessor.process(document_path)
@@ -278,11 +302,11 @@ class WorkflowExecutor:
 
         if ext == ".pdf":
             # Use Marker for PDF text extraction
-            pdf_extractor = PDFExtractor()
+            pdf_extractor = get_pdf_extractor()
             text_result = await pdf_extractor.process(document_path)
-        elif ext in [".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"]:
+        elif ext in IMAGE_EXTENSIONS:
             # Use OCR for image text extraction
-            ocr_processor = OCRProcessor()
+            ocr_processor = get_ocr_processor()
             text_result = await ocr_processor.process(document_path)
         else:
             # For other document types, use the preprocessor result
@@ -319,8 +343,8 @@ class WorkflowExecutor:
 
         text_result = text_task.result
 
-        # Initialize layout processor
-        layout_processor = LayoutProcessor()
+        # Get the shared layout processor
+        layout_processor = get_layout_processor()
 
         # Process document
         layout_result = await layout_processor.process(document_path, text_result)
@@ -640,7 +664,9 @@ class WorkflowExecutor:
 
         # Update document with extraction results
         if workflow.document:
-            workflow.document.extraction_results_json = json.dumps(formatted_result)
+            workflow.document.extraction_results_json = orjson.dumps(
+                formatted_result, option=_RESULTS_JSON_OPTIONS
+            ).decode()
             workflow.document.extraction_status = "success"
             workflow.document.status = "completed"
             workflow.document.completed_at = datetime.datetime.now(datetime.timezone.utc)
@@ -685,8 +711,8 @@ class WorkflowExecutor:
             template = self.db_session.query(Template).filter(Template.id == template_id).first()
             if template and template.fields:
                 try:
-                    return json.loads(template.fields)
-                except json.JSONDecodeError:
+                    return orjson.loads(template.fields)
+                except orjson.JSONDecodeError:
                     pass
 
         # Otherwise, determine fields based on document type
@@ -753,8 +779,8 @@ class WorkflowExecutor:
             template = self.db_session.query(Template).filter(Template.id == template_id).first()
             if template and template.tables:
                 try:
-                    return json.loads(template.tables)
-                except json.JSONDecodeError:
+                    return orjson.loads(template.tables)
+                except orjson.JSONDecodeError:
                     pass
 
         # Otherwise, determine tables based on document type
@@ -965,6 +991,10 @@ class WorkflowExecutor:
         Returns:
             float: Overall confidence score.
         """
+        # Nothing to average
+        if not fields_result and not tables_result:
+            return 0.0
+
         # Calculate average confidence of fields
         field_confidences = [
             field.get("confidence", 0.0) for field in fields_result.values()
@@ -4,7 +4,9 @@ Document understanding for the Clary AI API.
 This module provides document understanding capabilities using LLM models.
 """
 
+import hashlib
 import logging
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Union
 
 from app.ml.llm.model_manager import ModelManager
@@ -14,6 +16,12 @@ from app.ml.llm.prompt_manager import PromptManager
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Marker appended to document text cut down to fit a prompt
+_TRUNCATION_SUFFIX = "... [truncated]"
+
+# Number of model responses kept for repeated prompts
+RESPONSE_CACHE_SIZE = 128
+
 
 class DocumentUnderstanding:
     """
@@ -27,6 +35,7 @@ class DocumentUnderstanding:
         model_manager: ModelManager,
         prompt_manager: PromptManager,
         default_model: str = "llama-3-8b",
+        streaming: bool = False,
     ):
         """
         Initialize the document understanding component.
@@ -35,13 +44,20 @@ class DocumentUnderstanding:
             model_manager: Model manager for loading models.
             prompt_manager: Prompt manager for rendering prompts.
             default_model: Default model to use.
+            streaming: Whether to stream responses and stop generating as soon
+                as they contain a complete JSON object.
         """
         self.model_manager = model_manager
         self.prompt_manager = prompt_manager
         self.default_model = default_model
+        self.streaming = streaming
         self.context = {}
+        self._shared_context_key = None
+        self._shared_context = None
+        self._json_memo = {}
+        self._response_cache = OrderedDict()
         
-        logger.info(f"Initialized document understanding with default model: {default_model}")
+        logger.info("Initialized document understanding with default model: %s", default_model)
     
     async def understand_document(
         self,
@@ -70,22 +86,12 @@ class DocumentUnderstanding:
         # Prepare variables for prompt
         variables = {
             "document_text": self._prepare_document_text(document_text),
-            "document_layout": self.prompt_manager.format_json_for_prompt(document_layout),
+            "document_layout": self._format_json_cached(document_layout),
             "document_type": document_type or "unknown",
         }
         
-        # Render prompt
-        prompt = self.prompt_manager.render_template("document_understanding", variables)
-        
-        # Generate response
-        response = await self.model_manager.generate(
-            model_name=model_name,
-            prompt=prompt,
-            max_tokens=2048,
-            temperature=0.1,
-            top_p=0.9,
-            stop=["\n\n"],
-        )
+        # Render prompt and generate response
+        response = await self._generate("document_understanding", variables, model_name)
         
         # Parse response
         understanding = self.prompt_manager.parse_json_from_response(response)
@@ -93,6 +99,14 @@ class DocumentUnderstanding:
         # Store understanding in context
         self.context["document_understanding"] = understanding
         
+        # Snapshot the variables shared by the later stages of this document
+        self._shared_context_key = (document_text, document_layout)
+        self._shared_context = {
+            "document_text": variables["document_text"],
+            "document_layout": variables["document_layout"],
+            "document_understanding": self._format_json_cached(understanding),
+        }
+        
         logger.info("Document understanding completed")
         return understanding
     
@@ -120,29 +134,14 @@ class DocumentUnderstanding:
         # Use default model if not specified
         model_name = model_name or self.default_model
         
-        # Get document understanding from context
-        document_understanding = self.context.get("document_understanding", {})
-        
         # Prepare variables for prompt
         variables = {
-            "document_text": self._prepare_document_text(document_text),
-            "document_layout": self.prompt_manager.format_json_for_prompt(document_layout),
-            "document_understanding": self.prompt_manager.format_json_for_prompt(document_understanding),
-            "fields_to_extract": self.prompt_manager.format_json_for_prompt(fields_to_extract),
+            **self._prepare_shared_context(document_text, document_layout),
+            "fields_to_extract": self._format_json_cached(fields_to_extract),
         }
         
-        # Render prompt
-        prompt = self.prompt_manager.render_template("field_extraction", variables)
-        
-        # Generate response
-        response = await self.model_manager.generate(
-            model_name=model_name,
-            prompt=prompt,
-            max_tokens=2048,
-            temperature=0.1,
-            top_p=0.9,
-            stop=["\n\n"],
-        )
+        # Render prompt and generate response
+        response = await self._generate("field_extraction", variables, model_name)
         
         # Parse response
         extracted_fields = self.prompt_manager.parse_json_from_response(response)
@@ -177,29 +176,14 @@ class DocumentUnderstanding:
         # Use default model if not specified
         model_name = model_name or self.default_model
         
-        # Get document understanding from context
-        document_understanding = self.context.get("document_understanding", {})
-        
         # Prepare variables for prompt
         variables = {
-            "document_text": self._prepare_document_text(document_text),
-            "document_layout": self.prompt_manager.format_json_for_prompt(document_layout),
-            "document_understanding": self.prompt_manager.format_json_for_prompt(document_understanding),
-            "tables_to_extract": self.prompt_manager.format_json_for_prompt(tables_to_extract),
+            **self._prepare_shared_context(document_text, document_layout),
+            "tables_to_extract": self._format_json_cached(tables_to_extract),
         }
         
-        # Render prompt
-        prompt = self.prompt_manager.render_template("table_extraction", variables)
-        
-        # Generate response
-        response = await self.model_manager.generate(
-            model_name=model_name,
-            prompt=prompt,
-            max_tokens=2048,
-            temperature=0.1,
-            top_p=0.9,
-            stop=["\n\n"],
-        )
+        # Render prompt and generate response
+        response = await self._generate("table_extraction", variables, model_name)
         
         # Parse response
         extracted_tables = self.prompt_manager.parse_json_from_response(response)
@@ -234,22 +218,99 @@ class DocumentUnderstanding:
         # Use default model if not specified
         model_name = model_name or self.default_model
         
-        # Get document understanding from context
-        document_understanding = self.context.get("document_understanding", {})
+        # Get shared variables from the document snapshot
+        shared_context = self._prepare_shared_context(document_text)
         
         # Prepare variables for prompt
         variables = {
-            "document_text": self._prepare_document_text(document_text),
-            "document_understanding": self.prompt_manager.format_json_for_prompt(document_understanding),
-            "extracted_fields": self.prompt_manager.format_json_for_prompt(extracted_fields),
-            "extracted_tables": self.prompt_manager.format_json_for_prompt(extracted_tables),
+            "document_text": shared_context["document_text"],
+            "document_understanding": shared_context["document_understanding"],
+            "extracted_fields": self._format_json_cached(extracted_fields),
+            "extracted_tables": self._format_json_cached(extracted_tables),
         }
         
+        # Render prompt and generate response
+        response = await self._generate("validation", variables, model_name)
+        
+        # Parse response
+        validation_results = self.prompt_manager.parse_json_from_response(response)
+        
+        # Store validation results in context
+        self.context["validation_results"] = validation_results
+        
+        logger.info("Validation completed")
+        return validation_results
+    
+    async def _generate(
+        self,
+        template_name: str,
+        variables: Dict[str, str],
+        model_name: str,
+    ) -> str:
+        """
+        Render a prompt and generate the model response, reusing cached responses.
+        
+        Responses are cached by template, model and a digest of the rendered
+        prompt, so identical prompts across documents skip the model call.
+        The raw response is cached and parsed by the caller on every call,
+        so callers never share a result object.
+        
+        Args:
+            template_name: Name of the prompt template.
+            variables: Variables to render the template with.
+            model_name: Name of the model to use.
+            
+        Returns:
+            str: Model response.
+        """
         # Render prompt
-        prompt = self.prompt_manager.render_template("validation", variables)
+        prompt = self.prompt_manager.render_template(template_name, variables)
+        
+        # Return cached response for an identical prompt
+        prompt_digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+        cache_key = (template_name, model_name, prompt_digest)
+        response = self._response_cache.get(cache_key)
+        if response is not None:
+            self._response_cache.move_to_end(cache_key)
+            logger.debug("Using cached response for %s prompt", template_name)
+            return response
         
         # Generate response
-        response = await self.model_manager.generate(
+        if self.streaming:
+            response = await self._generate_streamed(prompt, model_name)
+        else:
+            response = await self.model_manager.generate(
+                model_name=model_name,
+                prompt=prompt,
+                max_tokens=2048,
+                temperature=0.1,
+                top_p=0.9,
+                stop=["\n\n"],
+            )
+        
+        # Cache response, evicting the least recently used one when full
+        self._response_cache[cache_key] = response
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+        
+        return response
+    
+    async def _generate_streamed(self, prompt: str, model_name: str) -> str:
+        """
+        Stream a model response until it contains a complete JSON object.
+        
+        Models often keep generating after the JSON they were asked for, so
+        closing the stream at the closing brace saves those tokens.
+        
+        Args:
+            prompt: Rendered prompt.
+            model_name: Name of the model to use.
+            
+        Returns:
+            str: Model response, cut after the first complete JSON object.
+        """
+        chunks = []
+        stream = self.model_manager.generate_stream(
             model_name=model_name,
             prompt=prompt,
             max_tokens=2048,
@@ -258,14 +319,86 @@ class DocumentUnderstanding:
             stop=["\n\n"],
         )
         
-        # Parse response
-        validation_results = self.prompt_manager.parse_json_from_response(response)
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                
+                # An object can only complete on a chunk with a closing brace
+                if "}" not in chunk:
+                    continue
+                
+                response = "".join(chunks)
+                end = self.prompt_manager.find_json_end(response)
+                if end != -1:
+                    return response[:end]
+        finally:
+            # Release the model as soon as the value is complete
+            await stream.aclose()
+        
+        return "".join(chunks)
+    
+    def _prepare_shared_context(
+        self,
+        document_text: str,
+        document_layout: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, str]:
+        """
+        Prepare the prompt variables shared by all stages of a document.
         
-        # Store validation results in context
-        self.context["validation_results"] = validation_results
+        The snapshot taken by understand_document is reused as long as the
+        same document text (and layout, if given) objects are passed in.
         
-        logger.info("Validation completed")
-        return validation_results
+        Args:
+            document_text: Text content of the document.
+            document_layout: Optional layout analysis results.
+            
+        Returns:
+            Dict[str, str]: Prepared document text, layout and understanding.
+        """
+        if self._shared_context is not None:
+            cached_text, cached_layout = self._shared_context_key
+            if cached_text is document_text and (
+                document_layout is None or cached_layout is document_layout
+            ):
+                return self._shared_context
+        
+        shared_context = {
+            "document_text": self._prepare_document_text(document_text),
+            "document_understanding": self._format_json_cached(
+                self.context.get("document_understanding", {})
+            ),
+        }
+        if document_layout is not None:
+            shared_context["document_layout"] = self._format_json_cached(
+                document_layout
+            )
+            self._shared_context_key = (document_text, document_layout)
+            self._shared_context = shared_context
+        
+        return shared_context
+    
+    def _format_json_cached(self, data: Any) -> str:
+        """
+        Format data as JSON for a prompt, memoized per object.
+        
+        The memo is keyed by object identity and lives until the context is
+        cleared, so inputs must not be mutated while a document is in flight.
+        
+        Args:
+            data: Data to format as JSON.
+            
+        Returns:
+            str: Formatted JSON string.
+        """
+        entry = self._json_memo.get(id(data))
+        if entry is not None and entry[0] is data:
+            return entry[1]
+        
+        formatted = self.prompt_manager.format_json_for_prompt(data)
+        
+        # Keep a reference to the object so its id cannot be reused
+        self._json_memo[id(data)] = (data, formatted)
+        return formatted
     
     def _prepare_document_text(self, document_text: str, max_length: int = 4000) -> str:
         """
@@ -279,12 +412,16 @@ class DocumentUnderstanding:
             str: Prepared document text.
         """
         # Truncate document text if it's too long
-        if len(document_text) > max_length:
-            return document_text[:max_length] + "... [truncated]"
-        
-        return document_text
+        return (
+            document_text
+            if len(document_text) <= max_length
+            else document_text[:max_length] + _TRUNCATION_SUFFIX
+        )
     
     def clear_context(self) -> None:
         """Clear the context."""
         logger.info("Clearing context")
-        self.context = {}
+        self.context.clear()
+        self._shared_context_key = None
+        self._shared_context = None
+        self._json_memo.clear()
@@ -5,20 +5,89 @@ This module provides model management for LLM models.
 """
 
 import asyncio
+import gc
 import logging
 import os
-import shutil
-import tempfile
-from typing import Any, Dict, List, Optional, Union
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, KeysView, List, Optional
 
-import aiohttp
 import huggingface_hub
+import llama_cpp
 from llama_cpp import Llama
 
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# GPU memory kept free for llama.cpp scratch buffers when auto-tuning offload
+GPU_MEMORY_HEADROOM_BYTES = 512 * 1024 * 1024
+
+# Available RAM required to lock a model in memory, as a multiple of its size
+MLOCK_MEMORY_FACTOR = 1.2
+
+# Token generation is memory-bandwidth bound, so threads beyond this only
+# contend for the same bandwidth
+MAX_GENERATION_THREADS = 16
+
+# KV cache element types: ggml type and bytes per element. q8_0 halves KV
+# memory and decode bandwidth at a small accuracy cost; f16 is full precision
+KV_CACHE_TYPES = {
+    "f16": (llama_cpp.GGML_TYPE_F16, 2.0),
+    "q8_0": (llama_cpp.GGML_TYPE_Q8_0, 34 / 32),
+}
+
+# Built-in model configurations. A model split into GGUF shards also lists
+# every shard under "filenames", with "filename" naming the first shard,
+# which llama.cpp loads the others from
+MODEL_CONFIGS = MappingProxyType({
+    "llama-3-8b": MappingProxyType({
+        "repo_id": "TheBloke/Llama-3-8B-GGUF",
+        "filename": "llama-3-8b.Q4_K_M.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 2048,
+        "ubatch_size": 512,
+        "n_layers": 32,
+        "kv_dim": 1024,
+        "kv_cache_type": "q8_0",  # "f16" for full-precision attention
+        "tier": "professional",
+        "description": "Llama 3 8B model for professional tier",
+    }),
+    "mistral-7b": MappingProxyType({
+        "repo_id": "TheBloke/Mistral-7B-v0.1-GGUF",
+        "filename": "mistral-7b-v0.1.Q4_K_M.gguf",
+        "type": "llama",  # Uses llama.cpp compatible format
+        "context_length": 4096,
+        "batch_size": 2048,
+        "ubatch_size": 512,
+        "n_layers": 32,
+        "kv_dim": 1024,
+        "kv_cache_type": "q8_0",  # "f16" for full-precision attention
+        "tier": "professional",
+        "description": "Mistral 7B model for professional tier",
+    }),
+    "phi-4-multimodal": MappingProxyType({
+        "repo_id": "microsoft/Phi-4-Multimodal-GGUF",
+        "filename": "phi-4-multimodal.Q4_K_M.gguf",
+        "type": "llama",  # Uses llama.cpp compatible format
+        "context_length": 4096,
+        "batch_size": 2048,
+        "ubatch_size": 512,
+        "n_layers": 32,
+        "kv_dim": 1024,
+        "kv_cache_type": "q8_0",  # "f16" for full-precision attention
+        "tier": "standard",
+        "description": "Phi-4 Multimodal model for standard tier",
+    }),
+})
+
+# Whether a failed GPU memory probe has been logged
+_gpu_probe_warned = False
+
+# Returned by _next_stream_text once a generation stream is exhausted
+_STREAM_END = object()
+
 
 class ModelManager:
     """
@@ -27,78 +96,89 @@ class ModelManager:
     This class provides methods for loading, downloading, and managing LLM models.
     """
 
-    def __init__(self, model_dir: str):
+    def __init__(
+        self,
+        model_dir: str,
+        max_batch_size: int = 8,
+        max_batch_wait_ms: float = 5.0,
+        prefix_cache_bytes: int = 0,
+        download_workers: int = 8,
+    ):
         """
         Initialize the model manager.
 
         Args:
             model_dir: Directory where models are stored.
+            max_batch_size: Maximum number of queued generation requests
+                drained per batch.
+            max_batch_wait_ms: How long to wait for more requests before
+                running a batch.
+            prefix_cache_bytes: RAM per model for saved prompt-prefix states
+                (0 disables prefix caching). Off by default, since the built-in
+                prompts differ from their first sentence and rarely hit it.
+            download_workers: Maximum number of model files downloaded at once.
         """
         self.model_dir = model_dir
-        self.models = {}
-        self.model_configs = {
-            "llama-3-8b": {
-                "repo_id": "TheBloke/Llama-3-8B-GGUF",
-                "filename": "llama-3-8b.Q4_K_M.gguf",
-                "type": "llama",
-                "context_length": 4096,
-                "batch_size": 512,
-                "tier": "professional",
-                "description": "Llama 3 8B model for professional tier",
-            },
-            "mistral-7b": {
-                "repo_id": "TheBloke/Mistral-7B-v0.1-GGUF",
-                "filename": "mistral-7b-v0.1.Q4_K_M.gguf",
-                "type": "llama",  # Uses llama.cpp compatible format
-                "context_length": 4096,
-                "batch_size": 512,
-                "tier": "professional",
-                "description": "Mistral 7B model for professional tier",
-            },
-            "phi-4-multimodal": {
-                "repo_id": "microsoft/Phi-4-Multimodal-GGUF",
-                "filename": "phi-4-multimodal.Q4_K_M.gguf",
-                "type": "llama",  # Uses llama.cpp compatible format
-                "context_length": 4096,
-                "batch_size": 512,
-                "tier": "standard",
-                "description": "Phi-4 Multimodal model for standard tier",
-            },
-        }
+        self.models = OrderedDict()
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait_ms = max_batch_wait_ms
+        self.prefix_cache_bytes = prefix_cache_bytes
+        self.download_workers = download_workers
+        self._optimal_gpu_layers = {}
+        self._pinned_models = set()
+        self._model_locks = {}
+        self._load_locks = {}
+        self._generation_queues = {}
+        self._generation_workers = {}
+        self._model_calls = {}
+        self._closing_models = {}
+        # Models are registered per instance; the built-in configs
+        # themselves are read-only
+        self.model_configs = {}
+        # Model names listed per tier, kept up to date by register_model
+        self._tier_models = {"standard": [], "professional": []}
+        for model_name, config in MODEL_CONFIGS.items():
+            self.register_model(model_name, config)
 
         # Create model directory if it doesn't exist
         os.makedirs(model_dir, exist_ok=True)
 
-        logger.info(f"Initialized model manager with model directory: {model_dir}")
+        logger.info("Initialized model manager with model directory: %s", model_dir)
+
+    def register_model(self, model_name: str, config: Dict[str, Any]) -> None:
+        """
+        Register a model config on this manager.
+
+        Args:
+            model_name: Name of the model.
+            config: Model config, with the keys used by MODEL_CONFIGS.
+        """
+        # Drop a replaced config from the tier listings first
+        if model_name in self.model_configs:
+            for tier_models in self._tier_models.values():
+                if model_name in tier_models:
+                    tier_models.remove(model_name)
+
+        self.model_configs[model_name] = config
+
+        # Professional gets every model, standard only standard-tier models
+        self._tier_models["professional"].append(model_name)
+        if config.get("tier") == "standard":
+            self._tier_models["standard"].append(model_name)
 
     def get_models_for_tier(self, tier: str) -> List[str]:
         """
         Get a list of models available for a given tier.
 
+        The listing is read from the tier index kept by register_model.
+
         Args:
             tier: The tier to check.
 
         Returns:
             List[str]: List of model names available for the tier.
         """
-        models = []
-
-        # For lite tier, no models are available
-        if tier == "lite":
-            return []
-
-        # For standard tier, only standard models are available
-        if tier == "standard":
-            for model_name, config in self.model_configs.items():
-                if config.get("tier") == "standard":
-                    models.append(model_name)
-            return models
-
-        # For professional tier, all models are available
-        if tier == "professional":
-            return list(self.model_configs.keys())
-
-        return models
+        return list(self._tier_models.get(tier, ()))
 
     def is_model_available_for_tier(self, model_name: str, tier: str) -> bool:
         """
@@ -111,19 +191,17 @@ class ModelManager:
         Returns:
             bool: True if the model is available for the tier, False otherwise.
         """
-        # For lite tier, no models are available
-        if tier == "lite":
+        # Registered models count too, so look the model up on this instance
+        config = self.model_configs.get(model_name)
+        if config is None:
             return False
 
-        # For standard tier, only standard models are available
-        if tier == "standard":
-            model_config = self.model_configs.get(model_name, {})
-            return model_config.get("tier") == "standard"
-
-        # For professional tier, all models are available
+        # Professional gets every model, standard only standard-tier models
+        # and lite none
         if tier == "professional":
-            return model_name in self.model_configs
-
+            return True
+        if tier == "standard":
+            return config.get("tier") == "standard"
         return False
 
     async def load_model(
@@ -135,6 +213,9 @@ class ModelManager:
         """
         Load a model.
 
+        Concurrent calls for the same model wait on a per-model lock, so the
+        model is only loaded once and later callers get the loaded instance.
+
         Args:
             model_name: Name of the model to load.
             force_download: Whether to force download the model even if it exists.
@@ -143,13 +224,44 @@ class ModelManager:
         Returns:
             Any: The loaded model.
         """
-        logger.info(f"Loading model: {model_name}")
+        logger.info("Loading model: %s", model_name)
+
+        if model_name not in self._load_locks:
+            self._load_locks[model_name] = asyncio.Lock()
+
+        async with self._load_locks[model_name]:
+            # Check if model is already loaded, possibly by a call this one waited for
+            if model_name in self.models and not force_download:
+                logger.info("Model already loaded: %s", model_name)
+                self.models.move_to_end(model_name)
+                return self.models[model_name]
+
+            # A forced reload replaces the loaded model, so close that one first
+            if model_name in self.models:
+                self.unload_model(model_name)
+                closing = self._closing_models.get(model_name)
+                if closing is not None:
+                    await closing
+
+            return await self._load_model(model_name, force_download, gpu_layers)
+
+    async def _load_model(
+        self,
+        model_name: str,
+        force_download: bool,
+        gpu_layers: int,
+    ) -> Any:
+        """
+        Load a model while holding its load lock.
 
-        # Check if model is already loaded
-        if model_name in self.models and not force_download:
-            logger.info(f"Model already loaded: {model_name}")
-            return self.models[model_name]
+        Args:
+            model_name: Name of the model to load.
+            force_download: Whether to force download the model even if it exists.
+            gpu_layers: Number of layers to offload to GPU (-1 for auto-detect).
 
+        Returns:
+            Any: The loaded model.
+        """
         # Get model config
         if model_name not in self.model_configs:
             raise ValueError(f"Unknown model: {model_name}")
@@ -157,64 +269,339 @@ class ModelManager:
         config = self.model_configs[model_name]
         model_path = os.path.join(self.model_dir, config["filename"])
 
-        # Download model if it doesn't exist or force_download is True
-        if not os.path.exists(model_path) or force_download:
-            await self._download_model(model_name)
+        # Download model if any of its files is missing or force_download is True
+        missing = any(
+            not os.path.exists(os.path.join(self.model_dir, filename))
+            for filename in _model_filenames(config)
+        )
+        if missing or force_download:
+            await self._download_model(model_name, force_download=force_download)
+
+        # Make room on the GPU by evicting least recently used models
+        await self._make_room_for_model(model_name, model_path)
+
+        # Pick the number of offloaded layers if auto-detect was requested
+        if gpu_layers == -1:
+            gpu_layers = self._get_optimal_gpu_layers(model_name, model_path)
 
         # Load model based on type
         if config["type"] == "llama":
-            logger.info(f"Loading Llama model: {model_name}")
-            model = Llama(
+            logger.info("Loading Llama model: %s", model_name)
+            cpu_count = os.cpu_count() or 1
+            kv_cache_type = config.get("kv_cache_type", "f16")
+            ggml_type, _ = KV_CACHE_TYPES[kv_cache_type]
+            # Load weights in a worker thread so the event loop keeps serving
+            # requests; mmap lets the kernel page them in on demand
+            model = await asyncio.to_thread(
+                Llama,
                 model_path=model_path,
                 n_ctx=config["context_length"],
+                # Prompts up to n_batch tokens are decoded in one call, split
+                # into n_ubatch-token physical batches
                 n_batch=config["batch_size"],
+                n_ubatch=min(config.get("ubatch_size", 512), config["batch_size"]),
                 n_gpu_layers=gpu_layers,
+                n_threads=max(1, min(MAX_GENERATION_THREADS, cpu_count // 2)),
+                n_threads_batch=cpu_count,
+                use_mmap=True,
+                use_mlock=self._should_lock_model(model_path),
+                type_k=ggml_type,
+                type_v=ggml_type,
+                # llama.cpp needs flash attention for a quantized V cache
+                flash_attn=kv_cache_type != "f16",
                 verbose=False,
             )
+
+            # Keep KV states of recent prompts so a prompt sharing a prefix
+            # with one of them skips that prefill
+            if self.prefix_cache_bytes > 0:
+                model.set_cache(
+                    llama_cpp.LlamaRAMCache(capacity_bytes=self.prefix_cache_bytes)
+                )
         else:
             raise ValueError(f"Unsupported model type: {config['type']}")
 
         # Store model
         self.models[model_name] = model
 
-        logger.info(f"Model loaded successfully: {model_name}")
+        logger.info("Model loaded successfully: %s", model_name)
         return model
 
-    async def _download_model(self, model_name: str) -> None:
+    async def preload(self, model_names: List[str]) -> None:
+        """
+        Load models ahead of their first request.
+
+        Args:
+            model_names: Names of the models to load.
+        """
+        logger.info("Preloading models: %s", ", ".join(model_names))
+
+        # Load through the per-model locks so requests arriving meanwhile wait
+        # for these loads instead of starting their own
+        await asyncio.gather(*(self._get_loaded_model(name) for name in model_names))
+
+    def pin_model(self, model_name: str) -> None:
+        """
+        Pin a model so it is never evicted to make room for another.
+
+        Args:
+            model_name: Name of the model to pin.
+        """
+        self._pinned_models.add(model_name)
+
+    def unpin_model(self, model_name: str) -> None:
+        """
+        Allow a pinned model to be evicted again.
+
+        Args:
+            model_name: Name of the model to unpin.
+        """
+        self._pinned_models.discard(model_name)
+
+    def _get_free_gpu_memory(self) -> Optional[int]:
+        """
+        Get the free memory of the current GPU.
+
+        Returns:
+            Optional[int]: Free bytes, or None if no GPU could be probed.
+        """
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                free_bytes, _ = torch.cuda.mem_get_info()
+                return free_bytes
+
+        except (ImportError, RuntimeError) as e:
+            # The probe fails the same way on every load, so warn only once
+            global _gpu_probe_warned
+            if not _gpu_probe_warned:
+                logger.warning("Could not probe GPU memory: %s", e)
+                _gpu_probe_warned = True
+
+        return None
+
+    def _get_available_memory(self) -> Optional[int]:
+        """
+        Get the amount of free physical memory.
+
+        Returns:
+            Optional[int]: Free bytes, or None if it could not be probed.
+        """
+        try:
+            return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (ValueError, OSError, AttributeError) as e:
+            logger.warning("Could not probe system memory: %s", e)
+            return None
+
+    def _should_lock_model(self, model_path: str) -> bool:
+        """
+        Check whether a memory-mapped model should be locked in RAM.
+
+        Locking keeps the weights from being paged out under memory pressure,
+        which would stall decoding, but is only safe with RAM to spare.
+
+        Args:
+            model_path: Path to the model file.
+
+        Returns:
+            bool: True if the model fits in free memory with margin.
+        """
+        available_bytes = self._get_available_memory()
+        if available_bytes is None:
+            return False
+
+        try:
+            model_bytes = os.path.getsize(model_path)
+        except OSError:
+            return False
+
+        return available_bytes > model_bytes * MLOCK_MEMORY_FACTOR
+
+    def _get_kv_cache_bytes_per_layer(self, config: Dict[str, Any]) -> int:
+        """
+        Get the size of one layer's KV cache.
+
+        Args:
+            config: Model config.
+
+        Returns:
+            int: KV cache bytes per layer (K and V).
+        """
+        _, bytes_per_element = KV_CACHE_TYPES[config.get("kv_cache_type", "f16")]
+        return int(2 * config["context_length"] * config.get("kv_dim", 1024) * bytes_per_element)
+
+    async def _make_room_for_model(self, model_name: str, model_path: str) -> None:
+        """
+        Evict least recently used models until a model fits in free GPU memory.
+
+        Pinned models are never evicted. If there is no GPU, or nothing left
+        to evict, the model is loaded anyway and partial offload takes over.
+
+        Args:
+            model_name: Name of the model about to be loaded.
+            model_path: Path to the model file.
+        """
+        config = self.model_configs[model_name]
+        try:
+            needed_bytes = (
+                os.path.getsize(model_path)
+                + self._get_kv_cache_bytes_per_layer(config) * config.get("n_layers", 0)
+                + GPU_MEMORY_HEADROOM_BYTES
+            )
+        except OSError:
+            return
+
+        while True:
+            free_bytes = self._get_free_gpu_memory()
+            if free_bytes is None or free_bytes >= needed_bytes:
+                return
+
+            # Least recently used models come first
+            victim = next(
+                (
+                    name for name in self.models
+                    if name != model_name and name not in self._pinned_models
+                ),
+                None,
+            )
+            if victim is None:
+                return
+
+            logger.info("Evicting model %s to make room for %s", victim, model_name)
+            self.unload_model(victim)
+
+            # Free memory is only reclaimed once in-flight calls let it close
+            closing = self._closing_models.get(victim)
+            if closing is not None:
+                await closing
+
+    def _get_optimal_gpu_layers(self, model_name: str, model_path: str) -> int:
+        """
+        Estimate how many layers of a model fit in free GPU memory.
+
+        Each offloaded layer costs its share of the weights plus its slice of
+        the KV cache, sized for the model's kv_cache_type (q8_0 for the
+        built-in models). The result is cached per model.
+
+        Args:
+            model_name: Name of the model.
+            model_path: Path to the model file.
+
+        Returns:
+            int: Number of layers to offload (-1 to offload all layers).
+        """
+        if model_name in self._optimal_gpu_layers:
+            return self._optimal_gpu_layers[model_name]
+
+        config = self.model_configs[model_name]
+        n_layers = config.get("n_layers")
+        gpu_layers = -1
+
+        free_bytes = self._get_free_gpu_memory() if n_layers else None
+        if free_bytes is not None:
+            try:
+                weight_bytes = os.path.getsize(model_path) / n_layers
+                kv_bytes = self._get_kv_cache_bytes_per_layer(config)
+                usable_bytes = free_bytes - GPU_MEMORY_HEADROOM_BYTES
+
+                fitting_layers = max(0, int(usable_bytes // (weight_bytes + kv_bytes)))
+                if fitting_layers < n_layers:
+                    gpu_layers = fitting_layers
+
+            except OSError as e:
+                logger.warning("Could not size model file for %s: %s", model_name, e)
+
+        logger.info("Using %d GPU layers for model: %s", gpu_layers, model_name)
+        self._optimal_gpu_layers[model_name] = gpu_layers
+        return gpu_layers
+
+    async def _download_model(self, model_name: str, force_download: bool = False) -> None:
         """
         Download a model.
 
+        Models split into several GGUF shards list all of them under
+        "filenames". The files are downloaded concurrently in worker threads,
+        at most download_workers at a time, so the event loop keeps serving
+        requests while they download.
+
         Args:
             model_name: Name of the model to download.
+            force_download: Whether to download even if the files are cached.
         """
-        logger.info(f"Downloading model: {model_name}")
+        logger.info("Downloading model: %s", model_name)
 
         # Get model config
         config = self.model_configs[model_name]
-        model_path = os.path.join(self.model_dir, config["filename"])
+        semaphore = asyncio.Semaphore(self.download_workers)
 
-        try:
-            # Create a temporary directory for downloading
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Download model from Hugging Face
-                logger.info(f"Downloading from Hugging Face: {config['repo_id']}/{config['filename']}")
-                huggingface_hub.hf_hub_download(
-                    repo_id=config["repo_id"],
-                    filename=config["filename"],
-                    local_dir=temp_dir,
-                    local_dir_use_symlinks=False,
+        async def download(filename: str) -> None:
+            async with semaphore:
+                await asyncio.to_thread(
+                    self._download_file, config, filename, force_download
                 )
 
-                # Move model to model directory
-                temp_model_path = os.path.join(temp_dir, config["filename"])
-                shutil.move(temp_model_path, model_path)
+        try:
+            await asyncio.gather(*(download(filename) for filename in _model_filenames(config)))
 
-            logger.info(f"Model downloaded successfully: {model_name}")
+            logger.info("Model downloaded successfully: %s", model_name)
 
         except Exception as e:
-            logger.error(f"Error downloading model {model_name}: {e}")
+            logger.error("Error downloading model %s: %s", model_name, e)
             raise
 
+    def _download_file(
+        self,
+        config: Dict[str, Any],
+        filename: str,
+        force_download: bool = False,
+    ) -> None:
+        """
+        Download one model file.
+
+        The file is fetched into the Hugging Face cache under the model
+        directory and hardlinked (or symlinked across filesystems) into place,
+        so the multi-GB file is never copied.
+
+        Args:
+            config: Configuration of the model the file belongs to.
+            filename: Name of the file in the model repository.
+            force_download: Whether to download even if the file is cached.
+        """
+        model_path = os.path.join(self.model_dir, filename)
+        cache_dir = os.path.join(self.model_dir, ".hf")
+
+        # Reuse the cached file if we have one
+        cached_path = None
+        if not force_download:
+            cached_path = huggingface_hub.try_to_load_from_cache(
+                repo_id=config["repo_id"],
+                filename=filename,
+                cache_dir=cache_dir,
+            )
+
+        # Download file from Hugging Face
+        if not isinstance(cached_path, str):
+            logger.info("Downloading from Hugging Face: %s/%s", config["repo_id"], filename)
+            cached_path = huggingface_hub.hf_hub_download(
+                repo_id=config["repo_id"],
+                filename=filename,
+                cache_dir=cache_dir,
+                force_download=force_download,
+            )
+
+        # Link the cached blob into the model directory atomically
+        blob_path = os.path.realpath(cached_path)
+        if not (os.path.exists(model_path) and os.path.samefile(blob_path, model_path)):
+            temp_model_path = f"{model_path}.tmp"
+            if os.path.lexists(temp_model_path):
+                os.remove(temp_model_path)
+            try:
+                os.link(blob_path, temp_model_path)
+            except OSError:
+                os.symlink(blob_path, temp_model_path)
+            os.replace(temp_model_path, model_path)
+
     async def generate(
         self,
         model_name: str,
@@ -238,21 +625,25 @@ class ModelManager:
         Returns:
             str: Generated text.
         """
-        logger.info(f"Generating text with model: {model_name}")
+        logger.info("Generating text with model: %s", model_name)
 
         # Load model if not already loaded
-        model = await self.load_model(model_name)
+        model = await self._get_loaded_model(model_name)
+
+        # Queue the request for the model's batch worker
+        request = {
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "stop": stop or [],
+        }
+        future = asyncio.get_running_loop().create_future()
+        await self._get_generation_queue(model_name).put((model, request, future))
 
         # Generate text
         try:
-            response = model(
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                stop=stop or [],
-                echo=False,
-            )
+            response = await future
 
             # Extract generated text
             if isinstance(response, dict) and "choices" in response:
@@ -260,11 +651,11 @@ class ModelManager:
             else:
                 generated_text = response
 
-            logger.info(f"Text generated successfully with model: {model_name}")
+            logger.info("Text generated successfully with model: %s", model_name)
             return generated_text
 
         except Exception as e:
-            logger.error(f"Error generating text with model {model_name}: {e}")
+            logger.error("Error generating text with model %s: %s", model_name, e)
             raise
 
     async def generate_stream(
@@ -290,37 +681,247 @@ class ModelManager:
         Returns:
             Any: Generator yielding generated text chunks.
         """
-        logger.info(f"Generating text stream with model: {model_name}")
+        logger.info("Generating text stream with model: %s", model_name)
 
         # Load model if not already loaded
-        model = await self.load_model(model_name)
+        model = await self._get_loaded_model(model_name)
 
         # Generate text stream
         try:
-            response_iter = model(
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                stop=stop or [],
-                echo=False,
-                stream=True,
-            )
-
-            # Yield generated text chunks
-            for response in response_iter:
-                if isinstance(response, dict) and "choices" in response:
-                    chunk = response["choices"][0]["text"]
+            # Hold the model lock so the batch worker does not use the model concurrently
+            async with self._get_model_lock(model_name):
+                response_iter = iter(model(
+                    prompt=prompt,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    top_p=top_p,
+                    stop=stop or [],
+                    echo=False,
+                    stream=True,
+                ))
+
+                # Yield generated text chunks, decoding each token in a worker
+                # thread so llama.cpp does not block the event loop
+                while True:
+                    # Stop if the model was unloaded between chunks
+                    if self.models.get(model_name) is not model:
+                        raise RuntimeError(f"Model unloaded: {model_name}")
+
+                    chunk = await self._call_model(model_name, _next_stream_text, response_iter)
+                    if chunk is _STREAM_END:
+                        break
                     yield chunk
-                else:
-                    yield response
 
-            logger.info(f"Text stream generated successfully with model: {model_name}")
+            logger.info("Text stream generated successfully with model: %s", model_name)
 
         except Exception as e:
-            logger.error(f"Error generating text stream with model {model_name}: {e}")
+            logger.error("Error generating text stream with model %s: %s", model_name, e)
             raise
 
+    async def _get_loaded_model(self, model_name: str) -> Any:
+        """
+        Get a loaded model, loading it on first use.
+
+        Loaded models are returned without awaiting anything; otherwise the
+        model is loaded through load_model, which takes the per-model lock.
+
+        Args:
+            model_name: Name of the model.
+
+        Returns:
+            Any: The loaded model.
+        """
+        model = self.models.get(model_name)
+        if model is not None:
+            self.models.move_to_end(model_name)
+            return model
+
+        return await self.load_model(model_name)
+
+    def _get_model_lock(self, model_name: str) -> asyncio.Lock:
+        """
+        Get the lock serializing access to a loaded model.
+
+        Args:
+            model_name: Name of the model.
+
+        Returns:
+            asyncio.Lock: Lock for the model.
+        """
+        if model_name not in self._model_locks:
+            self._model_locks[model_name] = asyncio.Lock()
+        return self._model_locks[model_name]
+
+    async def _call_model(self, model_name: str, func: Any, *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking call on a model in a worker thread.
+
+        Cancelling the caller does not stop the thread, so the call is tracked
+        until the thread returns. Unloading the model waits for tracked calls
+        before freeing the llama.cpp memory they are still using.
+
+        Args:
+            model_name: Name of the model.
+            func: Blocking function using the model.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            Any: Result of func.
+        """
+        calls = self._model_calls.setdefault(model_name, set())
+        call = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        calls.add(call)
+
+        def finish(call: asyncio.Future) -> None:
+            calls.discard(call)
+            # Retrieve the result so an abandoned call's error is not logged
+            if not call.cancelled():
+                call.exception()
+
+        call.add_done_callback(finish)
+        return await asyncio.shield(call)
+
+    def _close_model(self, model_name: str, model: Any) -> None:
+        """
+        Free the llama.cpp context and weights of an unloaded model.
+
+        The model is closed right away unless worker threads are still
+        running calls on it, in which case it is closed once they return.
+
+        Args:
+            model_name: Name of the model.
+            model: The unloaded model.
+        """
+        close = getattr(model, "close", None)
+        if close is None:
+            return
+
+        calls = self._model_calls.pop(model_name, None)
+        if not calls:
+            close()
+            return
+
+        async def close_when_idle() -> None:
+            await asyncio.wait(calls)
+            close()
+            logger.info("Model closed after in-flight calls finished: %s", model_name)
+
+        closing = asyncio.ensure_future(close_when_idle())
+        self._closing_models[model_name] = closing
+
+        def forget(closing: asyncio.Future) -> None:
+            if self._closing_models.get(model_name) is closing:
+                del self._closing_models[model_name]
+
+        closing.add_done_callback(forget)
+
+    def _get_generation_queue(self, model_name: str) -> asyncio.Queue:
+        """
+        Get the generation queue for a model, starting its batch worker if needed.
+
+        Args:
+            model_name: Name of the model.
+
+        Returns:
+            asyncio.Queue: Queue of pending generation requests.
+        """
+        worker = self._generation_workers.get(model_name)
+        if worker is None or worker.done():
+            queue = asyncio.Queue()
+            self._generation_queues[model_name] = queue
+            self._generation_workers[model_name] = asyncio.create_task(
+                self._generation_worker(model_name, queue)
+            )
+        return self._generation_queues[model_name]
+
+    async def _generation_worker(self, model_name: str, queue: asyncio.Queue) -> None:
+        """
+        Drain queued generation requests for a model in batches.
+
+        Requests arriving within max_batch_wait_ms of each other are collected
+        into one batch. Identical requests in a batch are coalesced into a
+        single model call, and the remaining calls run shortest prompt first
+        in a worker thread so the event loop is never blocked by llama.cpp.
+
+        Args:
+            model_name: Name of the model.
+            queue: Queue of pending generation requests.
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # Wait for the first request, then give others a chance to join
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_batch_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Coalesce identical requests
+            groups = {}
+            for model, request, future in batch:
+                key = (
+                    request["prompt"],
+                    request["max_tokens"],
+                    request["temperature"],
+                    request["top_p"],
+                    tuple(request["stop"]),
+                )
+                groups.setdefault(key, []).append((model, request, future))
+
+            logger.debug(
+                "Running generation batch for %s: %d requests, %d unique",
+                model_name, len(batch), len(groups),
+            )
+
+            # Run shortest prompts first to minimize mean latency
+            try:
+                for key in sorted(groups, key=lambda k: len(k[0])):
+                    waiters = groups[key]
+                    model, request, _ = waiters[0]
+                    try:
+                        async with self._get_model_lock(model_name):
+                            response = await self._call_model(
+                                model_name, model, echo=False, **request
+                            )
+                    except Exception as e:
+                        for _, _, future in waiters:
+                            if not future.done():
+                                future.set_exception(e)
+                    else:
+                        for _, _, future in waiters:
+                            if not future.done():
+                                future.set_result(response)
+            except asyncio.CancelledError:
+                # Do not leave callers of an unloaded model waiting forever
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError(f"Model unloaded: {model_name}"))
+                raise
+
+    def _stop_generation_worker(self, model_name: str) -> None:
+        """
+        Stop the batch worker of a model and fail its pending requests.
+
+        Args:
+            model_name: Name of the model.
+        """
+        worker = self._generation_workers.pop(model_name, None)
+        if worker is not None:
+            worker.cancel()
+
+        queue = self._generation_queues.pop(model_name, None)
+        while queue is not None and not queue.empty():
+            _, _, future = queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"Model unloaded: {model_name}"))
+
     def unload_model(self, model_name: str) -> None:
         """
         Unload a model.
@@ -328,22 +929,25 @@ class ModelManager:
         Args:
             model_name: Name of the model to unload.
         """
-        logger.info(f"Unloading model: {model_name}")
+        logger.info("Unloading model: %s", model_name)
 
-        if model_name in self.models:
-            # Get model
-            model = self.models[model_name]
+        # Stop the batch worker even if the model is no longer loaded
+        self._stop_generation_worker(model_name)
+
+        # Re-probe GPU memory the next time this model is loaded
+        self._optimal_gpu_layers.pop(model_name, None)
 
+        if model_name in self.models:
             # Unload model
-            del self.models[model_name]
+            model = self.models.pop(model_name)
 
-            # Force garbage collection
-            import gc
-            gc.collect()
+            # Free the llama.cpp context and weights now rather than whenever
+            # the garbage collector gets to the model, once no thread uses them
+            self._close_model(model_name, model)
 
-            logger.info(f"Model unloaded successfully: {model_name}")
+            logger.info("Model unloaded successfully: %s", model_name)
         else:
-            logger.warning(f"Model not loaded: {model_name}")
+            logger.warning("Model not loaded: %s", model_name)
 
     def unload_all_models(self) -> None:
         """Unload all models."""
@@ -356,22 +960,70 @@ class ModelManager:
         for model_name in model_names:
             self.unload_model(model_name)
 
+        # Collect any leftover reference cycles once, not once per model
+        gc.collect()
+
         logger.info("All models unloaded successfully")
 
-    def get_available_models(self) -> List[str]:
+    def get_available_models(self) -> KeysView[str]:
+        """
+        Get available models.
+
+        The view is live and is not copied, so polling it is cheap.
+
+        Returns:
+            KeysView[str]: View of available model names.
+        """
+        return self.model_configs.keys()
+
+    def list_available_models(self) -> List[str]:
         """
-        Get list of available models.
+        Get list of available models, e.g. for a JSON response.
 
         Returns:
             List[str]: List of available model names.
         """
-        return list(self.model_configs.keys())
+        return list(self.model_configs)
 
-    def get_loaded_models(self) -> List[str]:
+    def get_loaded_models(self) -> KeysView[str]:
         """
-        Get list of loaded models.
+        Get loaded models.
+
+        The view is live and is not copied, so polling it is cheap.
 
         Returns:
-            List[str]: List of loaded model names.
+            KeysView[str]: View of loaded model names.
         """
-        return list(self.models.keys())
+        return self.models.keys()
+
+
+def _next_stream_text(response_iter: Any) -> Any:
+    """
+    Advance a llama.cpp generation stream by one chunk.
+
+    Runs in a worker thread, so the blocking decode step and the chunk
+    unpacking both happen off the event loop.
+
+    Args:
+        response_iter: Iterator over streamed completion chunks.
+
+    Returns:
+        Any: Text of the next chunk, or _STREAM_END when the stream is exhausted.
+    """
+    response = next(response_iter, _STREAM_END)
+    if isinstance(response, dict) and "choices" in response:
+        return response["choices"][0]["text"]
+    return response
+
+
+def _model_filenames(config: Dict[str, Any]) -> List[str]:
+    """
+    Get the files making up a model.
+
+    Args:
+        config: Model configuration.
+
+    Returns:
+        List[str]: All shard files if the model is split, else its single file.
+    """
+    return config.get("filenames") or [config["filename"]]
@@ -4,50 +4,91 @@ Prompt manager for the Clary AI API.
 This module provides prompt management for LLM models.
 """
 
-import json
 import logging
 import os
+import re
+from types import MappingProxyType
 from typing import Any, Dict, List, Optional, Union
 
-from jinja2 import Template
+import orjson
+from jinja2 import Environment, Template
 
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Options for JSON embedded in prompts: 2-space indent like json.dumps(indent=2),
+# with sorted keys so equal data always renders the same prompt
+_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
 
-class PromptManager:
+# A bare {{ name }} substitution, the only Jinja syntax simple templates use
+_VARIABLE_PATTERN = re.compile(r"\{\{\s*([A-Za-z_]\w*)\s*\}\}")
+
+
+class _SimpleTemplate:
     """
-    Prompt manager for managing prompt templates.
+    Renderer for templates made only of text and {{ name }} substitutions.
     
-    This class provides methods for loading, rendering, and managing prompt templates.
+    Renders the same output as Jinja for such templates without going
+    through Jinja's runtime.
     """
     
-    def __init__(self, templates_dir: Optional[str] = None):
+    def __init__(self, source: str):
         """
-        Initialize the prompt manager.
+        Split a simple template into literal text and variable names.
         
         Args:
-            templates_dir: Directory where prompt templates are stored.
+            source: Template source.
         """
-        self.templates_dir = templates_dir
-        self.templates = {}
+        # Jinja drops a single trailing newline by default
+        if source.endswith("\n"):
+            source = source[:-1]
         
-        # Load built-in templates
-        self._load_built_in_templates()
+        parts = _VARIABLE_PATTERN.split(source)
+        self._literals = parts[0::2]
+        self._names = parts[1::2]
+    
+    @staticmethod
+    def is_simple(source: str) -> bool:
+        """
+        Check whether a template can be rendered without Jinja.
         
-        # Load templates from directory if provided
-        if templates_dir:
-            self._load_templates_from_directory(templates_dir)
+        Args:
+            source: Template source.
+            
+        Returns:
+            bool: True if the template has no tags, comments, filters or
+                expressions beyond bare variable names.
+        """
+        if "\r" in source:
+            return False
         
-        logger.info(f"Initialized prompt manager with {len(self.templates)} templates")
+        remainder = _VARIABLE_PATTERN.sub("", source)
+        return "{{" not in remainder and "{%" not in remainder and "{#" not in remainder
     
-    def _load_built_in_templates(self) -> None:
-        """Load built-in prompt templates."""
-        logger.info("Loading built-in prompt templates")
+    def render(self, **variables: Any) -> str:
+        """
+        Render the template.
         
-        # Document understanding template
-        self.templates["document_understanding"] = """
+        Args:
+            **variables: Variables to substitute; missing ones render empty.
+            
+        Returns:
+            str: Rendered text.
+        """
+        literals = self._literals
+        parts = [literals[0]]
+        for name, literal in zip(self._names, literals[1:]):
+            parts.append(str(variables.get(name, "")))
+            parts.append(literal)
+        
+        return "".join(parts)
+
+
+# Built-in prompt templates, shared by all prompt managers
+_BUILT_IN_TEMPLATES = MappingProxyType({
+    # Document understanding template
+    "document_understanding": """
 You are an AI assistant that understands documents. You will be given the text and layout information of a document, and your task is to understand its structure, purpose, and key components.
 
 Document Text:
@@ -77,10 +118,10 @@ Provide your analysis in a structured JSON format with the following keys:
 - next_steps
 
 JSON Response:
-"""
-        
-        # Field extraction template
-        self.templates["field_extraction"] = """
+""",
+
+    # Field extraction template
+    "field_extraction": """
 You are an AI assistant that extracts information from documents. You will be given the text and layout information of a document, along with a list of fields to extract.
 
 Document Text:
@@ -103,10 +144,10 @@ Please extract the requested fields from the document. For each field, provide:
 Provide your extraction in a structured JSON format with field names as keys, and values containing the extracted information.
 
 JSON Response:
-"""
-        
-        # Table extraction template
-        self.templates["table_extraction"] = """
+""",
+
+    # Table extraction template
+    "table_extraction": """
 You are an AI assistant that extracts tables from documents. You will be given the text and layout information of a document, along with a list of tables to extract.
 
 Document Text:
@@ -130,10 +171,10 @@ Please extract the requested tables from the document. For each table, provide:
 Provide your extraction in a structured JSON format with table names as keys, and values containing the extracted information.
 
 JSON Response:
-"""
-        
-        # Validation template
-        self.templates["validation"] = """
+""",
+
+    # Validation template
+    "validation": """
 You are an AI assistant that validates extracted information from documents. You will be given the extracted fields and tables, along with the original document text and understanding.
 
 Document Text:
@@ -159,9 +200,72 @@ Provide your validation in a structured JSON format with the following keys:
 - corrections (suggested corrections)
 
 JSON Response:
-"""
+""",
+})
+
+
+def _compile_source(source: str, env: Environment) -> Union[Template, _SimpleTemplate]:
+    """
+    Compile a template source.
+    
+    Templates that only substitute variables skip Jinja entirely.
+    
+    Args:
+        source: Template source.
+        env: Jinja environment for templates that need Jinja.
+        
+    Returns:
+        Union[Template, _SimpleTemplate]: Compiled template.
+    """
+    if _SimpleTemplate.is_simple(source):
+        return _SimpleTemplate(source)
+    return env.from_string(source)
+
+
+# Built-in templates compiled once at import, keyed like PromptManager._compiled
+_BUILT_IN_COMPILED = MappingProxyType({
+    name: (source, _compile_source(source, Environment(autoescape=False, auto_reload=False)))
+    for name, source in _BUILT_IN_TEMPLATES.items()
+})
+
+
+class PromptManager:
+    """
+    Prompt manager for managing prompt templates.
+    
+    This class provides methods for loading, rendering, and managing prompt templates.
+    """
+    
+    def __init__(self, templates_dir: Optional[str] = None):
+        """
+        Initialize the prompt manager.
+        
+        Args:
+            templates_dir: Directory where prompt templates are stored.
+        """
+        self.templates_dir = templates_dir
+        self.templates = {}
+        self._env = Environment(autoescape=False, cache_size=400, auto_reload=False)
+        self._compiled = {}
+        
+        # Load built-in templates
+        self._load_built_in_templates()
+        
+        # Load templates from directory if provided
+        if templates_dir:
+            self._load_templates_from_directory(templates_dir)
         
-        logger.info(f"Loaded {len(self.templates)} built-in prompt templates")
+        logger.info("Initialized prompt manager with %d templates", len(self.templates))
+    
+    def _load_built_in_templates(self) -> None:
+        """Load built-in prompt templates."""
+        logger.info("Loading built-in prompt templates")
+        
+        # Reference the shared sources and their precompiled templates
+        self.templates.update(_BUILT_IN_TEMPLATES)
+        self._compiled.update(_BUILT_IN_COMPILED)
+        
+        logger.info("Loaded %d built-in prompt templates", len(self.templates))
     
     def _load_templates_from_directory(self, directory: str) -> None:
         """
@@ -170,7 +274,7 @@ JSON Response:
         Args:
             directory: Directory containing prompt templates.
         """
-        logger.info(f"Loading prompt templates from directory: {directory}")
+        logger.info("Loading prompt templates from directory: %s", directory)
         
         # Create directory if it doesn't exist
         os.makedirs(directory, exist_ok=True)
@@ -186,12 +290,13 @@ JSON Response:
                         template_content = f.read()
                     
                     self.templates[template_name] = template_content
-                    logger.info(f"Loaded template: {template_name}")
+                    self._compile_template(template_name)
+                    logger.info("Loaded template: %s", template_name)
                     
                 except Exception as e:
-                    logger.error(f"Error loading template {template_name}: {e}")
+                    logger.error("Error loading template %s: %s", template_name, e)
         
-        logger.info(f"Loaded {len(self.templates)} prompt templates from directory")
+        logger.info("Loaded %d prompt templates from directory", len(self.templates))
     
     def render_template(
         self,
@@ -208,26 +313,58 @@ JSON Response:
         Returns:
             str: Rendered prompt.
         """
-        logger.info(f"Rendering template: {template_name}")
+        logger.info("Rendering template: %s", template_name)
         
         # Get template
         if template_name not in self.templates:
             raise ValueError(f"Unknown template: {template_name}")
         
-        template_content = self.templates[template_name]
-        
         # Render template
         try:
-            template = Template(template_content)
+            template = self._compile_template(template_name)
+            
+            # Templates that only substitute variables embed structured values
+            # as JSON rather than their Python repr; Jinja templates get the
+            # objects themselves so they can loop over them or access fields
+            if isinstance(template, _SimpleTemplate):
+                variables = {
+                    name: self.format_json_for_prompt(value)
+                    if isinstance(value, (dict, list)) else value
+                    for name, value in variables.items()
+                }
+            
             rendered = template.render(**variables)
             
-            logger.info(f"Template rendered successfully: {template_name}")
+            logger.info("Template rendered successfully: %s", template_name)
             return rendered
             
         except Exception as e:
-            logger.error(f"Error rendering template {template_name}: {e}")
+            logger.error("Error rendering template %s: %s", template_name, e)
             raise
     
+    def _compile_template(self, template_name: str) -> Union[Template, _SimpleTemplate]:
+        """
+        Get the compiled form of a template, compiling it if needed.
+        
+        Templates that only substitute variables skip Jinja entirely. The
+        compiled template is reused as long as the source in self.templates
+        is unchanged.
+        
+        Args:
+            template_name: Name of the template.
+            
+        Returns:
+            Union[Template, _SimpleTemplate]: Compiled template.
+        """
+        template_content = self.templates[template_name]
+        
+        compiled = self._compiled.get(template_name)
+        if compiled is None or compiled[0] is not template_content:
+            compiled = (template_content, _compile_source(template_content, self._env))
+            self._compiled[template_name] = compiled
+        
+        return compiled[1]
+    
     def add_template(self, template_name: str, template_content: str) -> None:
         """
         Add a new prompt template.
@@ -236,10 +373,11 @@ JSON Response:
             template_name: Name of the template.
             template_content: Content of the template.
         """
-        logger.info(f"Adding template: {template_name}")
+        logger.info("Adding template: %s", template_name)
         
         # Add template
         self.templates[template_name] = template_content
+        self._compile_template(template_name)
         
         # Save template to directory if provided
         if self.templates_dir:
@@ -249,12 +387,12 @@ JSON Response:
                 with open(template_path, "w") as f:
                     f.write(template_content)
                 
-                logger.info(f"Template saved to file: {template_path}")
+                logger.info("Template saved to file: %s", template_path)
                 
             except Exception as e:
-                logger.error(f"Error saving template {template_name} to file: {e}")
+                logger.error("Error saving template %s to file: %s", template_name, e)
         
-        logger.info(f"Template added successfully: {template_name}")
+        logger.info("Template added successfully: %s", template_name)
     
     def get_template(self, template_name: str) -> str:
         """
@@ -290,7 +428,7 @@ JSON Response:
         Returns:
             str: Formatted JSON string.
         """
-        return json.dumps(data, indent=2)
+        return orjson.dumps(data, option=_JSON_OPTIONS).decode()
     
     def parse_json_from_response(self, response: str) -> Any:
         """
@@ -305,27 +443,109 @@ JSON Response:
         # Find JSON in response
         try:
             # Try to parse the entire response as JSON
-            return json.loads(response)
-        except json.JSONDecodeError:
-            # If that fails, try to extract JSON from the response
-            import re
-            
-            # Look for JSON objects
-            json_match = re.search(r'({.*})', response, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(1))
-                except json.JSONDecodeError:
-                    pass
-            
-            # Look for JSON arrays
-            json_match = re.search(r'(\[.*\])', response, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(1))
-                except json.JSONDecodeError:
-                    pass
+            return orjson.loads(response)
+        except orjson.JSONDecodeError:
+            # If that fails, look for embedded JSON objects, then arrays
+            for open_char in ("{", "["):
+                parsed = self._extract_embedded_json(response, open_char)
+                if parsed is not None:
+                    return parsed
             
             # If all else fails, return the raw response
             logger.warning("Could not parse JSON from response")
             return {"error": "Could not parse JSON from response", "raw_response": response}
+    
+    def find_json_end(self, response: str) -> int:
+        """
+        Find the end of the first complete JSON object in a response.
+        
+        Every prompt asks for a JSON object, and parse_json_from_response
+        prefers objects over arrays, so bracketed prose such as "[1]" before
+        the object is not taken for the answer. Balanced objects that do not
+        parse are skipped and the scan goes on from the next "{".
+        
+        Args:
+            response: Model response, possibly still being generated.
+            
+        Returns:
+            int: Index just past the closing brace, or -1 if no object is complete yet.
+        """
+        start = response.find("{")
+        while start != -1:
+            end = _find_json_end(response, start)
+            if end == -1:
+                # The object may still be being generated
+                return -1
+            
+            try:
+                orjson.loads(response[start:end])
+                return end
+            except orjson.JSONDecodeError:
+                start = response.find("{", start + 1)
+        
+        return -1
+    
+    def _extract_embedded_json(self, response: str, open_char: str) -> Any:
+        """
+        Extract the first parseable JSON value embedded in a response.
+        
+        Args:
+            response: Model response containing JSON.
+            open_char: Opening character of the value ("{" or "[").
+            
+        Returns:
+            Any: Parsed JSON data, or None if nothing could be parsed.
+        """
+        start = response.find(open_char)
+        while start != -1:
+            end = _find_json_end(response, start)
+            if end == -1:
+                # Nothing after an unterminated value can close it either
+                return None
+            
+            try:
+                return orjson.loads(response[start:end])
+            except orjson.JSONDecodeError:
+                start = response.find(open_char, start + 1)
+        
+        return None
+
+
+def _find_json_end(text: str, start: int) -> int:
+    """
+    Find the end of the balanced JSON value starting at a bracket.
+    
+    Scans forward once, tracking bracket depth and skipping brackets inside
+    string literals.
+    
+    Args:
+        text: Text containing the value.
+        start: Index of the opening "{" or "[".
+        
+    Returns:
+        int: Index just past the closing bracket, or -1 if unbalanced.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    
+    for i in range(start, len(text)):
+        char = text[i]
+        
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    
+    return -1
@@ -4,9 +4,14 @@ Document preprocessor for the Clary AI API.
 This module provides document preprocessing capabilities using Unstructured.io.
 """
 
+import asyncio
+import functools
 import logging
+import multiprocessing
 import os
-from typing import Any, Dict, List, Optional
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Set
 
 from unstructured.partition.auto import partition
 from unstructured.documents.elements import (
@@ -16,6 +21,117 @@ from unstructured.documents.elements import (
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Structure categories counted by the preprocessor, checked in order
+_ELEMENT_CATEGORIES = (
+    (Title, "titles"),
+    (NarrativeText, "paragraphs"),
+    (ListItem, "list_items"),
+    (Table, "tables"),
+)
+
+# Keywords used to detect the document type, matched against lowercased text
+_DOCUMENT_TYPE_PATTERN = re.compile(
+    r"invoice|bill|receipt|contract|agreement|resume|cv|tax|form|return"
+)
+
+# Document type (or tax form qualifier) signalled by each keyword
+_DOCUMENT_TYPE_KEYWORDS = {
+    "invoice": "invoice",
+    "bill": "invoice",
+    "receipt": "receipt",
+    "contract": "contract",
+    "agreement": "contract",
+    "resume": "resume",
+    "cv": "resume",
+    "tax": "tax",
+    "form": "tax_qualifier",
+    "return": "tax_qualifier",
+}
+
+# Default number of partitioning worker processes. Each worker imports
+# Unstructured.io and may load its layout models, so the pool is kept small
+# rather than sized to the CPU count
+DEFAULT_PARTITION_WORKERS = 2
+
+# Worker processes for partitioning, created on first use
+_partition_pool: Optional[ProcessPoolExecutor] = None
+
+# Category resolved for each element class seen so far
+_category_cache: Dict[type, Optional[str]] = {}
+
+
+def _get_element_category(element_type: type) -> Optional[str]:
+    """
+    Get the structure category of an element class.
+    
+    The isinstance checks run once per class; later lookups are a dict hit.
+    
+    Args:
+        element_type: Class of an element extracted by Unstructured.io.
+        
+    Returns:
+        Optional[str]: The structure category, or None if not counted.
+    """
+    try:
+        return _category_cache[element_type]
+    except KeyError:
+        category = None
+        for base, name in _ELEMENT_CATEGORIES:
+            if issubclass(element_type, base):
+                category = name
+                break
+        _category_cache[element_type] = category
+        return category
+
+
+def _get_partition_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Get the process pool used to partition documents.
+    
+    Workers are spawned rather than forked, since forking a process that
+    already runs llama.cpp and worker threads can copy held locks into the
+    child and deadlock it.
+    
+    Args:
+        max_workers: Number of worker processes, used when the pool is created.
+        
+    Returns:
+        ProcessPoolExecutor: The shared process pool.
+    """
+    global _partition_pool
+    
+    if _partition_pool is None:
+        _partition_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    
+    return _partition_pool
+
+
+def shutdown_partition_pool() -> None:
+    """Shut down the partitioning worker processes, if any were started."""
+    global _partition_pool
+    
+    if _partition_pool is not None:
+        _partition_pool.shutdown(wait=True, cancel_futures=True)
+        _partition_pool = None
+
+
+def _find_document_types(text: str, found: Set[str]) -> None:
+    """
+    Add the document types signalled by keywords in a text to a set.
+    
+    The text is lowercased before matching, so every match is exactly one
+    of the keywords, whatever case mapping its characters have.
+    
+    Args:
+        text: Text to scan.
+        found: Set of document types to update.
+    """
+    for match in _DOCUMENT_TYPE_PATTERN.finditer(text.lower()):
+        found.add(_DOCUMENT_TYPE_KEYWORDS[match.group()])
+
 
 class DocumentPreprocessor:
     """
@@ -24,16 +140,30 @@ class DocumentPreprocessor:
     This class provides methods for preprocessing documents using Unstructured.io.
     """
     
-    def __init__(self):
-        """Initialize the document preprocessor."""
+    def __init__(self, max_workers: int = DEFAULT_PARTITION_WORKERS):
+        """
+        Initialize the document preprocessor.
+        
+        Args:
+            max_workers: Number of partitioning worker processes. The pool is
+                shared, so the first preprocessor to partition a document sizes it.
+        """
+        self.max_workers = max_workers
         logger.info("Initialized document preprocessor with Unstructured.io")
     
-    async def process(self, document_path: str) -> Dict[str, Any]:
+    async def process(
+        self, 
+        document_path: str, 
+        strategy: str = "auto"
+    ) -> Dict[str, Any]:
         """
         Preprocess a document using Unstructured.io.
         
         Args:
             document_path: Path to the document file.
+            strategy: Unstructured.io partitioning strategy. "fast" reads
+                embedded PDF text without running OCR or layout models, for
+                when another extractor already provides the document text.
             
         Returns:
             Dict[str, Any]: The preprocessing results.
@@ -45,8 +175,13 @@ class DocumentPreprocessor:
         ext = ext.lower()
         
         try:
-            # Use Unstructured.io to partition the document
-            elements = partition(document_path)
+            # Use Unstructured.io to partition the document in a worker
+            # process, since parsing is CPU-bound and would block the event loop
+            loop = asyncio.get_running_loop()
+            elements = await loop.run_in_executor(
+                _get_partition_pool(self.max_workers),
+                functools.partial(partition, document_path, strategy=strategy),
+            )
             
             # Process the elements
             return self._process_elements(elements, document_path)
@@ -57,90 +192,101 @@ class DocumentPreprocessor:
     
     def _process_elements(
         self, 
-        elements: List[Element], 
+        elements: Iterable[Element], 
         document_path: str
     ) -> Dict[str, Any]:
         """
         Process the elements extracted by Unstructured.io.
         
+        The elements are traversed exactly once, so any iterable works.
+        
         Args:
-            elements: List of elements extracted by Unstructured.io.
+            elements: Elements extracted by Unstructured.io.
             document_path: Path to the document file.
             
         Returns:
             Dict[str, Any]: The preprocessing results.
         """
-        # Extract text from elements
-        text = "\n\n".join(str(element) for element in elements)
-        
-        # Categorize elements
-        titles = [e for e in elements if isinstance(e, Title)]
-        paragraphs = [e for e in elements if isinstance(e, NarrativeText)]
-        list_items = [e for e in elements if isinstance(e, ListItem)]
-        tables = [e for e in elements if isinstance(e, Table)]
-        
-        # Create structured representation
+        texts = []
         structured_elements = []
+        counts = {"titles": 0, "paragraphs": 0, "list_items": 0, "tables": 0}
+        document_types = set()
+        body_texts = []
+        
+        # Extract text, categorize and structure in a single pass, scanning
+        # titles for document type keywords as they come
         for element in elements:
-            element_type = type(element).__name__
+            element_text = str(element)
+            texts.append(element_text)
+            
+            category = _get_element_category(type(element))
+            if category is not None:
+                counts[category] += 1
+            
+            # Titles are short and most often name the document, so they are
+            # scanned before any body text
+            if category == "titles":
+                if "invoice" not in document_types:
+                    _find_document_types(element_text, document_types)
+            else:
+                body_texts.append(element_text)
+            
             element_dict = {
-                "type": element_type,
-                "text": str(element),
+                "type": type(element).__name__,
+                "text": element_text,
             }
             
             # Add metadata if available
-            if hasattr(element, "metadata"):
-                element_dict["metadata"] = element.metadata
+            metadata = getattr(element, "metadata", None)
+            if metadata is not None:
+                element_dict["metadata"] = metadata
                 
             # Add coordinates if available
-            if hasattr(element, "coordinates"):
-                element_dict["coordinates"] = element.coordinates
+            coordinates = getattr(element, "coordinates", None)
+            if coordinates is not None:
+                element_dict["coordinates"] = coordinates
                 
             structured_elements.append(element_dict)
         
+        # Scan the body text, stopping once an invoice keyword is found
+        # since invoice takes precedence over every other type
+        for body_text in body_texts:
+            if "invoice" in document_types:
+                break
+            _find_document_types(body_text, document_types)
+        
+        text = "\n\n".join(texts)
+        
         # Create result dictionary
         result = {
             "text": text,
             "elements": structured_elements,
-            "document_type": self._detect_document_type(elements, document_path),
-            "structure": {
-                "titles": len(titles),
-                "paragraphs": len(paragraphs),
-                "list_items": len(list_items),
-                "tables": len(tables),
-            }
+            "document_type": self._classify_document_type(document_types),
+            "structure": counts
         }
         
         return result
     
-    def _detect_document_type(
-        self, 
-        elements: List[Element], 
-        document_path: str
-    ) -> str:
+    def _classify_document_type(self, found: Set[str]) -> str:
         """
-        Detect the document type based on content and structure.
+        Pick the document type from the keyword types found in a document.
         
         Args:
-            elements: List of elements extracted by Unstructured.io.
-            document_path: Path to the document file.
+            found: Document types signalled by keywords in the document.
             
         Returns:
             str: The detected document type.
         """
-        # Extract text for analysis
-        text = " ".join(str(element) for element in elements).lower()
-        
         # Simple heuristic-based detection
-        if "invoice" in text or "bill" in text:
+        if "invoice" in found:
             return "invoice"
-        elif "receipt" in text:
+        elif "receipt" in found:
             return "receipt"
-        elif "contract" in text or "agreement" in text:
+        elif "contract" in found:
             return "contract"
-        elif "resume" in text or "cv" in text:
+        elif "resume" in found:
             return "resume"
-        elif "tax" in text and ("form" in text or "return" in text):
+        elif "tax" in found and "tax_qualifier" in found:
             return "tax_form"
         else:
             return "general"
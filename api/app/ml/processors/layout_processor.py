@@ -6,15 +6,70 @@ This module provides layout analysis capabilities.
 
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
-from PIL import Image
 
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Words whose tops are within this distance of a line's first word share the line
+LINE_THRESHOLD = 10
+
+# Vertical gap between consecutive lines that starts a new block
+BLOCK_GAP_THRESHOLD = 20
+
+# Pages with fewer words than this skip layout analysis when sparse bypass is on
+SPARSE_WORD_THRESHOLD = 30
+
+# A tab or a run of spaces anywhere in a block's text marks a table
+_TABLE_PATTERN = re.compile(r"\t| {4}")
+
+# A line starting with a bullet or list number marks a list
+_LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[•*-]|[12]\.)", re.MULTILINE)
+
+
+def _find_line_starts(sorted_top: np.ndarray, threshold: float) -> List[int]:
+    """
+    Find where each line starts in a sorted array of word tops.
+    
+    The next line's start is looked up for every word in one vectorized
+    search, so the only Python loop left hops from line to line.
+    
+    Args:
+        sorted_top: Word tops in ascending order.
+        threshold: Maximum distance from a line's first word.
+        
+    Returns:
+        List[int]: Index of the first word of each line.
+    """
+    next_start = np.searchsorted(sorted_top, sorted_top + threshold, side="left").tolist()
+    
+    starts = []
+    start = 0
+    while start < len(next_start):
+        starts.append(start)
+        start = next_start[start]
+    
+    return starts
+
+
+def _find_block_starts(top: np.ndarray, bottom: np.ndarray, threshold: float) -> List[int]:
+    """
+    Find where each block starts in a sequence of lines.
+    
+    Args:
+        top: Line tops in reading order.
+        bottom: Line bottoms in reading order.
+        threshold: Gap to the previous line that starts a new block.
+        
+    Returns:
+        List[int]: Index of the first line of each block.
+    """
+    return [0] + (np.flatnonzero(top[1:] - bottom[:-1] >= threshold) + 1).tolist()
+
 
 class LayoutProcessor:
     """
@@ -23,20 +78,24 @@ class LayoutProcessor:
     This class provides methods for analyzing document layout.
     """
     
-    def __init__(self, model_name: str = "layoutlm"):
+    def __init__(self, model_name: str = "layoutlm", sparse_bypass: bool = True):
         """
         Initialize the layout processor.
         
         Args:
             model_name: Name of the layout model to use.
+            sparse_bypass: Whether pages with few words are returned as a
+                single paragraph block instead of being analyzed.
         """
         self.model_name = model_name
+        self.sparse_bypass = sparse_bypass
         logger.info(f"Initialized layout processor with model: {model_name}")
     
     async def process(
         self, 
         document_path: str, 
-        ocr_result: Dict[str, Any]
+        ocr_result: Dict[str, Any],
+        fast_path: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
         Process a document and analyze layout.
@@ -44,6 +103,8 @@ class LayoutProcessor:
         Args:
             document_path: Path to the document file.
             ocr_result: OCR results from OCRProcessor.
+            fast_path: Whether to bypass layout analysis for sparse pages
+                (defaults to the processor's sparse_bypass setting).
             
         Returns:
             Dict[str, Any]: The layout analysis results.
@@ -53,12 +114,15 @@ class LayoutProcessor:
         # In a real implementation, use LayoutLM or similar model
         # For now, implement a simple layout analysis based on OCR results
         
+        if fast_path is None:
+            fast_path = self.sparse_bypass
+        
         # Check if document has pages
         if "pages" in ocr_result:
             # Process each page
             pages = []
             for page in ocr_result["pages"]:
-                page_result = await self._analyze_page(page)
+                page_result = await self._analyze_page(page, fast_path)
                 pages.append(page_result)
             
             return {
@@ -67,41 +131,73 @@ class LayoutProcessor:
             }
         else:
             # Process single page
-            return await self._analyze_page(ocr_result)
+            return await self._analyze_page(ocr_result, fast_path)
     
-    async def _analyze_page(self, page: Dict[str, Any]) -> Dict[str, Any]:
+    async def _analyze_page(self, page: Dict[str, Any], fast_path: bool = False) -> Dict[str, Any]:
         """
         Analyze the layout of a page.
         
         Args:
             page: OCR results for a page.
+            fast_path: Whether to bypass layout analysis if the page is sparse.
             
         Returns:
             Dict[str, Any]: The layout analysis results.
         """
-        # Extract words from OCR result
-        words = page.get("words", [])
+        # Group words into lines based on vertical position, reading the
+        # column layout from OCRProcessor directly when available
+        word_boxes = page.get("word_boxes")
+        if word_boxes is not None:
+            word_count = len(word_boxes["text"])
+        else:
+            word_count = len(page.get("words", []))
         
-        # Group words into lines based on vertical position
-        lines = self._group_words_into_lines(words)
+        # Sparse pages become a single paragraph: all words form one line in
+        # reading order and block grouping and classification are skipped
+        sparse = fast_path and word_count < SPARSE_WORD_THRESHOLD
         
-        # Group lines into blocks based on spacing
-        blocks = self._group_lines_into_blocks(lines)
+        if word_boxes is not None:
+            lines = self._group_word_boxes_into_lines(
+                word_boxes, page.get("page", 1), single_line=sparse
+            )
+        else:
+            lines = self._group_words_into_lines(
+                page.get("words", []), single_line=sparse
+            )
         
-        # Classify blocks (header, paragraph, list, table, etc.)
-        blocks = self._classify_blocks(blocks)
+        if sparse:
+            blocks = [
+                {
+                    "lines": lines,
+                    "text": line["text"],
+                    "bbox": line["bbox"],
+                    "type": "Paragraph",
+                }
+                for line in lines
+            ]
+        else:
+            # Group lines into blocks based on spacing
+            blocks = self._group_lines_into_blocks(lines)
+            
+            # Classify blocks (header, paragraph, list, table, etc.)
+            blocks = self._classify_blocks(blocks)
         
         return {
             "blocks": blocks,
             "page": page.get("page", 1),
         }
     
-    def _group_words_into_lines(self, words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _group_words_into_lines(
+        self,
+        words: List[Dict[str, Any]],
+        single_line: bool = False,
+    ) -> List[Dict[str, Any]]:
         """
         Group words into lines based on vertical position.
         
         Args:
             words: List of words with bounding boxes.
+            single_line: Put all words in one line, in reading order.
             
         Returns:
             List[Dict[str, Any]]: List of lines.
@@ -109,36 +205,115 @@ class LayoutProcessor:
         if not words:
             return []
         
-        # Sort words by top position and then by left position
-        sorted_words = sorted(words, key=lambda w: (w["bbox"]["top"], w["bbox"]["left"]))
+        # Pull the coordinates into arrays once instead of per comparison
+        left, top, right, bottom = self._bbox_arrays([w["bbox"] for w in words])
+        order, starts = self._order_into_lines(left, top, single_line)
         
-        lines = []
-        current_line = [sorted_words[0]]
-        current_top = sorted_words[0]["bbox"]["top"]
+        line_words = [
+            [words[i] for i in indices]
+            for indices in np.split(order, starts[1:])
+        ]
+        bboxes = self._merge_bbox_groups(
+            left[order], top[order], right[order], bottom[order], starts,
+            [ws[0]["bbox"]["page"] for ws in line_words],
+        )
         
-        for word in sorted_words[1:]:
-            # If word is on the same line (within threshold)
-            if abs(word["bbox"]["top"] - current_top) < 10:
-                current_line.append(word)
-            else:
-                # Start a new line
-                lines.append({
-                    "words": current_line,
-                    "text": " ".join(w["text"] for w in current_line),
-                    "bbox": self._merge_bboxes([w["bbox"] for w in current_line]),
-                })
-                current_line = [word]
-                current_top = word["bbox"]["top"]
-        
-        # Add the last line
-        if current_line:
-            lines.append({
-                "words": current_line,
-                "text": " ".join(w["text"] for w in current_line),
-                "bbox": self._merge_bboxes([w["bbox"] for w in current_line]),
-            })
+        return [
+            {
+                "words": ws,
+                "text": " ".join(w["text"] for w in ws),
+                "bbox": bbox,
+            }
+            for ws, bbox in zip(line_words, bboxes)
+        ]
+    
+    def _group_word_boxes_into_lines(
+        self,
+        word_boxes: Dict[str, List[Any]],
+        page_num: int,
+        single_line: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Group words given as columns into lines based on vertical position.
+        
+        Args:
+            word_boxes: Word texts, left, top, width, height and conf columns.
+            page_num: Page number.
+            single_line: Put all words in one line, in reading order.
+            
+        Returns:
+            List[Dict[str, Any]]: List of lines.
+        """
+        texts = word_boxes["text"]
+        if not texts:
+            return []
+        
+        left = np.asarray(word_boxes["left"])
+        top = np.asarray(word_boxes["top"])
+        right = left + np.asarray(word_boxes["width"])
+        bottom = top + np.asarray(word_boxes["height"])
+        order, starts = self._order_into_lines(left, top, single_line)
         
-        return lines
+        # Word dicts are only built here, for the layout output
+        lefts, tops = word_boxes["left"], word_boxes["top"]
+        widths, heights = word_boxes["width"], word_boxes["height"]
+        confs = word_boxes["conf"]
+        line_words = [
+            [
+                {
+                    "text": texts[i],
+                    "bbox": {
+                        "left": lefts[i],
+                        "top": tops[i],
+                        "width": widths[i],
+                        "height": heights[i],
+                        "page": page_num,
+                    },
+                    "conf": confs[i],
+                }
+                for i in indices
+            ]
+            for indices in np.split(order, starts[1:])
+        ]
+        bboxes = self._merge_bbox_groups(
+            left[order], top[order], right[order], bottom[order], starts,
+            [page_num] * len(starts),
+        )
+        
+        return [
+            {
+                "words": ws,
+                "text": " ".join(w["text"] for w in ws),
+                "bbox": bbox,
+            }
+            for ws, bbox in zip(line_words, bboxes)
+        ]
+    
+    def _order_into_lines(
+        self,
+        left: np.ndarray,
+        top: np.ndarray,
+        single_line: bool = False,
+    ) -> Tuple[np.ndarray, List[int]]:
+        """
+        Order words for reading and find where each line starts.
+        
+        Args:
+            left: Word left edges.
+            top: Word top edges.
+            single_line: Treat all words as one line.
+            
+        Returns:
+            Tuple[np.ndarray, List[int]]: Word indices sorted by top position
+                and then by left position, and the position in that order
+                of the first word of each line.
+        """
+        order = np.lexsort((left, top))
+        
+        if single_line:
+            return order, [0]
+        
+        return order, _find_line_starts(top[order], LINE_THRESHOLD)
     
     def _group_lines_into_blocks(self, lines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -153,34 +328,24 @@ class LayoutProcessor:
         if not lines:
             return []
         
-        blocks = []
-        current_block = [lines[0]]
-        current_bottom = lines[0]["bbox"]["top"] + lines[0]["bbox"]["height"]
+        left, top, right, bottom = self._bbox_arrays([l["bbox"] for l in lines])
         
-        for line in lines[1:]:
-            # If line is close to the previous line
-            if line["bbox"]["top"] - current_bottom < 20:
-                current_block.append(line)
-            else:
-                # Start a new block
-                blocks.append({
-                    "lines": current_block,
-                    "text": "\n".join(l["text"] for l in current_block),
-                    "bbox": self._merge_bboxes([l["bbox"] for l in current_block]),
-                })
-                current_block = [line]
-            
-            current_bottom = line["bbox"]["top"] + line["bbox"]["height"]
-        
-        # Add the last block
-        if current_block:
-            blocks.append({
-                "lines": current_block,
-                "text": "\n".join(l["text"] for l in current_block),
-                "bbox": self._merge_bboxes([l["bbox"] for l in current_block]),
-            })
+        starts = _find_block_starts(top, bottom, BLOCK_GAP_THRESHOLD)
+        
+        block_lines = [lines[a:b] for a, b in zip(starts, starts[1:] + [len(lines)])]
+        bboxes = self._merge_bbox_groups(
+            left, top, right, bottom, starts,
+            [ls[0]["bbox"]["page"] for ls in block_lines],
+        )
         
-        return blocks
+        return [
+            {
+                "lines": ls,
+                "text": "\n".join(l["text"] for l in ls),
+                "bbox": bbox,
+            }
+            for ls, bbox in zip(block_lines, bboxes)
+        ]
     
     def _classify_blocks(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -205,10 +370,10 @@ class LayoutProcessor:
             if len(lines) == 1 and len(text) < 100:
                 block_type = "Header"
             # Check if it's a table (contains multiple tabs or spaces)
-            elif any("\t" in line["text"] or "    " in line["text"] for line in lines):
+            elif _TABLE_PATTERN.search(text):
                 block_type = "Table"
             # Check if it's a list
-            elif any(line["text"].strip().startswith(("•", "-", "*", "1.", "2.")) for line in lines):
+            elif _LIST_ITEM_PATTERN.search(text):
                 block_type = "List"
             # Default to paragraph
             else:
@@ -221,6 +386,62 @@ class LayoutProcessor:
         
         return classified_blocks
     
+    def _bbox_arrays(self, bboxes: List[Dict[str, Any]]) -> Tuple[np.ndarray, ...]:
+        """
+        Convert bounding boxes to coordinate arrays.
+        
+        Args:
+            bboxes: List of bounding boxes.
+            
+        Returns:
+            Tuple[np.ndarray, ...]: Left, top, right and bottom edges.
+        """
+        coords = np.array(
+            [(b["left"], b["top"], b["width"], b["height"]) for b in bboxes]
+        ).reshape(-1, 4)
+        left, top, width, height = coords.T
+        
+        return left, top, left + width, top + height
+    
+    def _merge_bbox_groups(
+        self,
+        left: np.ndarray,
+        top: np.ndarray,
+        right: np.ndarray,
+        bottom: np.ndarray,
+        starts: List[int],
+        pages: List[Any],
+    ) -> List[Dict[str, Any]]:
+        """
+        Merge consecutive groups of bounding boxes, one reduction per edge.
+        
+        Args:
+            left: Left edges.
+            top: Top edges.
+            right: Right edges.
+            bottom: Bottom edges.
+            starts: Index of the first box of each group, ascending.
+            pages: Page of each group.
+            
+        Returns:
+            List[Dict[str, Any]]: Merged bounding box of each group.
+        """
+        lefts = np.minimum.reduceat(left, starts).tolist()
+        tops = np.minimum.reduceat(top, starts).tolist()
+        rights = np.maximum.reduceat(right, starts).tolist()
+        bottoms = np.maximum.reduceat(bottom, starts).tolist()
+        
+        return [
+            {
+                "left": l,
+                "top": t,
+                "width": r - l,
+                "height": b - t,
+                "page": page,
+            }
+            for l, t, r, b, page in zip(lefts, tops, rights, bottoms, pages)
+        ]
+    
     def _merge_bboxes(self, bboxes: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Merge multiple bounding boxes into one.
@@ -234,16 +455,6 @@ class LayoutProcessor:
         if not bboxes:
             return {"left": 0, "top": 0, "width": 0, "height": 0, "page": 1}
         
-        left = min(bbox["left"] for bbox in bboxes)
-        top = min(bbox["top"] for bbox in bboxes)
-        right = max(bbox["left"] + bbox["width"] for bbox in bboxes)
-        bottom = max(bbox["top"] + bbox["height"] for bbox in bboxes)
-        page = bboxes[0]["page"]
-        
-        return {
-            "left": left,
-            "top": top,
-            "width": right - left,
-            "height": bottom - top,
-            "page": page,
-        }
+        return self._merge_bbox_groups(
+            *self._bbox_arrays(bboxes), [0], [bboxes[0]["page"]]
+        )[0]
@@ -4,18 +4,67 @@ OCR processor for the DocuAgent API.
 This module provides OCR processing capabilities.
 """
 
+import asyncio
+import copy
+import hashlib
 import logging
 import os
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pytesseract
 from PIL import Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Image file extensions OCR'd directly
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"})
+
+# Number of PDF pages rendered to images at a time
+PDF_RENDER_CHUNK_PAGES = 8
+
+# Resolution PDF pages are rendered at for OCR
+PDF_RENDER_DPI = 200
+
+# Grayscale value below which a pixel counts as ink
+INK_PIXEL_THRESHOLD = 200
+
+# Fraction of ink pixels below which a page is treated as blank
+BLANK_PAGE_INK_RATIO = 0.001
+
+# Word box columns returned for each page
+WORD_BOX_KEYS = ("text", "left", "top", "width", "height", "conf")
+
+# Number of PDF OCR results kept for re-runs on identical files
+PDF_RESULT_CACHE_SIZE = 16
+
+# Size of the blocks a file is read in when hashing it
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# OCR results of recent PDFs, keyed by content hash and OCR settings
+_pdf_result_cache: "OrderedDict[Tuple[str, str, bool], Dict[str, Any]]" = OrderedDict()
+
+
+def _file_digest(path: str) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+    
+    Args:
+        path: Path to the file.
+        
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
 class OCRProcessor:
     """
@@ -24,14 +73,24 @@ class OCRProcessor:
     This class provides methods for extracting text from images and PDFs.
     """
     
-    def __init__(self, model_name: str = "tesseract"):
+    def __init__(
+        self, 
+        model_name: str = "tesseract", 
+        max_concurrency: Optional[int] = None,
+        skip_blank_pages: bool = True,
+    ):
         """
         Initialize the OCR processor.
         
         Args:
             model_name: Name of the OCR model to use.
+            max_concurrency: Maximum number of pages OCR'd at once
+                (defaults to the CPU count).
+            skip_blank_pages: Whether to skip OCR for pages with almost no ink.
         """
         self.model_name = model_name
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.skip_blank_pages = skip_blank_pages
         logger.info(f"Initialized OCR processor with model: {model_name}")
     
     async def process(self, document_path: str) -> Dict[str, Any]:
@@ -52,7 +111,7 @@ class OCRProcessor:
         
         if ext == ".pdf":
             return await self._process_pdf(document_path)
-        elif ext in [".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"]:
+        elif ext in IMAGE_EXTENSIONS:
             return await self._process_image(document_path)
         else:
             raise ValueError(f"Unsupported file format: {ext}")
@@ -69,19 +128,77 @@ class OCRProcessor:
         """
         logger.info(f"Processing PDF: {pdf_path}")
         
-        # Convert PDF to images
-        images = convert_from_path(pdf_path)
+        # Retries and re-runs often submit the same file again; reuse the
+        # earlier result instead of rendering and OCR'ing every page again
+        digest = await asyncio.to_thread(_file_digest, pdf_path)
+        cache_key = (digest, self.model_name, self.skip_blank_pages)
+        cached = _pdf_result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Reusing OCR results for identical PDF: {pdf_path}")
+            _pdf_result_cache.move_to_end(cache_key)
+            return copy.deepcopy(cached)
         
-        # Process each page
-        pages = []
-        for i, image in enumerate(images):
-            page_result = await self._process_pil_image(image, page_num=i+1)
-            pages.append(page_result)
+        page_count = (await asyncio.to_thread(pdfinfo_from_path, pdf_path))["Pages"]
         
-        return {
+        # Rendered pages wait here for OCR; the bound caps how many images
+        # are held in memory at once
+        queue = asyncio.Queue(maxsize=PDF_RENDER_CHUNK_PAGES)
+        num_workers = max(1, min(self.max_concurrency, page_count))
+        results = {}
+        
+        async def render_pages() -> None:
+            # Convert the PDF to images a chunk of pages at a time
+            for first_page in range(1, page_count + 1, PDF_RENDER_CHUNK_PAGES):
+                last_page = min(first_page + PDF_RENDER_CHUNK_PAGES - 1, page_count)
+                images = await asyncio.to_thread(
+                    convert_from_path,
+                    pdf_path,
+                    dpi=PDF_RENDER_DPI,
+                    first_page=first_page,
+                    last_page=last_page,
+                    # Split the chunk across several poppler processes
+                    thread_count=min(self.max_concurrency, last_page - first_page + 1),
+                    # Tesseract only needs grayscale, a third of the RGB bytes
+                    grayscale=True,
+                )
+                for offset, image in enumerate(images):
+                    await queue.put((first_page + offset, image))
+            
+            # Tell each OCR worker there are no more pages
+            for _ in range(num_workers):
+                await queue.put(None)
+        
+        async def ocr_pages() -> None:
+            # Process pages as they are rendered; Tesseract runs outside the GIL
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                page_num, image = item
+                results[page_num] = await self._process_pil_image(image, page_num=page_num)
+        
+        tasks = [asyncio.create_task(render_pages())]
+        tasks.extend(asyncio.create_task(ocr_pages()) for _ in range(num_workers))
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        pages = [results[page_num] for page_num in sorted(results)]
+        
+        result = {
             "text": "\n\n".join(page["text"] for page in pages),
             "pages": pages,
         }
+        
+        # Cache a private copy so callers can't mutate the cached result
+        _pdf_result_cache[cache_key] = copy.deepcopy(result)
+        if len(_pdf_result_cache) > PDF_RESULT_CACHE_SIZE:
+            _pdf_result_cache.popitem(last=False)
+        
+        return result
     
     async def _process_image(self, image_path: str) -> Dict[str, Any]:
         """
@@ -117,41 +234,114 @@ class OCRProcessor:
             Dict[str, Any]: The OCR results.
         """
         if self.model_name == "tesseract":
-            # Extract text using Tesseract
-            text = pytesseract.image_to_string(image)
-            
-            # Extract word and line bounding boxes
-            word_data = pytesseract.image_to_data(
-                image, 
-                output_type=pytesseract.Output.DICT
-            )
-            
-            # Construct words with bounding boxes
-            words = []
-            for i in range(len(word_data["text"])):
-                if word_data["text"][i].strip():
-                    words.append({
-                        "text": word_data["text"][i],
-                        "bbox": {
-                            "left": word_data["left"][i],
-                            "top": word_data["top"][i],
-                            "width": word_data["width"][i],
-                            "height": word_data["height"][i],
-                            "page": page_num,
-                        },
-                        "conf": word_data["conf"][i],
-                    })
-            
-            return {
-                "text": text,
-                "words": words,
-                "page": page_num,
-            }
+            # Run Tesseract in a worker thread so the event loop stays free
+            return await asyncio.to_thread(self._run_tesseract, image, page_num)
         
         elif self.model_name == "paddleocr":
             # In a real implementation, use PaddleOCR here
             # For now, fall back to Tesseract
-            return await self._process_pil_image(image, page_num)
+            return await asyncio.to_thread(self._run_tesseract, image, page_num)
         
         else:
             raise ValueError(f"Unsupported OCR model: {self.model_name}")
+    
+    def _run_tesseract(self, image: Image.Image, page_num: int) -> Dict[str, Any]:
+        """
+        Extract text and word bounding boxes from an image with Tesseract.
+        
+        Args:
+            image: PIL Image to process.
+            page_num: Page number.
+            
+        Returns:
+            Dict[str, Any]: The OCR results.
+        """
+        # Tesseract works on grayscale; converting first shrinks the image
+        # pytesseract writes out for every call
+        if image.mode != "L":
+            image = image.convert("L")
+        
+        # Blank pages (covers, separators) only give Tesseract noise to chew on
+        if self.skip_blank_pages and self._is_blank(image):
+            return {
+                "text": "",
+                "word_boxes": {key: [] for key in WORD_BOX_KEYS},
+                "page": page_num,
+            }
+        
+        # Extract word and line bounding boxes; the text is rebuilt from the
+        # same run rather than running Tesseract again with image_to_string
+        word_data = pytesseract.image_to_data(
+            image, 
+            output_type=pytesseract.Output.DICT
+        )
+        text = self._text_from_word_data(word_data)
+        
+        # Keep the recognized words as columns rather than a dict per word
+        keep = [i for i, word in enumerate(word_data["text"]) if word.strip()]
+        word_boxes = {
+            key: [word_data[key][i] for i in keep]
+            for key in WORD_BOX_KEYS
+        }
+        
+        return {
+            "text": text,
+            "word_boxes": word_boxes,
+            "page": page_num,
+        }
+    
+    def _is_blank(self, image: Image.Image) -> bool:
+        """
+        Check whether a grayscale image has almost no ink.
+        
+        Args:
+            image: Grayscale PIL Image.
+            
+        Returns:
+            bool: True if the share of dark pixels is below the blank threshold.
+        """
+        pixels = np.asarray(image, dtype=np.uint8)
+        if pixels.size == 0:
+            return True
+        
+        ink = np.count_nonzero(pixels < INK_PIXEL_THRESHOLD)
+        return ink < BLANK_PAGE_INK_RATIO * pixels.size
+    
+    def _text_from_word_data(self, word_data: Dict[str, List[Any]]) -> str:
+        """
+        Rebuild page text from Tesseract word data.
+        
+        Words are joined with spaces, lines with newlines and paragraphs with
+        blank lines, following Tesseract's plain text output.
+        
+        Args:
+            word_data: Output of pytesseract.image_to_data as a dict.
+            
+        Returns:
+            str: The page text.
+        """
+        paragraphs = []
+        current_paragraph = None
+        current_line = None
+        
+        for i, word in enumerate(word_data["text"]):
+            if not word.strip():
+                continue
+            
+            paragraph_key = (word_data["block_num"][i], word_data["par_num"][i])
+            line_key = word_data["line_num"][i]
+            
+            if paragraph_key != current_paragraph:
+                paragraphs.append([[word]])
+                current_paragraph = paragraph_key
+                current_line = line_key
+            elif line_key != current_line:
+                paragraphs[-1].append([word])
+                current_line = line_key
+            else:
+                paragraphs[-1][-1].append(word)
+        
+        return "\n\n".join(
+            "\n".join(" ".join(line) for line in paragraph)
+            for paragraph in paragraphs
+        )
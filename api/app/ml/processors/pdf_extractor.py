@@ -4,18 +4,34 @@ PDF text extractor for the Clary AI API.
 This module provides PDF text extraction capabilities using Marker.
 """
 
+import functools
 import logging
 import os
 from typing import Any, Dict, List, Optional
 
-import marker
-from marker.convert import convert_pdf_to_text
-from marker.models import load_model
-
 # Configure logging
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=4)
+def _get_marker_model(model_name: str) -> Any:
+    """
+    Load a Marker model once per process and share it across extractors.
+    
+    Args:
+        model_name: Name of the Marker model.
+        
+    Returns:
+        Any: The loaded Marker model.
+    """
+    # Imported here so Marker and its model stack only load in processes
+    # that actually extract PDFs
+    from marker.models import load_model
+    
+    logger.info(f"Loading Marker model: {model_name}")
+    return load_model(model_name)
+
+
 class PDFExtractor:
     """
     PDF extractor for extracting text from PDF documents.
@@ -56,9 +72,11 @@ class PDFExtractor:
         try:
             # Load model if not already loaded
             if self.model is None:
-                self.model = load_model(self.model_name)
+                self.model = _get_marker_model(self.model_name)
             
             # Extract text using Marker
+            from marker.convert import convert_pdf_to_text
+            
             text_by_page = convert_pdf_to_text(
                 document_path,
                 model=self.model,
@@ -93,25 +111,12 @@ class PDFExtractor:
         # Create pages structure
         pages = []
         for i, page_text in enumerate(text_by_page):
-            # Simple line-based structure
-            lines = page_text.split("\n")
-            words = []
-            
-            # Create a simple word-level representation
-            for line in lines:
-                line_words = line.split()
-                for word in line_words:
-                    words.append({
-                        "text": word,
-                        # Note: Marker doesn't provide bounding boxes,
-                        # so we're not including them here
-                    })
-            
+            # Marker doesn't provide bounding boxes, so words are only
+            # counted; lines can be recovered from the page text on demand
             pages.append({
                 "text": page_text,
                 "page": i + 1,
-                "lines": lines,
-                "words": words
+                "word_count": len(page_text.split()),
             })
         
         # Create result dictionary
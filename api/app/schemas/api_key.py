@@ -7,7 +7,7 @@ This module defines the API key schemas for the API.
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ApiKeyBase(BaseModel):
@@ -15,7 +15,7 @@ class ApiKeyBase(BaseModel):
 
     name: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = None
-    tier: str = Field("lite", regex="^(lite|standard|professional)$")
+    tier: str = Field("lite", pattern="^(lite|standard|professional)$")
 
 
 class ApiKeyCreate(ApiKeyBase):
@@ -30,7 +30,7 @@ class ApiKeyUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=255)
     description: Optional[str] = None
     is_active: Optional[bool] = None
-    tier: Optional[str] = Field(None, regex="^(lite|standard|professional)$")
+    tier: Optional[str] = Field(None, pattern="^(lite|standard|professional)$")
     valid_days: Optional[int] = Field(None, ge=1, le=365)
 
 
@@ -47,7 +47,4 @@ class ApiKeyResponse(ApiKeyBase):
     last_used_at: Optional[datetime] = None
     usage_count: int
 
-    class Config:
-        """Pydantic config."""
-
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
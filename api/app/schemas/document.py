@@ -7,7 +7,7 @@ This module defines Pydantic schemas for document-related operations.
 from datetime import datetime
 from typing import Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class DocumentBase(BaseModel):
@@ -43,10 +43,7 @@ class DocumentInDBBase(DocumentBase):
     extraction_status: Optional[str] = None
     template_id: Optional[int] = None
     
-    class Config:
-        """Pydantic config."""
-        
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Document(DocumentInDBBase):
@@ -71,6 +68,8 @@ class BoundingBox(BaseModel):
     height: int
     page: int
     original_page: Optional[int] = None
+    
+    model_config = ConfigDict(frozen=True)
 
 
 class ExtractedField(BaseModel):
@@ -79,6 +78,8 @@ class ExtractedField(BaseModel):
     value: str
     confidence: float
     bounding_box: Optional[BoundingBox] = None
+    
+    model_config = ConfigDict(frozen=True)
 
 
 class LineItem(BaseModel):
@@ -88,6 +89,8 @@ class LineItem(BaseModel):
     quantity: str
     unit_price: str
     total: str
+    
+    model_config = ConfigDict(frozen=True)
 
 
 class ExtractionResults(BaseModel):
@@ -7,7 +7,7 @@ This module defines Pydantic schemas for template-related operations.
 from datetime import datetime
 from typing import Dict, List, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TemplateFieldColumn(BaseModel):
@@ -58,10 +58,7 @@ class TemplateInDBBase(TemplateBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        """Pydantic config."""
-        
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Template(TemplateInDBBase):
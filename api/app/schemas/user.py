@@ -7,7 +7,7 @@ This module defines Pydantic schemas for user-related operations.
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 
 class UserBase(BaseModel):
@@ -40,10 +40,7 @@ class UserInDBBase(UserBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        """Pydantic config."""
-        
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class User(UserInDBBase):
@@ -8,12 +8,16 @@ import logging
 import os
 import asyncio
 import datetime
-from typing import Any, Dict, Optional
+import functools
+from typing import Any, Dict, Optional, Set
+
+import httpx
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.ml.processors.document_preprocessor import DocumentPreprocessor
 from app.ml.processors.pdf_extractor import PDFExtractor
-from app.ml.processors.ocr_processor import OCRProcessor
+from app.ml.processors.ocr_processor import IMAGE_EXTENSIONS, OCRProcessor
 from app.ml.processors.layout_processor import LayoutProcessor
 from app.ml.agents.extraction_agent import ExtractionAgent
 
@@ -21,6 +25,88 @@ from app.ml.agents.extraction_agent import ExtractionAgent
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Workflows running in the background, referenced so they are not garbage
+# collected before they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+# Limits how many background workflows run at once; the rest wait their turn
+_workflow_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_WORKFLOWS)
+
+# Number of attempts to deliver a completion callback
+CALLBACK_MAX_ATTEMPTS = 3
+
+# Delay in seconds before the first callback retry, doubled after each retry
+CALLBACK_RETRY_DELAY = 1.0
+
+# Shared client so callbacks reuse connections instead of a handshake each
+_callback_client = httpx.AsyncClient(
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+)
+
+
+@functools.lru_cache(maxsize=1)
+def get_document_preprocessor() -> DocumentPreprocessor:
+    """Get the document preprocessor shared by all documents and workflows."""
+    return DocumentPreprocessor(max_workers=settings.PARTITION_WORKERS)
+
+
+@functools.lru_cache(maxsize=1)
+def get_pdf_extractor() -> PDFExtractor:
+    """Get the PDF extractor shared by all documents and workflows."""
+    return PDFExtractor()
+
+
+@functools.lru_cache(maxsize=1)
+def get_ocr_processor() -> OCRProcessor:
+    """Get the OCR processor shared by all documents and workflows."""
+    return OCRProcessor(
+        model_name=settings.OCR_MODEL,
+        max_concurrency=settings.OCR_CONCURRENCY,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_layout_processor() -> LayoutProcessor:
+    """Get the layout processor shared by all documents and workflows."""
+    return LayoutProcessor(model_name=settings.LAYOUT_MODEL)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_extraction_agent_pool() -> asyncio.Queue:
+    """
+    Get the pool of extraction agents shared by all documents.
+
+    An agent keeps per-document state in its reasoning context, so each
+    document borrows one for the duration of its extraction. The agents use
+    the workflow executors' model manager, so the process loads the model
+    once, and unless LLM_STREAM_RESPONSES is set, concurrent documents'
+    generation requests share the model's batch queue.
+
+    Returns:
+        asyncio.Queue: Queue of idle extraction agents.
+    """
+    from app.services.workflow_service import get_model_manager
+
+    model_manager = get_model_manager()
+    pool = asyncio.Queue()
+    for _ in range(settings.EXTRACTION_CONCURRENCY):
+        pool.put_nowait(
+            ExtractionAgent(model_name=settings.LLM_MODEL, model_manager=model_manager)
+        )
+    return pool
+
+
+async def shutdown_extraction_agents() -> None:
+    """Shut down the pooled extraction agents and release their models."""
+    if _get_extraction_agent_pool.cache_info().currsize == 0:
+        return
+
+    pool = _get_extraction_agent_pool()
+    while not pool.empty():
+        await pool.get_nowait().reasoning_engine.shutdown()
+    _get_extraction_agent_pool.cache_clear()
+
 
 async def process_document(
     document_path: str,
@@ -40,18 +126,14 @@ async def process_document(
     """
     logger.info(f"Processing document: {document_path}")
 
-    # Initialize processors
-    document_preprocessor = DocumentPreprocessor()
-    pdf_extractor = PDFExtractor()
-    ocr_processor = OCRProcessor(model_name=settings.OCR_MODEL)
-    layout_processor = LayoutProcessor(model_name=settings.LAYOUT_MODEL)
-    extraction_agent = ExtractionAgent(model_name=settings.LLM_MODEL)
+    # Get processors, created once per worker so models stay loaded
+    document_preprocessor = get_document_preprocessor()
+    pdf_extractor = get_pdf_extractor()
+    ocr_processor = get_ocr_processor()
+    layout_processor = get_layout_processor()
+    extraction_agents = _get_extraction_agent_pool()
 
     try:
-        # Preprocess document using Unstructured.io
-        logger.info("Preprocessing document with Unstructured.io")
-        preprocess_result = await document_preprocessor.process(document_path)
-
         # Extract text based on document type
         _, ext = os.path.splitext(document_path)
         ext = ext.lower()
@@ -59,12 +141,39 @@ async def process_document(
         if ext == ".pdf":
             # Use Marker for PDF text extraction
             logger.info("Extracting text from PDF with Marker")
-            text_result = await pdf_extractor.process(document_path)
-        elif ext in [".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"]:
+            text_coro = pdf_extractor.process(document_path)
+        elif ext in IMAGE_EXTENSIONS:
             # Use OCR for image text extraction
             logger.info("Extracting text with OCR")
-            text_result = await ocr_processor.process(document_path)
+            text_coro = ocr_processor.process(document_path)
+        else:
+            text_coro = None
+
+        # Preprocess document using Unstructured.io, alongside text
+        # extraction since neither depends on the other
+        logger.info("Preprocessing document with Unstructured.io")
+        if text_coro is not None:
+            # Marker already provides the text of PDFs, so the preprocessor
+            # only needs their structure and can skip its own OCR pass
+            strategy = "auto"
+            if ext == ".pdf" and (options or {}).get("skip_preprocessor_text", True):
+                strategy = "fast"
+
+            tasks = [
+                asyncio.create_task(
+                    document_preprocessor.process(document_path, strategy=strategy)
+                ),
+                asyncio.create_task(text_coro),
+            ]
+            try:
+                preprocess_result, text_result = await asyncio.gather(*tasks)
+            except Exception:
+                for task in tasks:
+                    task.cancel()
+                raise
         else:
+            preprocess_result = await document_preprocessor.process(document_path)
+
             # For other document types, use the preprocessor result
             logger.info("Using preprocessor result for text extraction")
             text_result = {
@@ -86,13 +195,19 @@ async def process_document(
 
         # Extract information using agent
         logger.info("Extracting information with agent")
-        extraction_result = await extraction_agent.extract(
-            document_path,
-            text_result,
-            enhanced_layout,
-            template_id=template_id,
-            options=options,
-        )
+        extraction_agent = await extraction_agents.get()
+        try:
+            extraction_result = await extraction_agent.extract(
+                document_path,
+                text_result,
+                enhanced_layout,
+                template_id=template_id,
+                options=options,
+            )
+        finally:
+            # Drop this document's context before the next document borrows the agent
+            extraction_agent.reasoning_engine.clear_context()
+            extraction_agents.put_nowait(extraction_agent)
 
         logger.info("Document processing completed successfully")
         return extraction_result
@@ -107,6 +222,8 @@ async def process_document_async(
     template_id: Optional[str] = None,
     options: Optional[Dict[str, Any]] = None,
     callback_url: Optional[str] = None,
+    db: Optional[Session] = None,
+    document: Optional[Any] = None,
 ) -> str:
     """
     Process a document asynchronously and return a job ID.
@@ -116,47 +233,50 @@ async def process_document_async(
         template_id: Optional ID of extraction template to apply.
         options: Optional processing options.
         callback_url: Optional URL to call when processing is complete.
+        db: Optional database session of the caller's request.
+        document: Optional document already loaded in db, to skip looking
+            it up again.
 
     Returns:
         str: Job ID for tracking the processing job.
     """
-    from app.db.session import get_db
+    from app.db.session import use_session
     from app.models.document import Document
     from app.services.workflow_service import create_workflow, execute_workflow
 
-    # Create a database session
-    db = next(get_db())
-
-    try:
-        # Get document from database
-        document = db.query(Document).filter(Document.file_path == document_path).first()
-        if not document:
-            raise ValueError(f"Document not found: {document_path}")
-
-        # Create workflow
-        workflow_id = await create_workflow(
-            document_id=document.document_id,
-            template_id=template_id,
-            options=options,
-            db=db,
-        )
-
-        # Start workflow execution in background
-        asyncio.create_task(
-            _execute_workflow_background(
-                workflow_id=workflow_id,
-                callback_url=callback_url,
+    # Get database session
+    with use_session(db) as db:
+        try:
+            # Get document unless the caller already loaded it
+            if document is None:
+                document = db.query(Document).filter(Document.file_path == document_path).first()
+            if not document:
+                raise ValueError(f"Document not found: {document_path}")
+
+            # Create workflow
+            workflow_id = await create_workflow(
+                document_id=document.document_id,
+                template_id=template_id,
+                options=options,
+                db=db,
+                document=document,
             )
-        )
 
-        return workflow_id
+            # Start workflow execution in background
+            task = asyncio.create_task(
+                _execute_workflow_background(
+                    workflow_id=workflow_id,
+                    callback_url=callback_url,
+                )
+            )
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
 
-    except Exception as e:
-        logger.error(f"Error starting document processing: {e}")
-        raise
+            return workflow_id
 
-    finally:
-        db.close()
+        except Exception as e:
+            logger.error(f"Error starting document processing: {e}")
+            raise
 
 
 async def _execute_workflow_background(
@@ -170,55 +290,102 @@ async def _execute_workflow_background(
         workflow_id: ID of the workflow to execute.
         callback_url: Optional URL to call when processing is complete.
     """
-    from app.services.workflow_service import execute_workflow, get_workflow_status
+    from app.services.workflow_service import execute_workflow
 
     try:
-        # Execute the workflow
-        result = await execute_workflow(workflow_id)
+        # Execute the workflow once a slot is free
+        async with _workflow_semaphore:
+            await execute_workflow(workflow_id)
 
         # Call callback URL if provided
         if callback_url:
-            logger.info(f"Would call callback URL: {callback_url} with status: completed")
-            # In a real implementation, use httpx or aiohttp to call the callback URL
-            # For now, just log the callback
+            await _send_callback(callback_url, {
+                "workflow_id": workflow_id,
+                "status": "completed",
+            })
 
     except Exception as e:
         logger.error(f"Error executing workflow in background: {e}")
 
         # Call callback URL if provided
         if callback_url:
-            logger.info(f"Would call callback URL: {callback_url} with status: failed, error: {str(e)}")
-            # In a real implementation, use httpx or aiohttp to call the callback URL
-            # For now, just log the callback
+            await _send_callback(callback_url, {
+                "workflow_id": workflow_id,
+                "status": "failed",
+                "error": str(e),
+            })
 
 
-async def get_processing_status(job_id: str) -> Dict[str, Any]:
+async def _send_callback(callback_url: str, payload: Dict[str, Any]) -> None:
+    """
+    Post a workflow status to a callback URL, retrying with backoff.
+
+    Args:
+        callback_url: URL to call.
+        payload: Workflow status to send as JSON.
+    """
+    delay = CALLBACK_RETRY_DELAY
+
+    for attempt in range(1, CALLBACK_MAX_ATTEMPTS + 1):
+        try:
+            response = await _callback_client.post(callback_url, json=payload)
+
+            # Client errors won't change on retry
+            if response.status_code < 500:
+                if response.status_code >= 400:
+                    logger.warning(
+                        f"Callback URL {callback_url} rejected status: {response.status_code}"
+                    )
+                return
+
+            error = f"server error {response.status_code}"
+
+        except httpx.HTTPError as e:
+            error = str(e) or type(e).__name__
+
+        if attempt < CALLBACK_MAX_ATTEMPTS:
+            logger.warning(f"Callback to {callback_url} failed ({error}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay *= 2
+        else:
+            logger.error(f"Callback to {callback_url} failed after {attempt} attempts: {error}")
+
+
+async def close_callback_client() -> None:
+    """Close the callback client's pooled connections."""
+    await _callback_client.aclose()
+
+
+async def get_processing_status(
+    job_id: str,
+    db: Optional[Session] = None,
+) -> Dict[str, Any]:
     """
     Get the status of a document processing job.
 
     Args:
         job_id: Job ID for tracking the processing job.
+        db: Optional database session of the caller's request.
 
     Returns:
         Dict[str, Any]: Job status information.
     """
-    from app.services.workflow_service import get_workflow_status
+    from app.services.workflow_service import get_workflow_status, isoformat_or_none
 
     try:
-        # First try to get status as a workflow
+        # First try to get status as a workflow, without the caller's session
+        # so concurrent pollers share one cached query
         workflow_status = await get_workflow_status(job_id)
 
         if workflow_status.get("status") != "not_found":
             return workflow_status
 
         # If not found as a workflow, try to get status from document
-        from app.db.session import get_db
+        from app.db.session import use_session
         from app.models.document import Document
 
-        # Create a database session
-        db = next(get_db())
-
-        try:
+        # Get database session
+        with use_session(db) as db:
             # Get document from database
             document = db.query(Document).filter(Document.job_id == job_id).first()
 
@@ -233,13 +400,10 @@ async def get_processing_status(job_id: str) -> Dict[str, Any]:
                 "document_id": document.document_id,
                 "status": document.status,
                 "extraction_status": document.extraction_status,
-                "created_at": document.created_at.isoformat() if document.created_at else None,
-                "completed_at": document.completed_at.isoformat() if document.completed_at else None,
+                "created_at": isoformat_or_none(document.created_at),
+                "completed_at": isoformat_or_none(document.completed_at),
             }
 
-        finally:
-            db.close()
-
     except Exception as e:
         logger.error(f"Error getting processing status: {e}")
         return {
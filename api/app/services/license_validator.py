@@ -4,18 +4,27 @@ License validator service for the Clary AI API.
 This module provides services for validating API keys and container licenses.
 """
 
+import asyncio
 import hashlib
-import json
 import os
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple
 
-import requests
+import httpx
+import orjson
+from blake3 import blake3
 
 from app.core.config import settings
 
 
+# Maximum number of API key hashes kept in memory
+KEY_HASH_CACHE_SIZE = 1024
+
+# Timeout in seconds for requests to the license server
+LICENSE_SERVER_TIMEOUT = 5.0
+
+
 class LicenseValidator:
     """License validator service."""
     
@@ -23,7 +32,40 @@ class LicenseValidator:
         """Initialize the license validator."""
         self.cache_file = os.path.join(settings.MODEL_PATH, ".license_cache")
         self.last_check = 0
-        self.cache = self._load_cache()
+        # Loaded from disk on the first validation rather than at import time
+        self.cache: Optional[Dict] = None
+        self._save_task: Optional[asyncio.Task] = None
+        self._hash_cache: Dict[str, str] = {}
+        
+        # Shared client so connections to the license server are kept alive
+        self._client = httpx.AsyncClient(
+            timeout=LICENSE_SERVER_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=4),
+        )
+    
+    def _hash_key(self, api_key: str) -> str:
+        """
+        Hash an API key, reusing the hash of keys seen before.
+        
+        Args:
+            api_key: The API key to hash.
+            
+        Returns:
+            str: The hex digest of the API key, using the configured algorithm.
+        """
+        key_hash = self._hash_cache.get(api_key)
+        if key_hash is None:
+            if settings.LICENSE_HASH_ALGO == "blake3":
+                key_hash = blake3(api_key.encode()).hexdigest()
+            else:
+                key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+            
+            # Evict the oldest entry once the cache is full
+            if len(self._hash_cache) >= KEY_HASH_CACHE_SIZE:
+                del self._hash_cache[next(iter(self._hash_cache))]
+            self._hash_cache[api_key] = key_hash
+        
+        return key_hash
     
     def _load_cache(self) -> Dict:
         """
@@ -34,22 +76,41 @@ class LicenseValidator:
         """
         if os.path.exists(self.cache_file):
             try:
-                with open(self.cache_file, "r") as f:
-                    return json.load(f)
+                with open(self.cache_file, "rb") as f:
+                    return orjson.loads(f.read())
             except Exception:
                 pass
         return {"valid_until": 0, "container_id": "", "key_hash": ""}
     
-    def _save_cache(self) -> None:
-        """Save the license cache to disk."""
+    def _save_cache(self, cache: Dict) -> None:
+        """
+        Save the license cache to disk.
+        
+        Args:
+            cache: The license cache to save.
+        """
         try:
             os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            with open(self.cache_file, "w") as f:
-                json.dump(self.cache, f)
+            with open(self.cache_file, "wb") as f:
+                f.write(orjson.dumps(cache))
         except Exception:
             pass
     
-    def validate(self, api_key: str, container_id: str) -> Tuple[bool, str]:
+    def _schedule_save_cache(self) -> None:
+        """Save the license cache in a worker thread without waiting for it."""
+        # A save already in flight is followed by this one, so the latest
+        # cache always ends up on disk
+        previous = self._save_task
+        cache = dict(self.cache)
+        
+        async def save() -> None:
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            await asyncio.to_thread(self._save_cache, cache)
+        
+        self._save_task = asyncio.create_task(save())
+    
+    async def validate(self, api_key: str, container_id: str) -> Tuple[bool, str]:
         """
         Validate the license with the license server.
         
@@ -65,8 +126,12 @@ class LicenseValidator:
         if not settings.LICENSE_VALIDATION_ENABLED:
             return True, ""
         
+        # Load the license cache on first use
+        if self.cache is None:
+            self.cache = await asyncio.to_thread(self._load_cache)
+        
         # Hash the API key for secure storage and transmission
-        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+        key_hash = self._hash_key(api_key)
         
         # Check if we need to validate with the server
         current_time = int(time.time())
@@ -82,14 +147,13 @@ class LicenseValidator:
         
         # Try to validate with the license server
         try:
-            response = requests.post(
+            response = await self._client.post(
                 settings.LICENSE_SERVER_URL,
                 json={
                     "key_hash": key_hash,
                     "container_id": container_id,
                     "timestamp": current_time
                 },
-                timeout=5
             )
             
             self.last_check = current_time
@@ -103,7 +167,7 @@ class LicenseValidator:
                         "container_id": container_id,
                         "key_hash": key_hash
                     }
-                    self._save_cache()
+                    self._schedule_save_cache()
                     return True, ""
                 else:
                     return False, data.get("message", "License validation failed")
@@ -112,6 +176,12 @@ class LicenseValidator:
                 if cache_valid:
                     return True, ""
                 return False, f"License server error: {response.status_code}"
+        
+        except httpx.TimeoutException:
+            # If the server is too slow but we have a valid cache, use it
+            if cache_valid:
+                return True, ""
+            return False, "License server timed out"
                 
         except Exception as e:
             # If we can't reach the server but have a valid cache, use it
@@ -119,7 +189,7 @@ class LicenseValidator:
                 return True, ""
             return False, f"License validation error: {str(e)}"
     
-    def get_license_info(self, api_key: str) -> Dict:
+    async def get_license_info(self, api_key: str) -> Dict:
         """
         Get information about the license.
         
@@ -130,19 +200,21 @@ class LicenseValidator:
             Dict: Information about the license.
         """
         # Hash the API key for secure transmission
-        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+        key_hash = self._hash_key(api_key)
         
         try:
-            response = requests.get(
+            response = await self._client.get(
                 f"{settings.LICENSE_SERVER_URL}/info",
                 params={"key_hash": key_hash},
-                timeout=5
             )
             
             if response.status_code == 200:
                 return response.json()
             else:
                 return {"error": f"License server error: {response.status_code}"}
+        
+        except httpx.TimeoutException:
+            return {"error": "License server timed out"}
                 
         except Exception as e:
             return {"error": f"License info error: {str(e)}"}
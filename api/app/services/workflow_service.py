@@ -4,28 +4,160 @@ Workflow service for the Clary AI API.
 This module provides services for managing document processing workflows.
 """
 
+import asyncio
+import copy
 import datetime
+import functools
 import logging
-import uuid
-from typing import Any, Dict, List, Optional
+import os
+from secrets import token_hex
+from typing import Any, Dict, List, Optional, Tuple
 
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import use_session
 from app.models.document import Document
-from app.models.workflow import Workflow, Task, TaskStatus, TaskType
+from app.models.workflow import Workflow, Task, TaskDependency, TaskStatus, TaskType
 from app.ml.agents.workflow_executor import WorkflowExecutor
+from app.ml.llm.model_manager import ModelManager
 
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# How long in seconds a workflow status is served from memory
+WORKFLOW_STATUS_TTL = 0.5
+
+# Pending or finished status queries by workflow ID, with their expiry time
+_status_cache: Dict[str, Tuple[float, "asyncio.Future[Dict[str, Any]]"]] = {}
+
+# Tasks of a workflow, as (task suffix, task type, priority, parameter names)
+_TASK_SPECS = (
+    ("preprocess", TaskType.PREPROCESS, 10, ("document_path",)),
+    ("extract_text", TaskType.EXTRACT_TEXT, 20, ("document_path",)),
+    ("analyze_layout", TaskType.ANALYZE_LAYOUT, 30, ("document_path",)),
+    ("understand_document", TaskType.UNDERSTAND_DOCUMENT, 40, ("document_path", "template_id")),
+    ("extract_fields", TaskType.EXTRACT_FIELDS, 50, ("document_path", "template_id")),
+    ("extract_tables", TaskType.EXTRACT_TABLES, 50, ("document_path", "template_id")),
+    ("validate_results", TaskType.VALIDATE_RESULTS, 60, ()),
+    ("postprocess", TaskType.POSTPROCESS, 70, ()),
+)
+
+# Dependencies between workflow tasks, as (dependent, dependency) task suffixes
+_DEPENDENCY_EDGES = (
+    # Extract text depends on preprocess
+    ("extract_text", "preprocess"),
+
+    # Analyze layout depends on extract text
+    ("analyze_layout", "extract_text"),
+
+    # Understand document depends on analyze layout
+    ("understand_document", "analyze_layout"),
+
+    # Extract fields depends on understand document
+    ("extract_fields", "understand_document"),
+
+    # Extract tables depends on understand document
+    ("extract_tables", "understand_document"),
+
+    # Validate results depends on extract fields and extract tables
+    ("validate_results", "extract_fields"),
+    ("validate_results", "extract_tables"),
+
+    # Postprocess depends on validate results
+    ("postprocess", "validate_results"),
+)
+
+
+def isoformat_or_none(value: Optional[datetime.datetime]) -> Optional[str]:
+    """
+    Format an optional timestamp for a status response.
+
+    Args:
+        value: Timestamp, or None if not set.
+
+    Returns:
+        Optional[str]: The ISO 8601 timestamp, or None if not set.
+    """
+    return value.isoformat() if value else None
+
+
+@functools.lru_cache(maxsize=1)
+def get_model_manager() -> ModelManager:
+    """
+    Get the model manager shared by every pooled executor and agent.
+
+    Workflow executors and extraction agents all load models through it, so
+    a process loads each model once whichever path a document takes.
+
+    Returns:
+        ModelManager: The process-wide model manager.
+    """
+    return ModelManager(
+        model_dir=os.path.join(settings.MODEL_PATH, "llm"),
+        download_workers=settings.LLM_DOWNLOAD_WORKERS,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_executor_pool() -> asyncio.Queue:
+    """
+    Get the pool of workflow executors shared by all workflows.
+
+    Executors stay warm between workflows, so their models are loaded once
+    per worker rather than once per workflow. Each workflow borrows an
+    executor and runs it with its own database session.
+
+    Returns:
+        asyncio.Queue: Queue of idle workflow executors.
+    """
+    model_manager = get_model_manager()
+    pool = asyncio.Queue()
+    for _ in range(settings.MAX_CONCURRENT_WORKFLOWS):
+        pool.put_nowait(WorkflowExecutor(model_manager=model_manager))
+    return pool
+
+
+async def warm_up_workflow_executors() -> None:
+    """Load the LLM and initialize the pooled executors before the first workflow."""
+    if not settings.LLM_PRELOAD:
+        return
+
+    pool = _get_executor_pool()
+    executors = [pool.get_nowait() for _ in range(pool.qsize())]
+    try:
+        # The executors share one model manager, so the model loads once
+        try:
+            await executors[0].reasoning_engine.model_manager.preload([settings.LLM_MODEL])
+        except Exception as e:
+            logger.warning(f"Error preloading model {settings.LLM_MODEL}: {e}")
+
+        for executor in executors:
+            await executor.reasoning_engine.initialize()
+    finally:
+        for executor in executors:
+            pool.put_nowait(executor)
+
+
+async def shutdown_workflow_executors() -> None:
+    """Shut down the pooled workflow executors and release their models."""
+    if _get_executor_pool.cache_info().currsize == 0:
+        return
+
+    pool = _get_executor_pool()
+    while not pool.empty():
+        await pool.get_nowait().shutdown()
+    _get_executor_pool.cache_clear()
+
 
 async def create_workflow(
     document_id: str,
     template_id: Optional[str] = None,
     options: Optional[Dict[str, Any]] = None,
     db: Optional[Session] = None,
+    document: Optional[Document] = None,
 ) -> str:
     """
     Create a document processing workflow.
@@ -35,66 +167,80 @@ async def create_workflow(
         template_id: Optional ID of extraction template to apply.
         options: Optional processing options.
         db: Optional database session.
+        document: Optional document already loaded in db, to skip looking
+            it up again.
 
     Returns:
         str: ID of the created workflow.
     """
     logger.info(f"Creating workflow for document: {document_id}")
 
-    # Get database session
-    if db is None:
-        db = next(get_db())
-
-    try:
-        # Get document
-        document = db.query(Document).filter(Document.document_id == document_id).first()
-        if not document:
-            raise ValueError(f"Document not found: {document_id}")
-
-        # Create workflow
-        workflow_id = f"wf_{uuid.uuid4().hex[:10]}"
-        workflow = Workflow(
-            id=workflow_id,
-            document_id=document_id,
-            status=TaskStatus.PENDING,
-            template_id=template_id,
-            options=options or {},
-        )
-
-        # Add workflow to database
-        db.add(workflow)
-        db.commit()
-        db.refresh(workflow)
-
-        # Create tasks
-        tasks = _create_tasks(workflow_id, document.file_path, template_id, options)
-
-        # Add tasks to database
-        for task in tasks:
-            db.add(task)
+    # Run the queries in a worker thread so they don't block the event loop
+    return await asyncio.to_thread(
+        _create_workflow, document_id, template_id, options, db, document
+    )
 
-        # Create task dependencies
-        _create_task_dependencies(tasks, db)
 
-        # Commit changes
-        db.commit()
+def _create_workflow(
+    document_id: str,
+    template_id: Optional[str],
+    options: Optional[Dict[str, Any]],
+    db: Optional[Session],
+    document: Optional[Document] = None,
+) -> str:
+    """
+    Create a document processing workflow in the database.
 
-        # Update document status
-        document.status = "processing"
-        document.job_id = workflow_id
-        db.commit()
+    Args:
+        document_id: ID of the document to process.
+        template_id: Optional ID of extraction template to apply.
+        options: Optional processing options.
+        db: Optional database session.
+        document: Optional document already loaded in db.
 
-        logger.info(f"Created workflow: {workflow_id}")
-        return workflow_id
+    Returns:
+        str: ID of the created workflow.
+    """
+    # Get database session
+    with use_session(db) as db:
+        try:
+            # Get document unless the caller already loaded it
+            if document is None:
+                document = db.query(Document).filter(Document.document_id == document_id).first()
+            if not document:
+                raise ValueError(f"Document not found: {document_id}")
+
+            # Create workflow
+            workflow_id = f"wf_{token_hex(5)}"
+            workflow = Workflow(
+                id=workflow_id,
+                document_id=document_id,
+                status=TaskStatus.PENDING,
+                template_id=template_id,
+                options=options or {},
+            )
+
+            # Add workflow to database, flushing so its tasks can reference it
+            db.add(workflow)
+            db.flush()
+
+            # Bulk insert tasks and their dependencies, one statement each
+            tasks = _create_tasks(workflow_id, document.file_path, template_id, options)
+            db.execute(insert(Task), tasks)
+            db.execute(insert(TaskDependency), _create_task_dependencies(workflow_id))
+
+            # Update document status and commit everything at once
+            document.status = "processing"
+            document.job_id = workflow_id
+            db.commit()
 
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error creating workflow: {e}")
-        raise
+            logger.info(f"Created workflow: {workflow_id}")
+            return workflow_id
 
-    finally:
-        if db is not None:
-            db.close()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error creating workflow: {e}")
+            raise
 
 
 def _create_tasks(
@@ -102,9 +248,9 @@ def _create_tasks(
     document_path: str,
     template_id: Optional[str] = None,
     options: Optional[Dict[str, Any]] = None,
-) -> List[Task]:
+) -> List[Dict[str, Any]]:
     """
-    Create tasks for a workflow.
+    Create the task rows of a workflow for a bulk insert.
 
     Args:
         workflow_id: ID of the workflow.
@@ -113,156 +259,41 @@ def _create_tasks(
         options: Optional processing options.
 
     Returns:
-        List[Task]: List of created tasks.
+        List[Dict[str, Any]]: Column values of each task.
     """
-    tasks = []
-
-    # Preprocess task
-    preprocess_task = Task(
-        id=f"{workflow_id}_preprocess",
-        workflow_id=workflow_id,
-        task_type=TaskType.PREPROCESS,
-        status=TaskStatus.PENDING,
-        params={"document_path": document_path},
-        priority=10,
-    )
-    tasks.append(preprocess_task)
-
-    # Extract text task
-    extract_text_task = Task(
-        id=f"{workflow_id}_extract_text",
-        workflow_id=workflow_id,
-        task_type=TaskType.EXTRACT_TEXT,
-        status=TaskStatus.PENDING,
-        params={"document_path": document_path},
-        priority=20,
-    )
-    tasks.append(extract_text_task)
-
-    # Analyze layout task
-    analyze_layout_task = Task(
-        id=f"{workflow_id}_analyze_layout",
-        workflow_id=workflow_id,
-        task_type=TaskType.ANALYZE_LAYOUT,
-        status=TaskStatus.PENDING,
-        params={"document_path": document_path},
-        priority=30,
-    )
-    tasks.append(analyze_layout_task)
-
-    # Understand document task
-    understand_document_task = Task(
-        id=f"{workflow_id}_understand_document",
-        workflow_id=workflow_id,
-        task_type=TaskType.UNDERSTAND_DOCUMENT,
-        status=TaskStatus.PENDING,
-        params={
-            "document_path": document_path,
-            "template_id": template_id,
-        },
-        priority=40,
-    )
-    tasks.append(understand_document_task)
-
-    # Extract fields task
-    extract_fields_task = Task(
-        id=f"{workflow_id}_extract_fields",
-        workflow_id=workflow_id,
-        task_type=TaskType.EXTRACT_FIELDS,
-        status=TaskStatus.PENDING,
-        params={
-            "document_path": document_path,
-            "template_id": template_id,
-        },
-        priority=50,
-    )
-    tasks.append(extract_fields_task)
-
-    # Extract tables task
-    extract_tables_task = Task(
-        id=f"{workflow_id}_extract_tables",
-        workflow_id=workflow_id,
-        task_type=TaskType.EXTRACT_TABLES,
-        status=TaskStatus.PENDING,
-        params={
-            "document_path": document_path,
-            "template_id": template_id,
-        },
-        priority=50,
-    )
-    tasks.append(extract_tables_task)
-
-    # Validate results task
-    validate_results_task = Task(
-        id=f"{workflow_id}_validate_results",
-        workflow_id=workflow_id,
-        task_type=TaskType.VALIDATE_RESULTS,
-        status=TaskStatus.PENDING,
-        params={},
-        priority=60,
-    )
-    tasks.append(validate_results_task)
-
-    # Postprocess task
-    postprocess_task = Task(
-        id=f"{workflow_id}_postprocess",
-        workflow_id=workflow_id,
-        task_type=TaskType.POSTPROCESS,
-        status=TaskStatus.PENDING,
-        params={},
-        priority=70,
-    )
-    tasks.append(postprocess_task)
+    params = {"document_path": document_path, "template_id": template_id}
 
-    return tasks
+    return [
+        {
+            "id": f"{workflow_id}_{suffix}",
+            "workflow_id": workflow_id,
+            "task_type": task_type,
+            "status": TaskStatus.PENDING,
+            "params": {name: params[name] for name in param_names},
+            "priority": priority,
+        }
+        for suffix, task_type, priority, param_names in _TASK_SPECS
+    ]
 
 
-def _create_task_dependencies(tasks: List[Task], db: Session):
+def _create_task_dependencies(workflow_id: str) -> List[Dict[str, Any]]:
     """
-    Create dependencies between tasks.
+    Create the dependency rows between the tasks of a workflow for a bulk insert.
 
     Args:
-        tasks: List of tasks.
-        db: Database session.
-    """
-    from app.models.workflow import TaskDependency
-
-    # Create a dictionary of tasks by ID
-    tasks_by_id = {task.id: task for task in tasks}
-
-    # Define dependencies
-    dependencies = [
-        # Extract text depends on preprocess
-        (f"{tasks[0].workflow_id}_extract_text", f"{tasks[0].workflow_id}_preprocess"),
-
-        # Analyze layout depends on extract text
-        (f"{tasks[0].workflow_id}_analyze_layout", f"{tasks[0].workflow_id}_extract_text"),
-
-        # Understand document depends on analyze layout
-        (f"{tasks[0].workflow_id}_understand_document", f"{tasks[0].workflow_id}_analyze_layout"),
-
-        # Extract fields depends on understand document
-        (f"{tasks[0].workflow_id}_extract_fields", f"{tasks[0].workflow_id}_understand_document"),
-
-        # Extract tables depends on understand document
-        (f"{tasks[0].workflow_id}_extract_tables", f"{tasks[0].workflow_id}_understand_document"),
-
-        # Validate results depends on extract fields and extract tables
-        (f"{tasks[0].workflow_id}_validate_results", f"{tasks[0].workflow_id}_extract_fields"),
-        (f"{tasks[0].workflow_id}_validate_results", f"{tasks[0].workflow_id}_extract_tables"),
+        workflow_id: ID of the workflow.
 
-        # Postprocess depends on validate results
-        (f"{tasks[0].workflow_id}_postprocess", f"{tasks[0].workflow_id}_validate_results"),
+    Returns:
+        List[Dict[str, Any]]: Column values of each dependency.
+    """
+    return [
+        {
+            "dependent_task_id": f"{workflow_id}_{dependent}",
+            "dependency_task_id": f"{workflow_id}_{dependency}",
+        }
+        for dependent, dependency in _DEPENDENCY_EDGES
     ]
 
-    # Create dependencies
-    for dependent_id, dependency_id in dependencies:
-        dependency = TaskDependency(
-            dependent_task_id=dependent_id,
-            dependency_task_id=dependency_id,
-        )
-        db.add(dependency)
-
 
 async def execute_workflow(
     workflow_id: str,
@@ -281,44 +312,41 @@ async def execute_workflow(
     logger.info(f"Executing workflow: {workflow_id}")
 
     # Get database session
-    if db is None:
-        db = next(get_db())
+    with use_session(db) as db:
+        # Borrow a warm workflow executor
+        executors = _get_executor_pool()
+        executor = await executors.get()
 
-    # Create workflow executor
-    executor = WorkflowExecutor(db_session=db)
+        try:
+            # Get workflow
+            workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+            if not workflow:
+                raise ValueError(f"Workflow not found: {workflow_id}")
 
-    try:
-        # Get workflow
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-        if not workflow:
-            raise ValueError(f"Workflow not found: {workflow_id}")
-
-        # Execute workflow
-        result = await executor.execute_workflow(workflow_id)
-
-        logger.info(f"Workflow executed: {workflow_id}")
-        return result
-
-    except Exception as e:
-        logger.error(f"Error executing workflow: {e}")
-
-        # Update workflow status
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-        if workflow:
-            workflow.status = TaskStatus.FAILED
-            workflow.error = str(e)
-            workflow.updated_at = datetime.datetime.now(datetime.timezone.utc)
-            db.commit()
+            # Execute workflow
+            result = await executor.execute_workflow(workflow_id, db_session=db)
 
-        raise
+            logger.info(f"Workflow executed: {workflow_id}")
+            return result
 
-    finally:
-        # Shutdown executor
-        await executor.shutdown()
+        except Exception as e:
+            logger.error(f"Error executing workflow: {e}")
+
+            # Update workflow status
+            workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+            if workflow:
+                workflow.status = TaskStatus.FAILED
+                workflow.error = str(e)
+                workflow.updated_at = datetime.datetime.now(datetime.timezone.utc)
+                db.commit()
+                invalidate_workflow_status(workflow_id)
 
-        # Close database session
-        if db is not None:
-            db.close()
+            raise
+
+        finally:
+            # Return executor to the pool, without keeping the session alive
+            executor.db_session = None
+            executors.put_nowait(executor)
 
 
 async def get_workflow_status(
@@ -337,63 +365,99 @@ async def get_workflow_status(
     """
     logger.info(f"Getting status for workflow: {workflow_id}")
 
+    # Run the queries in a worker thread so they don't block the event loop
+    if db is not None:
+        return await asyncio.to_thread(_get_workflow_status, workflow_id, db)
+
+    # Pollers within the TTL share one query, including one still running
+    now = asyncio.get_running_loop().time()
+    cached = _status_cache.get(workflow_id)
+    if cached is not None and cached[0] > now:
+        status = cached[1]
+    else:
+        # Drop expired entries so workflows no longer polled don't pile up
+        for expired_id in [key for key, (expires, _) in _status_cache.items() if expires <= now]:
+            del _status_cache[expired_id]
+
+        status = asyncio.ensure_future(
+            asyncio.to_thread(_get_workflow_status, workflow_id, None)
+        )
+        _status_cache[workflow_id] = (now + WORKFLOW_STATUS_TTL, status)
+
+    # Shield the shared query from a cancelled poller, and copy the result
+    # so callers can't change what other pollers see
+    return copy.deepcopy(await asyncio.shield(status))
+
+
+def invalidate_workflow_status(workflow_id: str) -> None:
+    """
+    Drop the cached status of a workflow after its state changes.
+
+    Args:
+        workflow_id: ID of the workflow.
+    """
+    _status_cache.pop(workflow_id, None)
+
+
+def _get_workflow_status(workflow_id: str, db: Optional[Session]) -> Dict[str, Any]:
+    """
+    Get the status of a workflow from the database.
+
+    Args:
+        workflow_id: ID of the workflow.
+        db: Optional database session.
+
+    Returns:
+        Dict[str, Any]: Workflow status.
+    """
     # Get database session
-    if db is None:
-        db = next(get_db())
+    with use_session(db) as db:
+        try:
+            # Get workflow
+            workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+            if not workflow:
+                return {
+                    "workflow_id": workflow_id,
+                    "status": "not_found",
+                }
+
+            # Count tasks by status in the database rather than loading them
+            counts_by_status = dict(
+                db.execute(
+                    select(Task.status, func.count())
+                    .where(Task.workflow_id == workflow_id)
+                    .group_by(Task.status)
+                ).all()
+            )
+            task_counts = {
+                "total": sum(counts_by_status.values()),
+                "pending": counts_by_status.get(TaskStatus.PENDING, 0),
+                "running": counts_by_status.get(TaskStatus.RUNNING, 0),
+                "completed": counts_by_status.get(TaskStatus.COMPLETED, 0),
+                "failed": counts_by_status.get(TaskStatus.FAILED, 0),
+            }
+
+            # Calculate progress
+            progress = 0
+            if task_counts["total"] > 0:
+                progress = (task_counts["completed"] / task_counts["total"]) * 100
 
-    try:
-        # Get workflow
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-        if not workflow:
             return {
                 "workflow_id": workflow_id,
-                "status": "not_found",
+                "document_id": workflow.document_id,
+                "status": workflow.status.value,
+                "created_at": isoformat_or_none(workflow.created_at),
+                "updated_at": isoformat_or_none(workflow.updated_at),
+                "completed_at": isoformat_or_none(workflow.completed_at),
+                "error": workflow.error,
+                "task_counts": task_counts,
+                "progress": progress,
             }
 
-        # Get task counts
-        task_counts = {
-            "total": len(workflow.tasks),
-            "pending": 0,
-            "running": 0,
-            "completed": 0,
-            "failed": 0,
-        }
-
-        for task in workflow.tasks:
-            if task.status == TaskStatus.PENDING:
-                task_counts["pending"] += 1
-            elif task.status == TaskStatus.RUNNING:
-                task_counts["running"] += 1
-            elif task.status == TaskStatus.COMPLETED:
-                task_counts["completed"] += 1
-            elif task.status == TaskStatus.FAILED:
-                task_counts["failed"] += 1
-
-        # Calculate progress
-        progress = 0
-        if task_counts["total"] > 0:
-            progress = (task_counts["completed"] / task_counts["total"]) * 100
-
-        return {
-            "workflow_id": workflow_id,
-            "document_id": workflow.document_id,
-            "status": workflow.status.value,
-            "created_at": workflow.created_at.isoformat() if workflow.created_at else None,
-            "updated_at": workflow.updated_at.isoformat() if workflow.updated_at else None,
-            "completed_at": workflow.completed_at.isoformat() if workflow.completed_at else None,
-            "error": workflow.error,
-            "task_counts": task_counts,
-            "progress": progress,
-        }
-
-    except Exception as e:
-        logger.error(f"Error getting workflow status: {e}")
-        return {
-            "workflow_id": workflow_id,
-            "status": "error",
-            "error": str(e),
-        }
-
-    finally:
-        if db is not None:
-            db.close()
+        except Exception as e:
+            logger.error(f"Error getting workflow status: {e}")
+            return {
+                "workflow_id": workflow_id,
+                "status": "error",
+                "error": str(e),
+            }
@@ -6,15 +6,16 @@ This script activates a Clary AI container with an API key.
 """
 
 import argparse
+import functools
 import hashlib
-import json
 import os
 import sys
 import time
 import uuid
 from datetime import datetime
 
-import requests
+import httpx
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -26,53 +27,80 @@ from app.models.api_key import ApiKey
 from app.models.user import User
 
 
+# Password hash of the admin user created on activation
+ADMIN_PASSWORD_HASH = hashlib.sha256(b"admin").hexdigest()
+
+# Client for the license server, keeping its connection open between calls
+# and retrying failed connection attempts
+_http_client = httpx.Client(
+    timeout=5.0,
+    transport=httpx.HTTPTransport(retries=2),
+)
+
+
+@functools.lru_cache(maxsize=1)
 def generate_container_id():
     """
     Generate a unique container ID.
 
+    The ID is generated once per process, so repeated calls agree even when
+    it falls back to a random UUID.
+
     Returns:
         str: A unique container ID.
     """
-    # Try to get the machine ID
-    machine_id = ""
+    # Try to get the machine ID, which is a single short line
+    machine_id = b""
     try:
-        with open("/etc/machine-id", "r") as f:
-            machine_id = f.read().strip()
-    except Exception:
+        fd = os.open("/etc/machine-id", os.O_RDONLY)
+        try:
+            machine_id = os.read(fd, 64).strip()
+        finally:
+            os.close(fd)
+    except OSError:
         pass
 
     # If we couldn't get the machine ID, use a random UUID
     if not machine_id:
-        machine_id = str(uuid.uuid4())
+        machine_id = str(uuid.uuid4()).encode()
 
     # Hash the machine ID to create a container ID
-    return hashlib.sha256(machine_id.encode()).hexdigest()[:16]
+    return hashlib.sha256(machine_id).hexdigest()[:16]
+
 
+def hash_api_key(api_key):
+    """
+    Hash an API key for secure transmission and storage.
 
-def validate_api_key(api_key, container_id):
+    Args:
+        api_key: The API key.
+
+    Returns:
+        str: The hex digest of the API key.
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def validate_api_key(key_hash, container_id):
     """
     Validate an API key with the license server.
 
     Args:
-        api_key: The API key to validate.
+        key_hash: Hash of the API key to validate.
         container_id: The container ID.
 
     Returns:
         bool: True if the API key is valid, False otherwise.
     """
-    # Hash the API key for secure transmission
-    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-
     try:
         # Send validation request to license server
-        response = requests.post(
+        response = _http_client.post(
             settings.LICENSE_SERVER_URL,
             json={
                 "key_hash": key_hash,
                 "container_id": container_id,
                 "timestamp": int(time.time())
             },
-            timeout=5
         )
 
         if response.status_code == 200:
@@ -85,24 +113,58 @@ def validate_api_key(api_key, container_id):
         return False, "free", f"License validation error: {str(e)}"
 
 
-def save_license_cache(api_key, container_id, tier):
+def _license_cache_file():
+    """
+    Get the path of the license cache.
+
+    Returns:
+        str: Path of the license cache file.
+    """
+    return os.path.join(settings.MODEL_PATH, ".license_cache")
+
+
+def _load_license_cache(key_hash, container_id):
+    """
+    Load a still valid license for an API key from the license cache.
+
+    Args:
+        key_hash: Hash of the API key.
+        container_id: The container ID.
+
+    Returns:
+        str: The cached API key tier, or None if there is no valid license
+            cached for this key and container.
+    """
+    try:
+        with open(_license_cache_file(), "rb") as f:
+            cache = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+    if (
+        cache.get("key_hash") != key_hash
+        or cache.get("container_id") != container_id
+        or cache.get("valid_until", 0) <= time.time()
+    ):
+        return None
+
+    return cache.get("tier")
+
+
+def save_license_cache(key_hash, container_id, tier):
     """
     Save the license cache to disk.
 
     Args:
-        api_key: The API key.
+        key_hash: Hash of the API key.
         container_id: The container ID.
         tier: The API key tier.
     """
-    # Hash the API key for secure storage
-    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-
     # Create the cache directory if it doesn't exist
-    cache_dir = os.path.join(settings.MODEL_PATH)
-    os.makedirs(cache_dir, exist_ok=True)
+    cache_file = _license_cache_file()
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
 
     # Save the cache
-    cache_file = os.path.join(cache_dir, ".license_cache")
     cache = {
         "valid_until": int(time.time()) + (settings.LICENSE_CHECK_INTERVAL * 3600),
         "container_id": container_id,
@@ -111,8 +173,8 @@ def save_license_cache(api_key, container_id, tier):
     }
 
     try:
-        with open(cache_file, "w") as f:
-            json.dump(cache, f)
+        with open(cache_file, "wb") as f:
+            f.write(orjson.dumps(cache))
     except Exception as e:
         print(f"Error saving license cache: {e}")
 
@@ -136,11 +198,13 @@ def create_admin_user(db_session, api_key, tier="standard"):
         user = User(
             username="admin",
             email="admin@claryai.local",
-            password_hash=hashlib.sha256("admin".encode()).hexdigest(),
+            password_hash=ADMIN_PASSWORD_HASH,
             is_active=True
         )
         db_session.add(user)
-        db_session.commit()
+
+        # Flush to get the user ID for the API key, committing both together
+        db_session.flush()
 
     # Create the API key
     api_key_obj = db_session.query(ApiKey).filter(ApiKey.key == api_key).first()
@@ -154,7 +218,8 @@ def create_admin_user(db_session, api_key, tier="standard"):
             is_active=True
         )
         db_session.add(api_key_obj)
-        db_session.commit()
+
+    db_session.commit()
 
     return user
 
@@ -172,16 +237,24 @@ def main():
     print(f"Container ID: {container_id}")
     print("Validating API key...")
 
-    # Validate the API key
-    valid, tier, message = validate_api_key(args.api_key, container_id)
-    if not valid:
-        print(f"API key validation failed: {message}")
-        sys.exit(1)
+    # Hash the API key once for validation and the license cache
+    key_hash = hash_api_key(args.api_key)
+
+    # Use a still valid cached license before asking the license server
+    tier = _load_license_cache(key_hash, container_id)
+    if tier:
+        print(f"API key is valid (tier: {tier}, cached)")
+    else:
+        # Validate the API key
+        valid, tier, message = validate_api_key(key_hash, container_id)
+        if not valid:
+            print(f"API key validation failed: {message}")
+            sys.exit(1)
 
-    print(f"API key is valid (tier: {tier})")
+        print(f"API key is valid (tier: {tier})")
 
-    # Save the license cache
-    save_license_cache(args.api_key, container_id, tier)
+        # Save the license cache
+        save_license_cache(key_hash, container_id, tier)
 
     # Create the admin user with the API key
     engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
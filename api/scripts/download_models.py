@@ -8,9 +8,15 @@ This script downloads the required AI models for the application.
 import os
 import sys
 import argparse
-import subprocess
+import hashlib
+import importlib.util
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional, Tuple
+
+import httpx
 
 # Add the parent directory to the path so we can import from app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -18,6 +24,12 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 from app.core.config import settings
 
 
+# Download Hugging Face snapshots with the multi-connection Rust backend
+# when it is installed
+if importlib.util.find_spec("hf_transfer") is not None:
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,6 +41,24 @@ logger = logging.getLogger("download_models")
 # Define model paths
 MODEL_DIR = Path(settings.MODEL_PATH)
 
+# Size of the chunks model files are written in
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+
+# Size of the byte ranges a model file is split into for parallel fetching
+DOWNLOAD_RANGE_BYTES = 16 << 20
+
+# Number of connections used to fetch the ranges of one file
+DOWNLOAD_CONNECTIONS = 16
+
+# Maximum number of models downloaded at once
+MAX_PARALLEL_DOWNLOADS = 8
+
+# Shared client so downloads reuse connections to the model host
+_http_client = httpx.Client(
+    follow_redirects=True,
+    timeout=httpx.Timeout(30.0, read=300.0),
+)
+
 
 # Define models to download
 MODELS = {
@@ -51,9 +81,9 @@ MODELS = {
     },
     "layout": {
         "layoutlmv3": {
-            "url": "https://huggingface.co/microsoft/layoutlmv3-base",
+            "repo_id": "microsoft/layoutlmv3-base",
             "path": MODEL_DIR / "layout" / "layoutlmv3-base",
-            "use_transformers": True,
+            "use_hub_snapshot": True,
         },
     },
 }
@@ -77,41 +107,212 @@ def download_model(model_type: str, model_name: str) -> bool:
     model_info = MODELS[model_type][model_name]
     model_path = model_info["path"]
 
-    # Create directory if it doesn't exist
-    os.makedirs(model_path.parent, exist_ok=True)
-
     # Check if model already exists
-    if model_path.exists() and not model_info.get("use_transformers", False):
+    if model_path.exists() and not model_info.get("use_hub_snapshot", False):
         logger.info(f"Model {model_type}/{model_name} already exists at {model_path}")
         return True
 
     # Download model
     logger.info(f"Downloading {model_type}/{model_name} to {model_path}")
 
-    if model_info.get("use_transformers", False):
-        # Use transformers to download the model
+    if model_info.get("use_hub_snapshot", False):
+        # Download the repository files without instantiating the model,
+        # skipping files already present from an earlier run
         try:
-            from transformers import AutoModel
-            AutoModel.from_pretrained(model_info["url"], cache_dir=str(model_path))
+            from huggingface_hub import snapshot_download
+            snapshot_download(
+                repo_id=model_info["repo_id"],
+                local_dir=str(model_path),
+                max_workers=MAX_PARALLEL_DOWNLOADS,
+            )
             logger.info(f"Successfully downloaded {model_type}/{model_name}")
             return True
         except Exception as e:
             logger.error(f"Failed to download {model_type}/{model_name}: {e}")
             return False
     else:
-        # Use wget to download the model
+        # Stream the model file over HTTP
         try:
-            subprocess.run(
-                ["wget", "-O", str(model_path), model_info["url"]],
-                check=True,
-            )
+            _download_file(model_info["url"], model_path)
             logger.info(f"Successfully downloaded {model_type}/{model_name}")
             return True
-        except subprocess.CalledProcessError as e:
+        except (httpx.HTTPError, OSError, ValueError) as e:
             logger.error(f"Failed to download {model_type}/{model_name}: {e}")
             return False
 
 
+def _download_file(url: str, path: Path) -> None:
+    """
+    Download a file, moving it into place only once complete and verified.
+
+    Downloading to a temporary path means an interrupted download is not
+    mistaken for an existing model on the next run, and lets a ranged
+    download resume where it stopped.
+
+    Args:
+        url: URL of the file.
+        path: Path to save the file to.
+
+    Raises:
+        ValueError: If the file does not match its published checksum.
+    """
+    partial_path = path.with_name(path.name + ".part")
+
+    # Probe whether the server serves byte ranges, and get the file size
+    with _http_client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+        response.raise_for_status()
+        content_range = response.headers.get("Content-Range", "")
+        size = content_range.rpartition("/")[2]
+        expected_sha256 = _published_sha256(response)
+
+    if response.status_code == 206 and size.isdigit():
+        _download_ranges(url, partial_path, int(size))
+    else:
+        _download_stream(url, partial_path)
+
+    # Verify the file before it can be mistaken for a complete model
+    if expected_sha256 and _file_sha256(partial_path) != expected_sha256:
+        os.remove(partial_path)
+        raise ValueError(f"Checksum mismatch for {url}")
+
+    os.replace(partial_path, path)
+
+
+def _published_sha256(response: httpx.Response) -> Optional[str]:
+    """
+    Get the SHA-256 a Hugging Face download publishes for its file.
+
+    Hugging Face serves large files through a redirect whose X-Linked-Etag
+    header holds the SHA-256 of the file content.
+
+    Args:
+        response: Response of the download, including its redirects.
+
+    Returns:
+        Optional[str]: The hex SHA-256 of the file, or None if not published.
+    """
+    for hop in (*response.history, response):
+        etag = hop.headers.get("X-Linked-Etag", "").strip('"')
+        if len(etag) == 64 and all(c in "0123456789abcdef" for c in etag):
+            return etag
+    return None
+
+
+def _file_sha256(path: Path) -> str:
+    """
+    Compute the SHA-256 of a file in chunks.
+
+    Args:
+        path: Path of the file.
+
+    Returns:
+        str: The hex SHA-256 of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _download_stream(url: str, path: Path) -> None:
+    """
+    Download a file over a single connection.
+
+    Args:
+        url: URL of the file.
+        path: Path to save the file to.
+    """
+    with _http_client.stream("GET", url) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_bytes(DOWNLOAD_CHUNK_BYTES):
+                f.write(chunk)
+
+
+def _download_ranges(url: str, path: Path, size: int) -> None:
+    """
+    Download a file as byte ranges fetched over parallel connections.
+
+    A single connection is limited by its TCP window, so splitting a large
+    file across connections makes better use of the available bandwidth.
+    Finished ranges are recorded next to the file, so an interrupted
+    download resumes with the ranges still missing.
+
+    Args:
+        url: URL of the file.
+        path: Path to save the file to.
+        size: Size of the file in bytes.
+    """
+    progress_path = path.with_name(path.name + ".ranges")
+
+    # Ranges finished by an earlier attempt at the same file
+    finished = set()
+    if progress_path.exists() and path.exists() and path.stat().st_size == size:
+        finished = {int(start) for start in progress_path.read_text().split()}
+        logger.info(f"Resuming download of {path} with {len(finished)} ranges done")
+
+    ranges = [
+        (start, min(start + DOWNLOAD_RANGE_BYTES, size) - 1)
+        for start in range(0, size, DOWNLOAD_RANGE_BYTES)
+        if start not in finished
+    ]
+
+    flags = os.O_WRONLY | os.O_CREAT | (0 if finished else os.O_TRUNC)
+    fd = os.open(path, flags, 0o644)
+    progress = open(progress_path, "a" if finished else "w")
+    progress_lock = threading.Lock()
+    try:
+        # Reserve the whole file so ranges can be written at their offsets
+        if not finished:
+            if size and hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+
+        def fetch_range(byte_range: Tuple[int, int]) -> None:
+            start, end = byte_range
+            offset = start
+
+            with _http_client.stream(
+                "GET", url, headers={"Range": f"bytes={start}-{end}"}
+            ) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise httpx.HTTPError(f"Range request not honored for {url}")
+
+                for chunk in response.iter_bytes(DOWNLOAD_CHUNK_BYTES):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+
+            if offset != end + 1:
+                raise httpx.HTTPError(f"Incomplete range {start}-{end} for {url}")
+
+            with progress_lock:
+                progress.write(f"{start}\n")
+                progress.flush()
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_CONNECTIONS) as executor:
+            list(executor.map(fetch_range, ranges))
+
+    finally:
+        progress.close()
+        os.close(fd)
+
+    os.remove(progress_path)
+
+
+def create_model_dirs() -> None:
+    """Create the directories models are downloaded to, once for all models."""
+    model_dirs = {
+        model_info["path"].parent
+        for models in MODELS.values()
+        for model_info in models.values()
+    }
+    for model_dir in model_dirs:
+        model_dir.mkdir(parents=True, exist_ok=True)
+
+
 def download_all_models() -> bool:
     """
     Download all models.
@@ -119,12 +320,19 @@ def download_all_models() -> bool:
     Returns:
         bool: True if all downloads were successful, False otherwise.
     """
-    success = True
-    for model_type, models in MODELS.items():
-        for model_name in models:
-            if not download_model(model_type, model_name):
-                success = False
-    return success
+    downloads = [
+        (model_type, model_name)
+        for model_type, models in MODELS.items()
+        for model_name in models
+    ]
+
+    # Downloads are network-bound, so run them in parallel
+    with ThreadPoolExecutor(
+        max_workers=min(len(downloads), MAX_PARALLEL_DOWNLOADS)
+    ) as executor:
+        results = list(executor.map(lambda download: download_model(*download), downloads))
+
+    return all(results)
 
 
 def main() -> int:
@@ -152,6 +360,9 @@ def main() -> int:
 
     args = parser.parse_args()
 
+    # Create model directories
+    create_model_dirs()
+
     if args.all:
         success = download_all_models()
     elif args.model_type and args.model_name:
@@ -8,7 +8,7 @@ This script creates the database tables and populates them with initial data.
 import os
 import sys
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import Index, create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 import bcrypt
 
@@ -17,8 +17,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 
 from app.core.config import settings
 from app.db.session import Base, engine
-from app.models.user import User
+from app.models.document import Document
 from app.models.template import Template
+from app.models.user import User
+from app.models.workflow import Task
 
 
 # Configure logging
@@ -28,28 +30,87 @@ logging.basicConfig(
 )
 logger = logging.getLogger("init_db")
 
+# bcrypt cost for the seeded development user, whose password is a known
+# constant, so the default 12 rounds would only slow down initialization
+DEV_PASSWORD_ROUNDS = 4
+
+# Fields of the default invoice template
+DEFAULT_INVOICE_FIELDS = {
+    "invoice_number": {
+        "type": "string",
+        "required": True,
+        "extraction_hints": ["Invoice Number", "Invoice #", "Invoice No"]
+    },
+    "date": {
+        "type": "date",
+        "required": True,
+        "extraction_hints": ["Date", "Invoice Date"]
+    },
+    "total_amount": {
+        "type": "currency",
+        "required": True,
+        "extraction_hints": ["Total", "Amount Due", "Total Due"]
+    },
+    "line_items": {
+        "type": "table",
+        "required": False,
+        "columns": [
+            {"name": "description", "type": "string"},
+            {"name": "quantity", "type": "number"},
+            {"name": "unit_price", "type": "currency"},
+            {"name": "total", "type": "currency"}
+        ]
+    }
+}
+
+
+def create_lookup_indexes():
+    """
+    Create indexes on the columns documents and tasks are looked up by.
+
+    create_all only creates indexes along with new tables, so this also
+    covers databases created before the indexes were added.
+    """
+    inspector = inspect(engine)
+
+    for column in (Document.file_path, Document.job_id, Task.workflow_id):
+        table_name = column.table.name
+
+        # Skip columns that already have an index of their own
+        existing = inspector.get_indexes(table_name)
+        if any(index["column_names"] == [column.name] for index in existing):
+            continue
+
+        Index(f"ix_{table_name}_{column.name}", column).create(engine)
+        logger.info(f"Created index on {table_name}.{column.name}")
+
 
 def init_db():
     """Initialize the database."""
     logger.info(f"Initializing database at {settings.SQLALCHEMY_DATABASE_URI}")
 
-    # Create tables
-    Base.metadata.create_all(engine)
-    logger.info("Created tables")
+    # Create tables, skipping the per-table checks when all already exist
+    existing_tables = set(inspect(engine).get_table_names())
+    if not set(Base.metadata.tables).issubset(existing_tables):
+        Base.metadata.create_all(engine)
+        logger.info("Created tables")
+
+    # Create indexes for frequent lookups
+    create_lookup_indexes()
 
     # Create session
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
 
     try:
-        # Create default user if it doesn't exist
-        default_user = db.query(User).filter(User.username == "admin").first()
-        if not default_user:
+        # Create default user if it doesn't exist, loading only its ID
+        default_user_id = db.query(User.id).filter(User.username == "admin").scalar()
+        if default_user_id is None:
             # Hash password
             password = "password"
             password_hash = bcrypt.hashpw(
                 password.encode("utf-8"),
-                bcrypt.gensalt()
+                bcrypt.gensalt(rounds=DEV_PASSWORD_ROUNDS)
             ).decode("utf-8")
 
             default_user = User(
@@ -60,47 +121,21 @@ def init_db():
             )
             db.add(default_user)
             db.commit()
-            db.refresh(default_user)
+            default_user_id = default_user.id
             logger.info("Created default user")
 
         # Create default template if it doesn't exist
-        default_template = db.query(Template).filter(
+        default_template_id = db.query(Template.id).filter(
             Template.template_id == "template_invoice_standard"
-        ).first()
-        if not default_template:
+        ).scalar()
+        if default_template_id is None:
             default_template = Template(
                 template_id="template_invoice_standard",
-                user_id=default_user.id,
+                user_id=default_user_id,
                 name="Standard Invoice",
                 description="Template for standard invoices",
                 document_type="invoice",
-                fields={
-                    "invoice_number": {
-                        "type": "string",
-                        "required": True,
-                        "extraction_hints": ["Invoice Number", "Invoice #", "Invoice No"]
-                    },
-                    "date": {
-                        "type": "date",
-                        "required": True,
-                        "extraction_hints": ["Date", "Invoice Date"]
-                    },
-                    "total_amount": {
-                        "type": "currency",
-                        "required": True,
-                        "extraction_hints": ["Total", "Amount Due", "Total Due"]
-                    },
-                    "line_items": {
-                        "type": "table",
-                        "required": False,
-                        "columns": [
-                            {"name": "description", "type": "string"},
-                            {"name": "quantity", "type": "number"},
-                            {"name": "unit_price", "type": "currency"},
-                            {"name": "total", "type": "currency"}
-                        ]
-                    }
-                },
+                fields=DEFAULT_INVOICE_FIELDS,
             )
             db.add(default_template)
             db.commit()
@@ -4,7 +4,6 @@ Tests for the documents API endpoints.
 This module contains tests for the documents API endpoints.
 """
 
-import asyncio
 import datetime
 import json
 import os
@@ -15,20 +14,22 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
+from app.api.dependencies.auth import get_api_key
 from app.api.endpoints.documents import router
+from app.db.session import get_db
 from app.models.document import Document
 from app.models.user import User
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def app():
-    """Create a FastAPI app for testing."""
+    """Create a FastAPI app for testing, shared by the tests in this module."""
     app = FastAPI()
     app.include_router(router, prefix="/api/v1/documents")
     return app
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def client(app):
     """Create a test client for the app."""
     return TestClient(app)
@@ -70,17 +71,22 @@ def mock_document():
     return document
 
 
-def test_get_documents(client, mock_db_session, mock_user, mock_document):
+@pytest.fixture(autouse=True)
+def override_dependencies(app, mock_db_session, mock_user):
+    """Serve the mock session and user through the app's dependencies."""
+    app.dependency_overrides[get_db] = lambda: mock_db_session
+    app.dependency_overrides[get_api_key] = lambda: mock_user
+    yield
+    app.dependency_overrides.clear()
+
+
+def test_get_documents(client, mock_db_session, mock_document):
     """Test getting documents."""
     # Set up mocks
     mock_db_session.query.return_value.filter.return_value.all.return_value = [mock_document]
     
-    # Mock dependencies
-    with patch("app.api.endpoints.documents.get_db", return_value=iter([mock_db_session])), \
-         patch("app.api.endpoints.documents.get_api_key", return_value=mock_user):
-        
-        # Get documents
-        response = client.get("/api/v1/documents/")
+    # Get documents
+    response = client.get("/api/v1/documents/")
     
     # Verify response
     assert response.status_code == 200
@@ -88,24 +94,20 @@ def test_get_documents(client, mock_db_session, mock_user, mock_document):
     assert response.json()[0]["document_id"] == "test_document"
 
 
-def test_get_document(client, mock_db_session, mock_user, mock_document):
+def test_get_document(client, mock_db_session, mock_document):
     """Test getting a document."""
     # Set up mocks
     mock_db_session.query.return_value.filter.return_value.first.return_value = mock_document
     
-    # Mock dependencies
-    with patch("app.api.endpoints.documents.get_db", return_value=iter([mock_db_session])), \
-         patch("app.api.endpoints.documents.get_api_key", return_value=mock_user):
-        
-        # Get document
-        response = client.get("/api/v1/documents/test_document")
+    # Get document
+    response = client.get("/api/v1/documents/test_document")
     
     # Verify response
     assert response.status_code == 200
     assert response.json()["document_id"] == "test_document"
 
 
-def test_upload_document(client, mock_db_session, mock_user, mock_document):
+def test_upload_document(client, mock_db_session, mock_document):
     """Test uploading a document."""
     # Set up mocks
     mock_db_session.query.return_value.filter.return_value.first.return_value = None
@@ -115,9 +117,10 @@ def test_upload_document(client, mock_db_session, mock_user, mock_document):
     
     # Mock document creation
     with patch("app.api.endpoints.documents.Document", return_value=mock_document), \
-         patch("app.api.endpoints.documents.get_db", return_value=iter([mock_db_session])), \
-         patch("app.api.endpoints.documents.get_api_key", return_value=mock_user), \
-         patch("app.api.endpoints.documents.process_document_async", return_value="test_workflow"), \
+         patch(
+             "app.services.document_processor.process_document_async",
+             new=AsyncMock(return_value="test_workflow"),
+         ), \
          patch("app.api.endpoints.documents.uuid.uuid4", return_value=MagicMock(hex="1234567890")), \
          patch("app.api.endpoints.documents.os.path.join", return_value="/tmp/test_document.pdf"), \
          patch("app.api.endpoints.documents.shutil.copyfileobj"):
@@ -137,21 +140,19 @@ def test_upload_document(client, mock_db_session, mock_user, mock_document):
     assert response.json()["job_id"] == "test_workflow"
 
 
-def test_get_job_status(client, mock_db_session, mock_user, mock_document):
+def test_get_job_status(client, mock_db_session, mock_document):
     """Test getting job status."""
     # Set up mocks
     mock_document.job_id = "test_workflow"
     mock_db_session.query.return_value.filter.return_value.first.return_value = mock_document
     
-    # Mock dependencies
-    with patch("app.api.endpoints.documents.get_db", return_value=iter([mock_db_session])), \
-         patch("app.api.endpoints.documents.get_api_key", return_value=mock_user), \
-         patch("app.api.endpoints.documents.get_processing_status", return_value={
+    # Mock the processing service
+    with patch("app.api.endpoints.documents.get_processing_status", new=AsyncMock(return_value={
              "workflow_id": "test_workflow",
              "document_id": "test_document",
              "status": "running",
              "progress": 50.0,
-         }):
+         })):
         
         # Get job status
         response = client.get("/api/v1/documents/jobs/test_workflow")
@@ -164,7 +165,7 @@ def test_get_job_status(client, mock_db_session, mock_user, mock_document):
     assert response.json()["progress"] == 50.0
 
 
-def test_get_document_results(client, mock_db_session, mock_user, mock_document):
+def test_get_document_results(client, mock_db_session, mock_document):
     """Test getting document results."""
     # Set up mocks
     mock_document.status = "completed"
@@ -189,12 +190,8 @@ def test_get_document_results(client, mock_db_session, mock_user, mock_document)
     })
     mock_db_session.query.return_value.filter.return_value.first.return_value = mock_document
     
-    # Mock dependencies
-    with patch("app.api.endpoints.documents.get_db", return_value=iter([mock_db_session])), \
-         patch("app.api.endpoints.documents.get_api_key", return_value=mock_user):
-        
-        # Get document results
-        response = client.get("/api/v1/documents/test_document/results")
+    # Get document results
+    response = client.get("/api/v1/documents/test_document/results")
     
     # Verify response
     assert response.status_code == 200
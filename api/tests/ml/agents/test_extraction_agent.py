@@ -0,0 +1,73 @@
+"""
+Tests for the extraction agent.
+
+This module contains tests for the extraction agent.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+# Results returned by the mocked reasoning engine stages
+EXTRACTED_FIELDS = {
+    "invoice_number": {"value": "INV-12345", "confidence": 0.9},
+}
+
+EXTRACTED_TABLES = {
+    "line_items": {
+        "headers": ["Description", "Total"],
+        "rows": [["Product A", "1000.00"]],
+        "confidence": 0.8,
+    },
+}
+
+
+@pytest.fixture
+def agent():
+    """Create an extraction agent with a mocked workflow engine."""
+    # Import here so collecting the tests doesn't load the ML stack
+    from app.ml.agents.extraction_agent import ExtractionAgent
+
+    with patch("app.ml.agents.extraction_agent.WorkflowEngine") as mock_workflow_engine_class:
+        mock_workflow_engine_class.return_value.create_workflow = AsyncMock(return_value="test_workflow")
+        agent = ExtractionAgent(model_name="test-model")
+
+    agent.reasoning_engine.understand_document = AsyncMock(return_value={"document_type": "invoice"})
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_extract_fields_and_tables_concurrently(agent):
+    """Test that fields and tables are extracted concurrently."""
+    tables_started = asyncio.Event()
+
+    # Field extraction only finishes once table extraction has started
+    async def extract_fields(**kwargs):
+        await asyncio.wait_for(tables_started.wait(), timeout=1)
+        return EXTRACTED_FIELDS
+
+    async def extract_tables(**kwargs):
+        tables_started.set()
+        return EXTRACTED_TABLES
+
+    agent.reasoning_engine.extract_fields = MagicMock(side_effect=extract_fields)
+    agent.reasoning_engine.extract_tables = MagicMock(side_effect=extract_tables)
+
+    # Extract information
+    result = await agent.extract(
+        document_path="test_document.pdf",
+        ocr_result={"text": "Test document"},
+        layout_result={"document_type": "invoice"},
+    )
+
+    # Verify both stages received the invoice targets
+    fields_kwargs = agent.reasoning_engine.extract_fields.call_args.kwargs
+    tables_kwargs = agent.reasoning_engine.extract_tables.call_args.kwargs
+    assert fields_kwargs["fields_to_extract"][0]["name"] == "invoice_number"
+    assert tables_kwargs["tables_to_extract"][0]["name"] == "line_items"
+
+    # Verify result
+    assert result["document_type"] == "invoice"
+    assert result["fields"] is EXTRACTED_FIELDS
+    assert result["tables"] is EXTRACTED_TABLES
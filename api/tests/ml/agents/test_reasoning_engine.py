@@ -9,79 +9,142 @@ import os
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from app.ml.agents.reasoning_engine import ReasoningEngine
-from app.ml.llm.model_manager import ModelManager
-from app.ml.llm.prompt_manager import PromptManager
-from app.ml.llm.document_understanding import DocumentUnderstanding
 
+# Fields and tables passed to and returned by the extraction stages
+FIELDS_TO_EXTRACT = [
+    {"name": "invoice_number", "type": "string"},
+    {"name": "date", "type": "date"},
+    {"name": "total_amount", "type": "currency"},
+]
 
-@pytest.fixture
+TABLES_TO_EXTRACT = [
+    {
+        "name": "line_items",
+        "columns": ["Description", "Quantity", "Unit Price", "Total"],
+    },
+]
+
+EXTRACTED_FIELDS = {
+    "invoice_number": {"value": "INV-12345", "confidence": 0.95},
+    "date": {"value": "2023-05-10", "confidence": 0.92},
+    "total_amount": {"value": "1250.00", "confidence": 0.98},
+}
+
+EXTRACTED_TABLES = {
+    "line_items": {
+        "headers": ["Description", "Quantity", "Unit Price", "Total"],
+        "rows": [
+            ["Product A", "2", "500.00", "1000.00"],
+            ["Service B", "1", "250.00", "250.00"],
+        ],
+        "confidence": 0.9,
+    }
+}
+
+
+# Results returned by the mocked document understanding stages
+UNDERSTANDING_RESULT = {
+    "document_type": "invoice",
+    "document_purpose": "Billing for products or services",
+    "key_entities": {
+        "sender": "ABC Company",
+        "recipient": "XYZ Corporation",
+    },
+}
+
+VALIDATION_RESULT = {
+    "valid": True,
+    "issues": [],
+    "corrections": {},
+}
+
+
+def _async_returning(result):
+    """
+    Create a mock coroutine function that returns a fixed result.
+    
+    A plain coroutine as side effect skips AsyncMock's per-call setup, while
+    the MagicMock still records calls for assertions.
+    """
+    async def call(*args, **kwargs):
+        return result
+    
+    return MagicMock(side_effect=call)
+
+
+# ModelManager and PromptManager methods used by the reasoning engine. The
+# mocks are specced by name, so other attributes raise AttributeError without
+# introspecting the real classes
+_MODEL_MANAGER_METHODS = ["load_model", "unload_all_models", "generate"]
+_PROMPT_MANAGER_METHODS = ["render_template", "parse_json_from_response"]
+
+
+@pytest.fixture(scope="module")
 def mock_model_manager():
     """Create a mock model manager."""
-    manager = MagicMock(spec=ModelManager)
+    manager = MagicMock(spec=_MODEL_MANAGER_METHODS)
+    manager.load_model = AsyncMock()
+    manager.unload_all_models = MagicMock()
     manager.generate = AsyncMock(return_value='{"document_type": "invoice"}')
     return manager
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_prompt_manager():
     """Create a mock prompt manager."""
-    manager = MagicMock(spec=PromptManager)
+    manager = MagicMock(spec=_PROMPT_MANAGER_METHODS)
     manager.render_template = MagicMock(return_value="Test prompt")
     manager.parse_json_from_response = MagicMock(return_value={"document_type": "invoice"})
     return manager
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_document_understanding(mock_model_manager, mock_prompt_manager):
     """Create a mock document understanding."""
+    # Import here so collecting the tests doesn't load the ML stack
+    from app.ml.llm.document_understanding import DocumentUnderstanding
+    
     understanding = MagicMock(spec=DocumentUnderstanding)
-    understanding.understand_document = AsyncMock(return_value={
-        "document_type": "invoice",
-        "document_purpose": "Billing for products or services",
-        "key_entities": {
-            "sender": "ABC Company",
-            "recipient": "XYZ Corporation",
-        },
-    })
-    understanding.extract_fields = AsyncMock(return_value={
-        "invoice_number": {"value": "INV-12345", "confidence": 0.95},
-        "date": {"value": "2023-05-10", "confidence": 0.92},
-        "total_amount": {"value": "1250.00", "confidence": 0.98},
-    })
-    understanding.extract_tables = AsyncMock(return_value={
-        "line_items": {
-            "headers": ["Description", "Quantity", "Unit Price", "Total"],
-            "rows": [
-                ["Product A", "2", "500.00", "1000.00"],
-                ["Service B", "1", "250.00", "250.00"],
-            ],
-            "confidence": 0.9,
-        }
-    })
-    understanding.validate_extraction = AsyncMock(return_value={
-        "valid": True,
-        "issues": [],
-        "corrections": {},
-    })
+    understanding.understand_document = _async_returning(UNDERSTANDING_RESULT)
+    understanding.extract_fields = _async_returning(EXTRACTED_FIELDS)
+    understanding.extract_tables = _async_returning(EXTRACTED_TABLES)
+    understanding.validate_extraction = _async_returning(VALIDATION_RESULT)
     return understanding
 
 
-@pytest.mark.asyncio
-async def test_initialize(mock_model_manager, mock_prompt_manager, mock_document_understanding):
-    """Test initializing the reasoning engine."""
-    # Create engine
+@pytest.fixture(scope="module")
+def initialized_engine(mock_model_manager, mock_prompt_manager, mock_document_understanding):
+    """Create a reasoning engine initialized once with the mocks, shared by the module."""
+    from app.ml.agents.reasoning_engine import ReasoningEngine
+    
     engine = ReasoningEngine(model_name="test-model")
     
-    # Mock dependencies
-    with patch("app.ml.agents.reasoning_engine.ModelManager", return_value=mock_model_manager), \
-         patch("app.ml.agents.reasoning_engine.PromptManager", return_value=mock_prompt_manager), \
-         patch("app.ml.agents.reasoning_engine.DocumentUnderstanding", return_value=mock_document_understanding), \
+    # Mock dependencies while the engine wires up its components
+    with patch.multiple(
+             "app.ml.agents.reasoning_engine",
+             ModelManager=MagicMock(return_value=mock_model_manager),
+             PromptManager=MagicMock(return_value=mock_prompt_manager),
+             DocumentUnderstanding=MagicMock(return_value=mock_document_understanding),
+         ), \
          patch("app.ml.agents.reasoning_engine.os.makedirs"):
         
         # Initialize engine
-        await engine.initialize()
+        asyncio.run(engine.initialize())
     
+    return engine
+
+
+@pytest.fixture
+def engine(initialized_engine, mock_document_understanding):
+    """Get the shared reasoning engine, with no state left by earlier tests."""
+    initialized_engine.clear_context()
+    mock_document_understanding.reset_mock()
+    return initialized_engine
+
+
+@pytest.mark.asyncio
+async def test_initialize(engine, mock_model_manager, mock_prompt_manager, mock_document_understanding):
+    """Test initializing the reasoning engine."""
     # Verify components were initialized
     assert engine.model_manager == mock_model_manager
     assert engine.prompt_manager == mock_prompt_manager
@@ -89,26 +152,43 @@ async def test_initialize(mock_model_manager, mock_prompt_manager, mock_document
 
 
 @pytest.mark.asyncio
-async def test_understand_document(mock_model_manager, mock_prompt_manager, mock_document_understanding):
-    """Test understanding a document."""
-    # Create engine
-    engine = ReasoningEngine(model_name="test-model")
+async def test_initialize_streaming(mock_model_manager, mock_prompt_manager, mock_document_understanding):
+    """Test that the streaming setting reaches document understanding."""
+    from app.ml.agents.reasoning_engine import ReasoningEngine
     
-    # Mock dependencies
-    with patch("app.ml.agents.reasoning_engine.ModelManager", return_value=mock_model_manager), \
-         patch("app.ml.agents.reasoning_engine.PromptManager", return_value=mock_prompt_manager), \
-         patch("app.ml.agents.reasoning_engine.DocumentUnderstanding", return_value=mock_document_understanding), \
+    with patch("app.ml.agents.reasoning_engine.settings.LLM_STREAM_RESPONSES", True):
+        default_engine = ReasoningEngine(model_name="test-model", model_manager=mock_model_manager)
+    disabled_engine = ReasoningEngine(
+        model_name="test-model",
+        model_manager=mock_model_manager,
+        streaming=False,
+    )
+    
+    # Mock dependencies while the engines wire up their components
+    mock_document_understanding_class = MagicMock(return_value=mock_document_understanding)
+    with patch.multiple(
+             "app.ml.agents.reasoning_engine",
+             PromptManager=MagicMock(return_value=mock_prompt_manager),
+             DocumentUnderstanding=mock_document_understanding_class,
+         ), \
          patch("app.ml.agents.reasoning_engine.os.makedirs"):
-        
-        # Initialize engine
-        await engine.initialize()
-        
-        # Understand document
-        result = await engine.understand_document(
-            document_text="Test document",
-            document_layout={"layout": "test"},
-            document_type="invoice",
-        )
+        await default_engine.initialize()
+        await disabled_engine.initialize()
+    
+    # Verify the setting is the default and an explicit value overrides it
+    streaming = [call.kwargs["streaming"] for call in mock_document_understanding_class.call_args_list]
+    assert streaming == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_understand_document(engine, mock_document_understanding):
+    """Test understanding a document."""
+    # Understand document
+    result = await engine.understand_document(
+        document_text="Test document",
+        document_layout={"layout": "test"},
+        document_type="invoice",
+    )
     
     # Verify document understanding was called
     mock_document_understanding.understand_document.assert_called_once_with(
@@ -125,43 +205,24 @@ async def test_understand_document(mock_model_manager, mock_prompt_manager, mock
 
 
 @pytest.mark.asyncio
-async def test_extract_fields(mock_model_manager, mock_prompt_manager, mock_document_understanding):
+async def test_extract_fields(engine, mock_document_understanding):
     """Test extracting fields."""
-    # Create engine
-    engine = ReasoningEngine(model_name="test-model")
-    
-    # Mock dependencies
-    with patch("app.ml.agents.reasoning_engine.ModelManager", return_value=mock_model_manager), \
-         patch("app.ml.agents.reasoning_engine.PromptManager", return_value=mock_prompt_manager), \
-         patch("app.ml.agents.reasoning_engine.DocumentUnderstanding", return_value=mock_document_understanding), \
-         patch("app.ml.agents.reasoning_engine.os.makedirs"):
-        
-        # Initialize engine
-        await engine.initialize()
-        
-        # Extract fields
-        result = await engine.extract_fields(
-            document_text="Test document",
-            document_layout={"layout": "test"},
-            fields_to_extract=[
-                {"name": "invoice_number", "type": "string"},
-                {"name": "date", "type": "date"},
-                {"name": "total_amount", "type": "currency"},
-            ],
-        )
-    
-    # Verify field extraction was called
-    mock_document_understanding.extract_fields.assert_called_once_with(
+    # Extract fields
+    result = await engine.extract_fields(
         document_text="Test document",
         document_layout={"layout": "test"},
-        fields_to_extract=[
-            {"name": "invoice_number", "type": "string"},
-            {"name": "date", "type": "date"},
-            {"name": "total_amount", "type": "currency"},
-        ],
-        model_name="test-model",
+        fields_to_extract=FIELDS_TO_EXTRACT,
     )
     
+    # Verify field extraction was called
+    extract_fields = mock_document_understanding.extract_fields
+    assert extract_fields.call_count == 1
+    call_kwargs = extract_fields.call_args.kwargs
+    assert call_kwargs["document_text"] == "Test document"
+    assert call_kwargs["document_layout"] == {"layout": "test"}
+    assert call_kwargs["fields_to_extract"] is FIELDS_TO_EXTRACT
+    assert call_kwargs["model_name"] == "test-model"
+    
     # Verify result
     assert "invoice_number" in result
     assert "date" in result
@@ -172,45 +233,24 @@ async def test_extract_fields(mock_model_manager, mock_prompt_manager, mock_docu
 
 
 @pytest.mark.asyncio
-async def test_extract_tables(mock_model_manager, mock_prompt_manager, mock_document_understanding):
+async def test_extract_tables(engine, mock_document_understanding):
     """Test extracting tables."""
-    # Create engine
-    engine = ReasoningEngine(model_name="test-model")
-    
-    # Mock dependencies
-    with patch("app.ml.agents.reasoning_engine.ModelManager", return_value=mock_model_manager), \
-         patch("app.ml.agents.reasoning_engine.PromptManager", return_value=mock_prompt_manager), \
-         patch("app.ml.agents.reasoning_engine.DocumentUnderstanding", return_value=mock_document_understanding), \
-         patch("app.ml.agents.reasoning_engine.os.makedirs"):
-        
-        # Initialize engine
-        await engine.initialize()
-        
-        # Extract tables
-        result = await engine.extract_tables(
-            document_text="Test document",
-            document_layout={"layout": "test"},
-            tables_to_extract=[
-                {
-                    "name": "line_items",
-                    "columns": ["Description", "Quantity", "Unit Price", "Total"],
-                },
-            ],
-        )
-    
-    # Verify table extraction was called
-    mock_document_understanding.extract_tables.assert_called_once_with(
+    # Extract tables
+    result = await engine.extract_tables(
         document_text="Test document",
         document_layout={"layout": "test"},
-        tables_to_extract=[
-            {
-                "name": "line_items",
-                "columns": ["Description", "Quantity", "Unit Price", "Total"],
-            },
-        ],
-        model_name="test-model",
+        tables_to_extract=TABLES_TO_EXTRACT,
     )
     
+    # Verify table extraction was called
+    extract_tables = mock_document_understanding.extract_tables
+    assert extract_tables.call_count == 1
+    call_kwargs = extract_tables.call_args.kwargs
+    assert call_kwargs["document_text"] == "Test document"
+    assert call_kwargs["document_layout"] == {"layout": "test"}
+    assert call_kwargs["tables_to_extract"] is TABLES_TO_EXTRACT
+    assert call_kwargs["model_name"] == "test-model"
+    
     # Verify result
     assert "line_items" in result
     assert "headers" in result["line_items"]
@@ -220,62 +260,43 @@ async def test_extract_tables(mock_model_manager, mock_prompt_manager, mock_docu
 
 
 @pytest.mark.asyncio
-async def test_validate_extraction(mock_model_manager, mock_prompt_manager, mock_document_understanding):
+async def test_validate_extraction(engine, mock_document_understanding):
     """Test validating extraction."""
-    # Create engine
-    engine = ReasoningEngine(model_name="test-model")
-    
-    # Mock dependencies
-    with patch("app.ml.agents.reasoning_engine.ModelManager", return_value=mock_model_manager), \
-         patch("app.ml.agents.reasoning_engine.PromptManager", return_value=mock_prompt_manager), \
-         patch("app.ml.agents.reasoning_engine.DocumentUnderstanding", return_value=mock_document_understanding), \
-         patch("app.ml.agents.reasoning_engine.os.makedirs"):
-        
-        # Initialize engine
-        await engine.initialize()
-        
-        # Validate extraction
-        result = await engine.validate_extraction(
-            document_text="Test document",
-            extracted_fields={
-                "invoice_number": {"value": "INV-12345", "confidence": 0.95},
-                "date": {"value": "2023-05-10", "confidence": 0.92},
-                "total_amount": {"value": "1250.00", "confidence": 0.98},
-            },
-            extracted_tables={
-                "line_items": {
-                    "headers": ["Description", "Quantity", "Unit Price", "Total"],
-                    "rows": [
-                        ["Product A", "2", "500.00", "1000.00"],
-                        ["Service B", "1", "250.00", "250.00"],
-                    ],
-                    "confidence": 0.9,
-                }
-            },
-        )
-    
-    # Verify validation was called
-    mock_document_understanding.validate_extraction.assert_called_once_with(
+    # Validate extraction
+    result = await engine.validate_extraction(
         document_text="Test document",
-        extracted_fields={
-            "invoice_number": {"value": "INV-12345", "confidence": 0.95},
-            "date": {"value": "2023-05-10", "confidence": 0.92},
-            "total_amount": {"value": "1250.00", "confidence": 0.98},
-        },
-        extracted_tables={
-            "line_items": {
-                "headers": ["Description", "Quantity", "Unit Price", "Total"],
-                "rows": [
-                    ["Product A", "2", "500.00", "1000.00"],
-                    ["Service B", "1", "250.00", "250.00"],
-                ],
-                "confidence": 0.9,
-            }
-        },
-        model_name="test-model",
+        extracted_fields=EXTRACTED_FIELDS,
+        extracted_tables=EXTRACTED_TABLES,
     )
     
+    # Verify validation was called
+    validate_extraction = mock_document_understanding.validate_extraction
+    assert validate_extraction.call_count == 1
+    call_kwargs = validate_extraction.call_args.kwargs
+    assert call_kwargs["document_text"] == "Test document"
+    assert call_kwargs["extracted_fields"] is EXTRACTED_FIELDS
+    assert call_kwargs["extracted_tables"] is EXTRACTED_TABLES
+    assert call_kwargs["model_name"] == "test-model"
+    
     # Verify result
     assert result["valid"] is True
     assert "issues" in result
     assert "corrections" in result
+
+
+def test_get_engine():
+    """Test that engines are shared per model and model manager."""
+    from app.ml.agents.reasoning_engine import get_engine
+    
+    get_engine.cache_clear()
+    try:
+        # Get engines
+        engine = get_engine("test-model")
+        other_engine = get_engine("other-model")
+        
+        # Verify engines are reused per model
+        assert get_engine("test-model") is engine
+        assert other_engine is not engine
+        assert engine.model_name == "test-model"
+    finally:
+        get_engine.cache_clear()
@@ -9,12 +9,18 @@ import datetime
 import json
 import os
 import pytest
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from sqlalchemy.orm import Session
 
-from app.models.workflow import Workflow, Task, TaskStatus, TaskType, TaskDependency
+from app.models.workflow import TaskStatus, TaskType
 from app.ml.agents.workflow_executor import WorkflowExecutor
+from app.services.document_processor import get_pdf_extractor
+
+
+# Creation time shared by the workflow fixtures
+_NOW = datetime.datetime.now(datetime.timezone.utc)
 
 
 @pytest.fixture
@@ -27,15 +33,16 @@ def mock_db_session():
 @pytest.fixture
 def mock_workflow():
     """Create a mock workflow."""
-    workflow = MagicMock(spec=Workflow)
-    workflow.id = "test_workflow"
-    workflow.document_id = "test_document"
-    workflow.status = TaskStatus.PENDING
-    workflow.created_at = datetime.datetime.now(datetime.timezone.utc)
-    workflow.updated_at = datetime.datetime.now(datetime.timezone.utc)
-    workflow.completed_at = None
-    workflow.error = None
-    return workflow
+    return SimpleNamespace(
+        id="test_workflow",
+        document_id="test_document",
+        status=TaskStatus.PENDING,
+        created_at=_NOW,
+        updated_at=_NOW,
+        completed_at=None,
+        error=None,
+        tasks=[],
+    )
 
 
 @pytest.fixture
@@ -44,30 +51,36 @@ def mock_tasks():
     tasks = []
     
     # Preprocess task
-    preprocess_task = MagicMock(spec=Task)
-    preprocess_task.id = "test_workflow_preprocess"
-    preprocess_task.workflow_id = "test_workflow"
-    preprocess_task.task_type = TaskType.PREPROCESS
-    preprocess_task.status = TaskStatus.PENDING
-    preprocess_task.params = {"document_path": "test_document.pdf"}
-    preprocess_task.result = None
-    preprocess_task.error = None
-    preprocess_task.dependencies = []
-    preprocess_task.can_execute.return_value = True
+    preprocess_task = SimpleNamespace(
+        id="test_workflow_preprocess",
+        workflow_id="test_workflow",
+        task_type=TaskType.PREPROCESS,
+        status=TaskStatus.PENDING,
+        params={"document_path": "test_document.pdf"},
+        result=None,
+        error=None,
+        dependencies=[],
+        can_execute=lambda: True,
+    )
     tasks.append(preprocess_task)
     
     # Extract text task
-    extract_text_task = MagicMock(spec=Task)
-    extract_text_task.id = "test_workflow_extract_text"
-    extract_text_task.workflow_id = "test_workflow"
-    extract_text_task.task_type = TaskType.EXTRACT_TEXT
-    extract_text_task.status = TaskStatus.PENDING
-    extract_text_task.params = {"document_path": "test_document.pdf"}
-    extract_text_task.result = None
-    extract_text_task.error = None
-    extract_text_task.dependencies = [MagicMock(spec=TaskDependency)]
-    extract_text_task.dependencies[0].dependency_task = preprocess_task
-    extract_text_task.can_execute.return_value = False
+    extract_text_task = SimpleNamespace(
+        id="test_workflow_extract_text",
+        workflow_id="test_workflow",
+        task_type=TaskType.EXTRACT_TEXT,
+        status=TaskStatus.PENDING,
+        params={"document_path": "test_document.pdf"},
+        result=None,
+        error=None,
+        dependencies=[
+            SimpleNamespace(
+                dependency_task_id=preprocess_task.id,
+                dependency_task=preprocess_task,
+            ),
+        ],
+        can_execute=lambda: False,
+    )
     tasks.append(extract_text_task)
     
     return tasks
@@ -166,3 +179,48 @@ async def test_get_execution_order(mock_db_session, mock_workflow, mock_tasks):
     assert len(order) == 2
     assert order[0] == mock_tasks[0]  # Preprocess task first
     assert order[1] == mock_tasks[1]  # Extract text task second
+
+
+@pytest.mark.asyncio
+async def test_get_execution_order_circular(mock_db_session, mock_workflow, mock_tasks):
+    """Test that circular task dependencies are rejected."""
+    # Make the preprocess task depend on the extract text task
+    mock_tasks[0].dependencies = [
+        SimpleNamespace(
+            dependency_task_id=mock_tasks[1].id,
+            dependency_task=mock_tasks[1],
+        ),
+    ]
+    mock_workflow.tasks = mock_tasks
+    
+    # Create executor
+    executor = WorkflowExecutor(db_session=mock_db_session)
+    
+    # Verify the cycle is detected
+    with pytest.raises(ValueError, match="Circular dependency"):
+        executor._get_execution_order(mock_workflow)
+
+
+@pytest.mark.asyncio
+async def test_extract_text_uses_shared_extractor(mock_db_session, mock_tasks):
+    """Test that text extraction tasks reuse the shared PDF extractor."""
+    mock_tasks[0].result = {"text": "Test document text"}
+    
+    # Create executors
+    executors = [WorkflowExecutor(db_session=mock_db_session) for _ in range(2)]
+    
+    with patch("app.services.document_processor.PDFExtractor") as mock_pdf_extractor_class:
+        get_pdf_extractor.cache_clear()
+        try:
+            mock_pdf_extractor_class.return_value.process = AsyncMock(return_value={"text": "Test document text"})
+            
+            # Execute the task on each executor
+            for executor in executors:
+                result = await executor._execute_extract_text_task(mock_tasks[1])
+                assert result["text"] == "Test document text"
+        finally:
+            get_pdf_extractor.cache_clear()
+    
+    # Verify one extractor served both tasks
+    mock_pdf_extractor_class.assert_called_once()
+    assert mock_pdf_extractor_class.return_value.process.call_count == 2
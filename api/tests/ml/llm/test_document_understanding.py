@@ -8,14 +8,25 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from app.ml.llm.document_understanding import DocumentUnderstanding
-from app.ml.llm.model_manager import ModelManager
 from app.ml.llm.prompt_manager import PromptManager
 
 
+# ModelManager and PromptManager methods used by document understanding. The
+# mocks are specced by name, so other attributes raise AttributeError without
+# introspecting the real classes
+_MODEL_MANAGER_METHODS = ["generate", "generate_stream"]
+_PROMPT_MANAGER_METHODS = [
+    "render_template",
+    "format_json_for_prompt",
+    "parse_json_from_response",
+    "find_json_end",
+]
+
+
 @pytest.fixture
 def mock_model_manager():
     """Create a mock model manager."""
-    manager = MagicMock(spec=ModelManager)
+    manager = MagicMock(spec=_MODEL_MANAGER_METHODS)
     manager.generate = AsyncMock(return_value='{"document_type": "invoice"}')
     return manager
 
@@ -23,7 +34,7 @@ def mock_model_manager():
 @pytest.fixture
 def mock_prompt_manager():
     """Create a mock prompt manager."""
-    manager = MagicMock(spec=PromptManager)
+    manager = MagicMock(spec=_PROMPT_MANAGER_METHODS)
     manager.render_template = MagicMock(return_value="Test prompt")
     manager.format_json_for_prompt = MagicMock(return_value='{"key": "value"}')
     manager.parse_json_from_response = MagicMock(return_value={"document_type": "invoice"})
@@ -40,80 +51,69 @@ def document_understanding(mock_model_manager, mock_prompt_manager):
     )
 
 
+# Fields and tables passed to and returned by the extraction stages
+FIELDS_TO_EXTRACT = [
+    {"name": "invoice_number", "type": "string"},
+    {"name": "date", "type": "date"},
+    {"name": "total_amount", "type": "currency"},
+]
+
+TABLES_TO_EXTRACT = [
+    {
+        "name": "line_items",
+        "columns": ["Description", "Quantity", "Unit Price", "Total"],
+    },
+]
+
+EXTRACTED_FIELDS = {
+    "invoice_number": {"value": "INV-12345", "confidence": 0.95},
+    "date": {"value": "2023-05-10", "confidence": 0.92},
+    "total_amount": {"value": "1250.00", "confidence": 0.98},
+}
+
+EXTRACTED_TABLES = {
+    "line_items": {
+        "headers": ["Description", "Quantity", "Unit Price", "Total"],
+        "rows": [
+            ["Product A", "2", "500.00", "1000.00"],
+            ["Service B", "1", "250.00", "250.00"],
+        ],
+        "confidence": 0.9,
+    }
+}
+
+
 @pytest.mark.asyncio
-async def test_understand_document(document_understanding, mock_model_manager, mock_prompt_manager):
-    """Test understanding a document."""
-    # Set up mock response
-    mock_prompt_manager.parse_json_from_response.return_value = {
-        "document_type": "invoice",
-        "document_purpose": "Billing for products or services",
-        "key_entities": {
-            "sender": "ABC Company",
-            "recipient": "XYZ Corporation",
+@pytest.mark.parametrize("method,call_kwargs,template,template_variables,mock_return", [
+    (
+        "understand_document",
+        {
+            "document_text": "Test document",
+            "document_layout": {"layout": "test"},
+            "document_type": "invoice",
         },
-    }
-    
-    # Understand document
-    result = await document_understanding.understand_document(
-        document_text="Test document",
-        document_layout={"layout": "test"},
-        document_type="invoice",
-    )
-    
-    # Verify prompt was rendered
-    mock_prompt_manager.render_template.assert_called_once_with(
         "document_understanding",
         {
             "document_text": "Test document",
             "document_layout": '{"key": "value"}',
             "document_type": "invoice",
         },
-    )
-    
-    # Verify model was called
-    mock_model_manager.generate.assert_called_once_with(
-        model_name="test-model",
-        prompt="Test prompt",
-        max_tokens=2048,
-        temperature=0.1,
-        top_p=0.9,
-        stop=["\n\n"],
-    )
-    
-    # Verify response was parsed
-    mock_prompt_manager.parse_json_from_response.assert_called_once_with(
-        '{"document_type": "invoice"}'
-    )
-    
-    # Verify result
-    assert result["document_type"] == "invoice"
-    assert result["document_purpose"] == "Billing for products or services"
-    assert "key_entities" in result
-
-
-@pytest.mark.asyncio
-async def test_extract_fields(document_understanding, mock_model_manager, mock_prompt_manager):
-    """Test extracting fields."""
-    # Set up mock response
-    mock_prompt_manager.parse_json_from_response.return_value = {
-        "invoice_number": {"value": "INV-12345", "confidence": 0.95},
-        "date": {"value": "2023-05-10", "confidence": 0.92},
-        "total_amount": {"value": "1250.00", "confidence": 0.98},
-    }
-    
-    # Extract fields
-    result = await document_understanding.extract_fields(
-        document_text="Test document",
-        document_layout={"layout": "test"},
-        fields_to_extract=[
-            {"name": "invoice_number", "type": "string"},
-            {"name": "date", "type": "date"},
-            {"name": "total_amount", "type": "currency"},
-        ],
-    )
-    
-    # Verify prompt was rendered
-    mock_prompt_manager.render_template.assert_called_once_with(
+        {
+            "document_type": "invoice",
+            "document_purpose": "Billing for products or services",
+            "key_entities": {
+                "sender": "ABC Company",
+                "recipient": "XYZ Corporation",
+            },
+        },
+    ),
+    (
+        "extract_fields",
+        {
+            "document_text": "Test document",
+            "document_layout": {"layout": "test"},
+            "fields_to_extract": FIELDS_TO_EXTRACT,
+        },
         "field_extraction",
         {
             "document_text": "Test document",
@@ -121,61 +121,15 @@ async def test_extract_fields(document_understanding, mock_model_manager, mock_p
             "document_understanding": '{"key": "value"}',
             "fields_to_extract": '{"key": "value"}',
         },
-    )
-    
-    # Verify model was called
-    mock_model_manager.generate.assert_called_once_with(
-        model_name="test-model",
-        prompt="Test prompt",
-        max_tokens=2048,
-        temperature=0.1,
-        top_p=0.9,
-        stop=["\n\n"],
-    )
-    
-    # Verify response was parsed
-    mock_prompt_manager.parse_json_from_response.assert_called_once_with(
-        '{"document_type": "invoice"}'
-    )
-    
-    # Verify result
-    assert "invoice_number" in result
-    assert "date" in result
-    assert "total_amount" in result
-    assert result["invoice_number"]["value"] == "INV-12345"
-    assert result["date"]["value"] == "2023-05-10"
-    assert result["total_amount"]["value"] == "1250.00"
-
-
-@pytest.mark.asyncio
-async def test_extract_tables(document_understanding, mock_model_manager, mock_prompt_manager):
-    """Test extracting tables."""
-    # Set up mock response
-    mock_prompt_manager.parse_json_from_response.return_value = {
-        "line_items": {
-            "headers": ["Description", "Quantity", "Unit Price", "Total"],
-            "rows": [
-                ["Product A", "2", "500.00", "1000.00"],
-                ["Service B", "1", "250.00", "250.00"],
-            ],
-            "confidence": 0.9,
-        }
-    }
-    
-    # Extract tables
-    result = await document_understanding.extract_tables(
-        document_text="Test document",
-        document_layout={"layout": "test"},
-        tables_to_extract=[
-            {
-                "name": "line_items",
-                "columns": ["Description", "Quantity", "Unit Price", "Total"],
-            },
-        ],
-    )
-    
-    # Verify prompt was rendered
-    mock_prompt_manager.render_template.assert_called_once_with(
+        EXTRACTED_FIELDS,
+    ),
+    (
+        "extract_tables",
+        {
+            "document_text": "Test document",
+            "document_layout": {"layout": "test"},
+            "tables_to_extract": TABLES_TO_EXTRACT,
+        },
         "table_extraction",
         {
             "document_text": "Test document",
@@ -183,7 +137,48 @@ async def test_extract_tables(document_understanding, mock_model_manager, mock_p
             "document_understanding": '{"key": "value"}',
             "tables_to_extract": '{"key": "value"}',
         },
-    )
+        EXTRACTED_TABLES,
+    ),
+    (
+        "validate_extraction",
+        {
+            "document_text": "Test document",
+            "extracted_fields": EXTRACTED_FIELDS,
+            "extracted_tables": EXTRACTED_TABLES,
+        },
+        "validation",
+        {
+            "document_text": "Test document",
+            "document_understanding": '{"key": "value"}',
+            "extracted_fields": '{"key": "value"}',
+            "extracted_tables": '{"key": "value"}',
+        },
+        {
+            "valid": True,
+            "issues": [],
+            "corrections": {},
+        },
+    ),
+])
+async def test_delegation(
+    document_understanding,
+    mock_model_manager,
+    mock_prompt_manager,
+    method,
+    call_kwargs,
+    template,
+    template_variables,
+    mock_return,
+):
+    """Test that each stage renders its prompt, calls the model and parses the response."""
+    # Set up mock response
+    mock_prompt_manager.parse_json_from_response.return_value = mock_return
+    
+    # Run the stage
+    result = await getattr(document_understanding, method)(**call_kwargs)
+    
+    # Verify prompt was rendered
+    mock_prompt_manager.render_template.assert_called_once_with(template, template_variables)
     
     # Verify model was called
     mock_model_manager.generate.assert_called_once_with(
@@ -201,73 +196,59 @@ async def test_extract_tables(document_understanding, mock_model_manager, mock_p
     )
     
     # Verify result
-    assert "line_items" in result
-    assert "headers" in result["line_items"]
-    assert "rows" in result["line_items"]
-    assert result["line_items"]["headers"] == ["Description", "Quantity", "Unit Price", "Total"]
-    assert len(result["line_items"]["rows"]) == 2
+    assert result == mock_return
 
 
 @pytest.mark.asyncio
-async def test_validate_extraction(document_understanding, mock_model_manager, mock_prompt_manager):
-    """Test validating extraction."""
-    # Set up mock response
-    mock_prompt_manager.parse_json_from_response.return_value = {
-        "valid": True,
-        "issues": [],
-        "corrections": {},
-    }
+async def test_cache_hit(document_understanding, mock_model_manager, mock_prompt_manager):
+    """Test that an identical prompt reuses the cached model response."""
+    # Understand the same document twice
+    for _ in range(2):
+        result = await document_understanding.understand_document(
+            document_text="Test document",
+            document_layout={"layout": "test"},
+        )
     
-    # Validate extraction
-    result = await document_understanding.validate_extraction(
-        document_text="Test document",
-        extracted_fields={
-            "invoice_number": {"value": "INV-12345", "confidence": 0.95},
-            "date": {"value": "2023-05-10", "confidence": 0.92},
-            "total_amount": {"value": "1250.00", "confidence": 0.98},
-        },
-        extracted_tables={
-            "line_items": {
-                "headers": ["Description", "Quantity", "Unit Price", "Total"],
-                "rows": [
-                    ["Product A", "2", "500.00", "1000.00"],
-                    ["Service B", "1", "250.00", "250.00"],
-                ],
-                "confidence": 0.9,
-            }
-        },
-    )
+    # Verify model was called once and the response parsed on each call
+    assert mock_model_manager.generate.call_count == 1
+    assert mock_prompt_manager.parse_json_from_response.call_count == 2
+    assert result == {"document_type": "invoice"}
+
+
+@pytest.mark.asyncio
+async def test_streaming_stops_at_complete_json(mock_model_manager, mock_prompt_manager):
+    """Test that a streamed response is closed once it holds a complete JSON value."""
+    chunks_sent = []
     
-    # Verify prompt was rendered
-    mock_prompt_manager.render_template.assert_called_once_with(
-        "validation",
-        {
-            "document_text": "Test document",
-            "document_understanding": '{"key": "value"}',
-            "extracted_fields": '{"key": "value"}',
-            "extracted_tables": '{"key": "value"}',
-        },
+    # Stream the JSON in pieces, followed by text the model adds after it
+    async def generate_stream(**kwargs):
+        for chunk in ['{"document_type": ', '"invoice"', "}", "\nThis is an invoice."]:
+            chunks_sent.append(chunk)
+            yield chunk
+    
+    mock_model_manager.generate_stream = MagicMock(side_effect=generate_stream)
+    mock_prompt_manager.find_json_end = PromptManager().find_json_end
+    
+    # Create streaming document understanding
+    understanding = DocumentUnderstanding(
+        model_manager=mock_model_manager,
+        prompt_manager=mock_prompt_manager,
+        default_model="test-model",
+        streaming=True,
     )
     
-    # Verify model was called
-    mock_model_manager.generate.assert_called_once_with(
-        model_name="test-model",
-        prompt="Test prompt",
-        max_tokens=2048,
-        temperature=0.1,
-        top_p=0.9,
-        stop=["\n\n"],
+    # Understand document
+    await understanding.understand_document(
+        document_text="Test document",
+        document_layout={"layout": "test"},
     )
     
-    # Verify response was parsed
+    # Verify the stream was closed before the trailing text
+    assert len(chunks_sent) == 3
+    mock_model_manager.generate.assert_not_called()
     mock_prompt_manager.parse_json_from_response.assert_called_once_with(
         '{"document_type": "invoice"}'
     )
-    
-    # Verify result
-    assert result["valid"] is True
-    assert "issues" in result
-    assert "corrections" in result
 
 
 def test_prepare_document_text():
@@ -306,8 +287,64 @@ def test_clear_context():
         "extracted_fields": {"invoice_number": {"value": "INV-12345"}},
     }
     
+    context = understanding.context
+    
     # Clear context
     understanding.clear_context()
     
-    # Verify context was cleared
+    # Verify context was cleared in place
     assert understanding.context == {}
+    assert understanding.context is context
+
+
+@pytest.mark.asyncio
+async def test_shared_context_reused_across_stages(document_understanding, mock_prompt_manager):
+    """Test that later stages reuse the snapshot taken by understand_document."""
+    document_text = "Test document"
+    document_layout = {"layout": "test"}
+    
+    # Understand document
+    await document_understanding.understand_document(
+        document_text=document_text,
+        document_layout=document_layout,
+    )
+    calls_after_understanding = mock_prompt_manager.format_json_for_prompt.call_count
+    
+    # Extract fields and tables with the same text and layout
+    await document_understanding.extract_fields(
+        document_text=document_text,
+        document_layout=document_layout,
+        fields_to_extract=[{"name": "invoice_number", "type": "string"}],
+    )
+    await document_understanding.extract_tables(
+        document_text=document_text,
+        document_layout=document_layout,
+        tables_to_extract=[{"name": "line_items"}],
+    )
+    
+    # Only the per-stage inputs should have been serialized
+    assert mock_prompt_manager.format_json_for_prompt.call_count == calls_after_understanding + 2
+    
+    # Clearing the context drops the snapshot
+    document_understanding.clear_context()
+    assert document_understanding._shared_context is None
+
+
+def test_format_json_cached(document_understanding, mock_prompt_manager):
+    """Test that JSON formatting is memoized per object until the context is cleared."""
+    data = {"layout": "test"}
+    
+    # Format the same object twice
+    first = document_understanding._format_json_cached(data)
+    second = document_understanding._format_json_cached(data)
+    
+    # Verify the prompt manager was only called once
+    assert first == second
+    mock_prompt_manager.format_json_for_prompt.assert_called_once_with(data)
+    
+    # Clear context and format again
+    document_understanding.clear_context()
+    document_understanding._format_json_cached(data)
+    
+    # Verify the memo was dropped
+    assert mock_prompt_manager.format_json_for_prompt.call_count == 2
@@ -7,7 +7,9 @@ This module contains tests for the model manager.
 import asyncio
 import os
 import tempfile
+import threading
 import pytest
+from collections.abc import KeysView
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from app.ml.llm.model_manager import ModelManager
@@ -46,7 +48,6 @@ async def test_load_model(temp_model_dir, mock_llama):
     # Mock dependencies
     with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama), \
          patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download"), \
-         patch("app.ml.llm.model_manager.shutil.move"), \
          patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
         
         # Load model
@@ -55,6 +56,222 @@ async def test_load_model(temp_model_dir, mock_llama):
     # Verify model was loaded
     assert model == mock_llama
     assert "test-model" in manager.models
+    
+    # Verify prefix caching is off by default
+    mock_llama.set_cache.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_load_model_off_event_loop(temp_model_dir, mock_llama):
+    """Test that the model weights are loaded outside the event loop thread."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Record the thread the model is constructed in
+    load_threads = []
+    
+    def construct(**kwargs):
+        load_threads.append(threading.current_thread())
+        return mock_llama
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", side_effect=construct), \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        
+        # Load model
+        model = await manager.load_model("test-model")
+    
+    # Verify model was constructed in a worker thread
+    assert model == mock_llama
+    assert load_threads and load_threads[0] is not threading.current_thread()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cpu_count, n_threads", [(4, 2), (8, 4), (64, 16)])
+async def test_load_model_thread_autodetect(temp_model_dir, mock_llama, cpu_count, n_threads):
+    """Test that generation threads use half the CPUs, up to the cap."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 2048,
+        "ubatch_size": 512,
+    }
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama) as mock_llama_class, \
+         patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download"), \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True), \
+         patch("app.ml.llm.model_manager.os.cpu_count", return_value=cpu_count):
+        
+        # Load model
+        await manager.load_model("test-model", gpu_layers=0)
+    
+    # Verify thread and batch settings
+    llama_kwargs = mock_llama_class.call_args.kwargs
+    assert llama_kwargs["n_threads"] == n_threads
+    assert llama_kwargs["n_threads_batch"] == cpu_count
+    assert llama_kwargs["n_batch"] == 2048
+    assert llama_kwargs["n_ubatch"] == 512
+
+
+def test_kv_cache_bytes_per_layer(temp_model_dir):
+    """Test sizing the KV cache for full-precision and quantized caches."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    config = {"context_length": 4096, "kv_dim": 1024}
+    
+    # f16 is the default, q8_0 stores 34 bytes per 32 elements
+    assert manager._get_kv_cache_bytes_per_layer(config) == 16 * 1024 ** 2
+    assert manager._get_kv_cache_bytes_per_layer(
+        {**config, "kv_cache_type": "q8_0"}
+    ) == 17 * 1024 ** 2 // 2
+
+
+def test_should_lock_model(temp_model_dir):
+    """Test locking models in RAM only when there is memory to spare."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Create a model file
+    model_path = os.path.join(temp_model_dir, "test-model.gguf")
+    with open(model_path, "wb") as f:
+        f.write(b"0" * 1000)
+    
+    with patch.object(manager, "_get_available_memory", return_value=1500):
+        assert manager._should_lock_model(model_path)
+    
+    with patch.object(manager, "_get_available_memory", return_value=1100):
+        assert not manager._should_lock_model(model_path)
+    
+    with patch.object(manager, "_get_available_memory", return_value=None):
+        assert not manager._should_lock_model(model_path)
+    
+    # Missing files are never locked
+    with patch.object(manager, "_get_available_memory", return_value=1500):
+        assert not manager._should_lock_model(model_path + ".missing")
+
+
+@pytest.mark.asyncio
+async def test_load_model_with_prefix_cache(temp_model_dir, mock_llama):
+    """Test loading a model with prefix caching enabled."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir, prefix_cache_bytes=1024 ** 3)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama), \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        
+        # Load model
+        await manager.load_model("test-model")
+    
+    # Verify a cache was attached
+    mock_llama.set_cache.assert_called_once()
+
+
+def test_get_optimal_gpu_layers(temp_model_dir):
+    """Test estimating how many layers fit in free GPU memory."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+        "n_layers": 32,
+        "kv_dim": 1024,
+    }
+    manager.model_configs["test-model-q8"] = {
+        **manager.model_configs["test-model"],
+        "kv_cache_type": "q8_0",
+    }
+    
+    # Mock a GPU with room for part of the model
+    mock_torch = MagicMock()
+    mock_torch.cuda.is_available.return_value = True
+    mock_torch.cuda.mem_get_info.return_value = (2 * 1024 ** 3, 8 * 1024 ** 3)
+    
+    with patch.dict("sys.modules", {"torch": mock_torch}), \
+         patch("app.ml.llm.model_manager.os.path.getsize", return_value=32 * 128 * 1024 ** 2):
+        
+        # Estimate layers
+        gpu_layers = manager._get_optimal_gpu_layers("test-model", "test-model.gguf")
+        q8_gpu_layers = manager._get_optimal_gpu_layers("test-model-q8", "test-model.gguf")
+    
+    # 1.5 GB usable / (128 MB weights + 16 MB KV cache) per layer
+    assert gpu_layers == 10
+    
+    # A q8_0 KV cache takes 8.5 MB per layer, so one more layer fits
+    assert q8_gpu_layers == 11
+    
+    # Verify result is cached
+    assert manager._get_optimal_gpu_layers("test-model", "test-model.gguf") == 10
+
+
+@pytest.mark.asyncio
+async def test_make_room_for_model_evicts_lru(temp_model_dir):
+    """Test that least recently used unpinned models are evicted first."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Add mock models, oldest first, and pin the oldest
+    manager.models["pinned-model"] = MagicMock()
+    manager.models["cold-model"] = MagicMock()
+    manager.models["hot-model"] = MagicMock()
+    manager.pin_model("pinned-model")
+    
+    # Mock a GPU that frees up after one eviction
+    mock_torch = MagicMock()
+    mock_torch.cuda.is_available.return_value = True
+    mock_torch.cuda.mem_get_info.side_effect = [
+        (0, 8 * 1024 ** 3),
+        (8 * 1024 ** 3, 8 * 1024 ** 3),
+    ]
+    
+    with patch.dict("sys.modules", {"torch": mock_torch}), \
+         patch("app.ml.llm.model_manager.os.path.getsize", return_value=1024 ** 3):
+        
+        # Make room
+        await manager._make_room_for_model("test-model", "test-model.gguf")
+    
+    # Verify only the coldest unpinned model was evicted
+    assert list(manager.models) == ["pinned-model", "hot-model"]
 
 
 @pytest.mark.asyncio
@@ -72,17 +289,157 @@ async def test_download_model(temp_model_dir):
         "batch_size": 512,
     }
     
+    # Create a fake cached blob
+    cached_path = os.path.join(temp_model_dir, "blob")
+    with open(cached_path, "w") as f:
+        f.write("weights")
+    
     # Mock dependencies
-    with patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download") as mock_download, \
-         patch("app.ml.llm.model_manager.shutil.move") as mock_move, \
-         patch("app.ml.llm.model_manager.os.path.exists", return_value=False):
+    with patch("app.ml.llm.model_manager.huggingface_hub.try_to_load_from_cache", return_value=None), \
+         patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download", return_value=cached_path) as mock_download:
         
         # Download model
         await manager._download_model("test-model")
     
     # Verify download was called
     mock_download.assert_called_once()
-    mock_move.assert_called_once()
+    
+    # Verify model was linked into place without copying
+    model_path = os.path.join(temp_model_dir, "test-model.gguf")
+    assert os.path.samefile(model_path, cached_path)
+
+
+@pytest.mark.asyncio
+async def test_download_model_shards_concurrently(temp_model_dir):
+    """Test that the shards of a split model are downloaded concurrently."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add split test model config
+    filenames = [f"test-model-0000{i}-of-00003.gguf" for i in range(1, 4)]
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": filenames[0],
+        "filenames": filenames,
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Each download waits until all three are in flight
+    all_started = threading.Barrier(len(filenames), timeout=5)
+    
+    def hf_hub_download(filename, **kwargs):
+        all_started.wait()
+        cached_path = os.path.join(temp_model_dir, f"blob-{filename}")
+        with open(cached_path, "w") as f:
+            f.write("weights")
+        return cached_path
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.huggingface_hub.try_to_load_from_cache", return_value=None), \
+         patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download", side_effect=hf_hub_download) as mock_download:
+        
+        # Download model
+        await manager._download_model("test-model")
+    
+    # Verify every shard was downloaded and linked into place
+    assert mock_download.call_count == len(filenames)
+    for filename in filenames:
+        assert os.path.exists(os.path.join(temp_model_dir, filename))
+
+
+@pytest.mark.asyncio
+async def test_download_model_cached(temp_model_dir):
+    """Test that a cached model is not downloaded again."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Create a fake cached blob
+    cached_path = os.path.join(temp_model_dir, "blob")
+    with open(cached_path, "w") as f:
+        f.write("weights")
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.huggingface_hub.try_to_load_from_cache", return_value=cached_path), \
+         patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download") as mock_download:
+        
+        # Download model
+        await manager._download_model("test-model")
+    
+    # Verify download was skipped
+    mock_download.assert_not_called()
+    assert os.path.exists(os.path.join(temp_model_dir, "test-model.gguf"))
+
+
+@pytest.mark.asyncio
+async def test_preload(temp_model_dir, mock_llama):
+    """Test that a preloaded model is not loaded again on first use."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama) as mock_llama_class, \
+         patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download"), \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        
+        # Preload model, then generate text
+        await manager.preload(["test-model"])
+        response = await manager.generate(model_name="test-model", prompt="Test prompt")
+    
+    # Verify model was only constructed by the preload
+    assert mock_llama_class.call_count == 1
+    assert list(manager.get_loaded_models()) == ["test-model"]
+    assert response == "Test response"
+
+
+@pytest.mark.asyncio
+async def test_load_model_concurrent_entry_points(temp_model_dir, mock_llama):
+    """Test that concurrent loads through either entry point load the model once."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama) as mock_llama_class, \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        
+        # Load the model through the public and the internal entry point at once
+        models = await asyncio.gather(
+            manager.load_model("test-model"),
+            manager._get_loaded_model("test-model"),
+            manager.load_model("test-model"),
+        )
+    
+    # Verify one model was constructed and shared by every caller
+    assert mock_llama_class.call_count == 1
+    assert all(model is mock_llama for model in models)
 
 
 @pytest.mark.asyncio
@@ -103,7 +460,6 @@ async def test_generate(temp_model_dir, mock_llama):
     # Mock dependencies
     with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama), \
          patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download"), \
-         patch("app.ml.llm.model_manager.shutil.move"), \
          patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
         
         # Load model
@@ -157,7 +513,6 @@ async def test_generate_stream(temp_model_dir, mock_llama):
     # Mock dependencies
     with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama), \
          patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download"), \
-         patch("app.ml.llm.model_manager.shutil.move"), \
          patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
         
         # Load model
@@ -190,6 +545,156 @@ async def test_generate_stream(temp_model_dir, mock_llama):
     assert chunks == ["Test", " response"]
 
 
+@pytest.mark.asyncio
+async def test_generate_stream_decodes_off_event_loop(temp_model_dir, mock_llama):
+    """Test that stream chunks are produced outside the event loop thread."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Mock stream response, recording the thread each chunk is decoded in
+    decode_threads = []
+    
+    def stream(**kwargs):
+        for text in ["Test", " response"]:
+            decode_threads.append(threading.get_ident())
+            yield {"choices": [{"text": text}]}
+    
+    mock_llama.side_effect = stream
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama), \
+         patch("app.ml.llm.model_manager.huggingface_hub.hf_hub_download"), \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        
+        # Generate text stream
+        chunks = [
+            chunk async for chunk in manager.generate_stream(
+                model_name="test-model",
+                prompt="Test prompt",
+            )
+        ]
+    
+    # Verify response and that no chunk was decoded on the event loop thread
+    assert chunks == ["Test", " response"]
+    assert len(decode_threads) == 2
+    assert threading.get_ident() not in decode_threads
+
+
+@pytest.mark.asyncio
+async def test_generate_loads_model_once(temp_model_dir, mock_llama):
+    """Test that concurrent first calls share one model instance."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Set up mock response
+    mock_llama.return_value = {"choices": [{"text": "Generated text"}]}
+    
+    # Generate concurrently before the model is loaded
+    with patch("app.ml.llm.model_manager.Llama", return_value=mock_llama) as mock_llama_class, \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        responses = await asyncio.gather(
+            manager.generate(model_name="test-model", prompt="First"),
+            manager.generate(model_name="test-model", prompt="Second"),
+        )
+    
+    # Verify the model was constructed once
+    assert responses == ["Generated text", "Generated text"]
+    mock_llama_class.assert_called_once()
+    
+    manager.unload_all_models()
+
+
+@pytest.mark.asyncio
+async def test_generate_coalesces_identical_requests(temp_model_dir, mock_llama):
+    """Test that concurrent identical generate calls share one model call."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add mock model
+    manager.models["test-model"] = mock_llama
+    
+    # Generate the same prompt concurrently, plus one different prompt
+    responses = await asyncio.gather(
+        manager.generate(model_name="test-model", prompt="Test prompt"),
+        manager.generate(model_name="test-model", prompt="Test prompt"),
+        manager.generate(model_name="test-model", prompt="Other prompt"),
+    )
+    
+    # Verify identical requests were coalesced
+    assert responses == ["Test response", "Test response", "Test response"]
+    assert mock_llama.call_count == 2
+    
+    # Unloading stops the batch worker
+    manager.unload_model("test-model")
+    assert "test-model" not in manager._generation_workers
+
+
+@pytest.mark.asyncio
+async def test_load_model_force_download_closes_loaded_model(temp_model_dir):
+    """Test that a forced reload closes the model it replaces."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add test model config and a loaded model
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    old_model = MagicMock()
+    new_model = MagicMock()
+    manager.models["test-model"] = old_model
+    
+    # Mock dependencies
+    with patch("app.ml.llm.model_manager.Llama", return_value=new_model), \
+         patch.object(manager, "_download_model", AsyncMock()), \
+         patch("app.ml.llm.model_manager.os.path.exists", return_value=True):
+        
+        # Reload model
+        model = await manager.load_model("test-model", force_download=True)
+    
+    # Verify the old model was closed and replaced
+    old_model.close.assert_called_once()
+    assert model is new_model
+    assert manager.models["test-model"] is new_model
+
+
+def test_get_free_gpu_memory_warns_once(temp_model_dir, caplog):
+    """Test that a missing GPU probe is only logged once."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Probe without torch
+    with patch.dict("sys.modules", {"torch": None}), \
+         patch("app.ml.llm.model_manager._gpu_probe_warned", False):
+        assert manager._get_free_gpu_memory() is None
+        assert manager._get_free_gpu_memory() is None
+    
+    # Verify one warning was logged
+    warnings = [r for r in caplog.records if "Could not probe GPU memory" in r.getMessage()]
+    assert len(warnings) == 1
+
+
 def test_unload_model(temp_model_dir):
     """Test unloading a model."""
     # Create model manager
@@ -203,9 +708,49 @@ def test_unload_model(temp_model_dir):
     with patch("app.ml.llm.model_manager.gc.collect") as mock_gc:
         manager.unload_model("test-model")
     
-    # Verify model was unloaded
+    # Verify model was unloaded without a full collection
     assert "test-model" not in manager.models
-    mock_gc.assert_called_once()
+    mock_model.close.assert_called_once()
+    mock_gc.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_unload_model_waits_for_in_flight_generation(temp_model_dir):
+    """Test that a model is only closed once a running generation returns."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Add mock model whose generation blocks until released
+    started = threading.Event()
+    release = threading.Event()
+    
+    def generate(**kwargs):
+        started.set()
+        release.wait(5)
+        return {"choices": [{"text": "Test response"}]}
+    
+    mock_model = MagicMock(side_effect=generate)
+    manager.models["test-model"] = mock_model
+    
+    # Start generating and wait for the model call to begin
+    generation = asyncio.create_task(
+        manager.generate(model_name="test-model", prompt="Test prompt")
+    )
+    await asyncio.to_thread(started.wait, 5)
+    
+    # Unload model while the call is still running
+    manager.unload_model("test-model")
+    await asyncio.sleep(0)
+    
+    # Verify the model is only closed after the call returns
+    mock_model.close.assert_not_called()
+    release.set()
+    await manager._closing_models["test-model"]
+    mock_model.close.assert_called_once()
+    
+    # Verify the waiting caller was failed
+    with pytest.raises(RuntimeError):
+        await generation
 
 
 def test_unload_all_models(temp_model_dir):
@@ -225,7 +770,49 @@ def test_unload_all_models(temp_model_dir):
     
     # Verify models were unloaded
     assert len(manager.models) == 0
-    assert mock_gc.call_count == 2
+    mock_model1.close.assert_called_once()
+    mock_model2.close.assert_called_once()
+    mock_gc.assert_called_once()
+
+
+def test_models_for_tier(temp_model_dir):
+    """Test tier lookups against the built-in and registered model configs."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    
+    # Verify tier listings
+    assert manager.get_models_for_tier("lite") == []
+    assert manager.get_models_for_tier("standard") == ["phi-4-multimodal"]
+    assert manager.get_models_for_tier("professional") == [
+        "llama-3-8b", "mistral-7b", "phi-4-multimodal"
+    ]
+    assert manager.get_models_for_tier("unknown") == []
+    
+    # Verify tier membership
+    assert manager.is_model_available_for_tier("phi-4-multimodal", "standard")
+    assert not manager.is_model_available_for_tier("llama-3-8b", "standard")
+    assert manager.is_model_available_for_tier("llama-3-8b", "professional")
+    assert not manager.is_model_available_for_tier("llama-3-8b", "lite")
+    
+    # Registering a model on one instance leaves the built-in configs alone
+    manager.register_model("test-model", {})
+    assert "test-model" not in ModelManager(model_dir=temp_model_dir).model_configs
+    
+    # Verify registered models are available for their tiers
+    manager.register_model("test-standard-model", {"tier": "standard"})
+    assert manager.is_model_available_for_tier("test-model", "professional")
+    assert not manager.is_model_available_for_tier("test-model", "standard")
+    assert manager.get_models_for_tier("standard") == [
+        "phi-4-multimodal", "test-standard-model"
+    ]
+    assert manager.get_models_for_tier("professional")[-2:] == [
+        "test-model", "test-standard-model"
+    ]
+    
+    # Verify re-registering a model moves it between tiers
+    manager.register_model("test-standard-model", {"tier": "professional"})
+    assert manager.get_models_for_tier("standard") == ["phi-4-multimodal"]
+    assert manager.get_models_for_tier("professional").count("test-standard-model") == 1
 
 
 def test_get_available_models(temp_model_dir):
@@ -246,6 +833,30 @@ def test_get_available_models(temp_model_dir):
     assert "test-model-1" in models
     assert "test-model-2" in models
     assert len(models) == 2
+    assert manager.list_available_models() == ["test-model-1", "test-model-2"]
+
+
+def test_get_available_models_no_copy(temp_model_dir):
+    """Test that available models are a live view rather than a copy."""
+    # Create model manager
+    manager = ModelManager(model_dir=temp_model_dir)
+    available_models = manager.get_available_models()
+    
+    # Verify the view is not a copy
+    assert isinstance(available_models, KeysView)
+    assert "test-model" not in available_models
+    
+    # Register a model after taking the view
+    manager.model_configs["test-model"] = {
+        "repo_id": "test/model",
+        "filename": "test-model.gguf",
+        "type": "llama",
+        "context_length": 4096,
+        "batch_size": 512,
+    }
+    
+    # Verify the view shows the new model
+    assert "test-model" in available_models
 
 
 def test_get_loaded_models(temp_model_dir):
@@ -8,6 +8,7 @@ import json
 import os
 import tempfile
 import pytest
+from jinja2 import Template
 from unittest.mock import MagicMock, patch
 
 from app.ml.llm.prompt_manager import PromptManager
@@ -32,6 +33,17 @@ def test_init_with_built_in_templates():
     assert "validation" in manager.templates
 
 
+def test_builtin_templates_precompiled():
+    """Test that prompt managers share the built-in templates compiled at import."""
+    # Create two prompt managers
+    first = PromptManager()
+    second = PromptManager()
+    
+    # Verify the compiled templates are shared
+    assert first._compiled["field_extraction"] is second._compiled["field_extraction"]
+    assert first._compile_template("field_extraction") is second._compile_template("field_extraction")
+
+
 def test_init_with_templates_dir(temp_templates_dir):
     """Test initializing with templates directory."""
     # Create test template file
@@ -62,6 +74,81 @@ def test_render_template():
     assert rendered == "Hello, World!"
 
 
+def test_render_template_formats_structured_values():
+    """Test that dict and list variables are rendered as JSON."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    # Add and render test template
+    manager.add_template("test_template", "Data: {{ data }}")
+    rendered = manager.render_template("test_template", {"data": {"items": [1, 2]}})
+    
+    # Verify rendered template
+    assert rendered == "Data: " + json.dumps({"items": [1, 2]}, indent=2)
+
+
+def test_render_jinja_template_gets_structured_values():
+    """Test that Jinja templates receive dict and list variables unconverted."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    # Add and render a template looping over a list of dicts
+    manager.add_template(
+        "test_template",
+        "{% for field in fields %}{{ field.name }};{% endfor %}",
+    )
+    rendered = manager.render_template(
+        "test_template",
+        {"fields": [{"name": "invoice_number"}, {"name": "date"}]},
+    )
+    
+    # Verify rendered template
+    assert rendered == "invoice_number;date;"
+
+
+def test_render_template_reuses_compiled_template():
+    """Test that templates are compiled once and recompiled when changed."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    # Add and render test template twice
+    manager.add_template("test_template", "Hello, {{ name }}!")
+    compiled = manager._compile_template("test_template")
+    manager.render_template("test_template", {"name": "World"})
+    
+    # Verify the compiled template was reused
+    assert manager._compile_template("test_template") is compiled
+    
+    # Replace the template source
+    manager.templates["test_template"] = "Goodbye, {{ name }}!"
+    
+    # Verify the new source is rendered
+    assert manager.render_template("test_template", {"name": "World"}) == "Goodbye, World!"
+
+
+def test_render_simple_template_matches_jinja():
+    """Test that templates rendered without Jinja match Jinja's output."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    variables = {
+        "document_text": "Invoice #123",
+        "document_type": None,
+        "fields_to_extract": 42,
+    }
+    
+    # Verify every built-in template takes the fast path and renders the same
+    for template_name, template_content in manager.templates.items():
+        assert not isinstance(manager._compile_template(template_name), Template)
+        assert manager.render_template(template_name, variables) == \
+            Template(template_content).render(**variables)
+    
+    # Verify templates with Jinja logic still use Jinja
+    manager.add_template("test_template", "{% if name %}Hello, {{ name | upper }}!{% endif %}")
+    assert isinstance(manager._compile_template("test_template"), Template)
+    assert manager.render_template("test_template", {"name": "World"}) == "Hello, WORLD!"
+
+
 def test_render_template_unknown():
     """Test rendering an unknown template."""
     # Create prompt manager
@@ -145,6 +232,63 @@ def test_format_json_for_prompt():
     assert formatted == json.dumps({"key": "value"}, indent=2)
 
 
+def test_format_json_for_prompt_is_canonical():
+    """Test that equal data formats the same regardless of key order."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    # Format equal dicts built in different orders
+    first = manager.format_json_for_prompt({"b": 1, "a": {"d": 2, "c": 3}})
+    second = manager.format_json_for_prompt({"a": {"c": 3, "d": 2}, "b": 1})
+    
+    # Verify formatted JSON
+    assert first == second
+    assert first == json.dumps({"a": {"c": 3, "d": 2}, "b": 1}, indent=2, sort_keys=True)
+
+
+def test_format_json_roundtrip():
+    """Test that nested data formats like the json module and parses back unchanged."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    data = {
+        "line_items": [
+            {"description": "Café au lait", "quantity": 2, "unit_price": 3.5},
+            {"description": "Service", "quantity": 1, "unit_price": None},
+        ],
+        "totals": {"net": 7.0, "tax": {"rate": 0.2, "exempt": False}},
+        "tags": [],
+    }
+    
+    # Format and parse JSON
+    formatted = manager.format_json_for_prompt(data)
+    
+    # Verify formatted JSON and round trip
+    assert formatted == json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
+    assert manager.parse_json_from_response(formatted) == data
+
+
+def test_find_json_end():
+    """Test finding the end of the first complete JSON value."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    # Complete value followed by text
+    response = 'Result: {"key": "value"} done'
+    assert response[:manager.find_json_end(response)] == 'Result: {"key": "value"}'
+    
+    # Incomplete value and no value at all
+    assert manager.find_json_end('{"key": "val') == -1
+    assert manager.find_json_end("no json here") == -1
+    
+    # Bracketed prose and unparseable braces before the object are skipped
+    response = 'Result [1]: {"key": "value"}'
+    assert response[:manager.find_json_end(response)] == response
+    assert manager.find_json_end('Result [1]: {"key": ') == -1
+    response = 'Set {x}: {"key": "value"}'
+    assert response[:manager.find_json_end(response)] == response
+
+
 def test_parse_json_from_response_valid():
     """Test parsing JSON from a valid response."""
     # Create prompt manager
@@ -181,6 +325,20 @@ def test_parse_json_from_response_array():
     assert parsed == ["item1", "item2"]
 
 
+def test_parse_json_from_response_balanced():
+    """Test parsing embedded JSON followed by text containing brackets."""
+    # Create prompt manager
+    manager = PromptManager()
+    
+    # Parse JSON
+    parsed = manager.parse_json_from_response(
+        'Result: {"key": "a } in a string", "nested": {"list": [1, 2]}} and {more}'
+    )
+    
+    # Verify parsed JSON
+    assert parsed == {"key": "a } in a string", "nested": {"list": [1, 2]}}
+
+
 def test_parse_json_from_response_invalid():
     """Test parsing JSON from an invalid response."""
     # Create prompt manager
@@ -0,0 +1,111 @@
+"""
+Tests for the layout processor.
+
+This module contains tests for the layout processor.
+"""
+
+import pytest
+
+from app.ml.processors.layout_processor import SPARSE_WORD_THRESHOLD, LayoutProcessor
+
+
+def _word_boxes(words):
+    """
+    Build OCRProcessor word box columns from (text, left, top) tuples.
+
+    Every word is 40 wide and 10 high, with full confidence.
+    """
+    return {
+        "text": [text for text, _, _ in words],
+        "left": [left for _, left, _ in words],
+        "top": [top for _, _, top in words],
+        "width": [40] * len(words),
+        "height": [10] * len(words),
+        "conf": [100] * len(words),
+    }
+
+
+@pytest.mark.asyncio
+async def test_analyze_word_boxes():
+    """Test analyzing a page given as word box columns."""
+    # Create layout processor
+    processor = LayoutProcessor(sparse_bypass=False)
+
+    # Two lines close together, then a line far below them
+    page = {
+        "text": "Invoice INV-12345\nDate 2023-05-10\nTotal 1250.00",
+        "word_boxes": _word_boxes([
+            ("INV-12345", 60, 12),
+            ("Invoice", 10, 10),
+            ("Date", 10, 25),
+            ("2023-05-10", 60, 25),
+            ("Total", 10, 100),
+            ("1250.00", 60, 100),
+        ]),
+        "page": 2,
+    }
+
+    # Analyze layout
+    result = await processor.process("test_document.png", page)
+
+    # Verify words were grouped into lines and blocks in reading order
+    assert result["page"] == 2
+    assert [block["text"] for block in result["blocks"]] == [
+        "Invoice INV-12345\nDate 2023-05-10",
+        "Total 1250.00",
+    ]
+    assert [block["type"] for block in result["blocks"]] == ["Paragraph", "Header"]
+
+    # Verify the word dicts built from the columns
+    word = result["blocks"][0]["lines"][0]["words"][0]
+    assert word == {
+        "text": "Invoice",
+        "bbox": {"left": 10, "top": 10, "width": 40, "height": 10, "page": 2},
+        "conf": 100,
+    }
+
+    # Verify the merged block bounding box
+    assert result["blocks"][0]["bbox"] == {
+        "left": 10, "top": 10, "width": 90, "height": 25, "page": 2,
+    }
+
+
+@pytest.mark.asyncio
+async def test_analyze_sparse_page():
+    """Test that sparse pages become a single paragraph."""
+    # Create layout processor
+    processor = LayoutProcessor()
+
+    # Words on lines far apart, fewer than the sparse threshold
+    page = {
+        "word_boxes": _word_boxes([("Total", 10, 100), ("Invoice", 10, 10)]),
+        "page": 1,
+    }
+    assert len(page["word_boxes"]["text"]) < SPARSE_WORD_THRESHOLD
+
+    # Analyze layout
+    result = await processor.process("test_document.png", page)
+
+    # Verify one paragraph in reading order
+    assert len(result["blocks"]) == 1
+    assert result["blocks"][0]["type"] == "Paragraph"
+    assert result["blocks"][0]["text"] == "Invoice Total"
+
+
+@pytest.mark.asyncio
+async def test_analyze_pdf_extractor_pages():
+    """Test analyzing PDFExtractor pages, which carry a word count and no boxes."""
+    # Create layout processor
+    processor = LayoutProcessor()
+
+    # Pages as returned by PDFExtractor
+    text_result = {
+        "text": "Invoice INV-12345",
+        "pages": [{"text": "Invoice INV-12345", "page": 1, "word_count": 2}],
+    }
+
+    # Analyze layout
+    result = await processor.process("test_document.pdf", text_result)
+
+    # Verify the page was analyzed without word boxes
+    assert result == {"blocks": [], "pages": [{"blocks": [], "page": 1}]}
@@ -0,0 +1,167 @@
+"""
+Tests for the OCR processor.
+
+This module contains tests for the OCR processor.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from PIL import Image
+
+from app.ml.processors.ocr_processor import (
+    WORD_BOX_KEYS,
+    OCRProcessor,
+    _pdf_result_cache,
+)
+
+
+# Tesseract word data for two lines of one paragraph, with the empty entries
+# Tesseract reports for blocks, paragraphs and lines
+WORD_DATA = {
+    "text": ["", "Invoice", "INV-12345", "", "Total", "1250.00"],
+    "left": [0, 10, 80, 0, 10, 80],
+    "top": [0, 10, 10, 0, 40, 40],
+    "width": [200, 60, 90, 200, 50, 70],
+    "height": [60, 12, 12, 20, 12, 12],
+    "conf": [-1, 96, 91, -1, 95, 93],
+    "block_num": [1, 1, 1, 1, 1, 1],
+    "par_num": [1, 1, 1, 1, 1, 1],
+    "line_num": [0, 1, 1, 2, 2, 2],
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_pdf_result_cache():
+    """Clear the PDF result cache so tests don't see each other's results."""
+    _pdf_result_cache.clear()
+    yield
+    _pdf_result_cache.clear()
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """Create a PDF file to hash."""
+    path = tmp_path / "test_document.pdf"
+    path.write_bytes(b"%PDF-1.4 test document")
+    return str(path)
+
+
+def test_run_tesseract_word_boxes():
+    """Test that recognized words are returned as word box columns."""
+    # Create OCR processor
+    processor = OCRProcessor()
+
+    # Run Tesseract on an inked page
+    image = Image.new("L", (100, 100), color=0)
+    with patch("app.ml.processors.ocr_processor.pytesseract.image_to_data", return_value=WORD_DATA):
+        result = processor._run_tesseract(image, page_num=2)
+
+    # Verify the output schema
+    assert set(result) == {"text", "word_boxes", "page"}
+    assert result["page"] == 2
+    assert tuple(result["word_boxes"]) == WORD_BOX_KEYS
+
+    # Verify empty entries were dropped and the columns line up
+    assert result["word_boxes"]["text"] == ["Invoice", "INV-12345", "Total", "1250.00"]
+    assert result["word_boxes"]["left"] == [10, 80, 10, 80]
+    assert result["word_boxes"]["top"] == [10, 10, 40, 40]
+    assert result["word_boxes"]["conf"] == [96, 91, 95, 93]
+
+    # Verify the text was rebuilt line by line
+    assert result["text"] == "Invoice INV-12345\nTotal 1250.00"
+
+
+def test_run_tesseract_skips_blank_page():
+    """Test that blank pages skip Tesseract."""
+    # Create OCR processor
+    processor = OCRProcessor()
+
+    # Run Tesseract on a blank page
+    image = Image.new("L", (100, 100), color=255)
+    with patch("app.ml.processors.ocr_processor.pytesseract.image_to_data") as mock_image_to_data:
+        result = processor._run_tesseract(image, page_num=1)
+
+    # Verify Tesseract was skipped and the schema kept
+    mock_image_to_data.assert_not_called()
+    assert result == {
+        "text": "",
+        "word_boxes": {key: [] for key in WORD_BOX_KEYS},
+        "page": 1,
+    }
+
+
+def test_run_tesseract_blank_page_skip_disabled():
+    """Test that blank pages are OCR'd when skipping is disabled."""
+    # Create OCR processor
+    processor = OCRProcessor(skip_blank_pages=False)
+
+    # Run Tesseract on a blank page
+    image = Image.new("L", (100, 100), color=255)
+    with patch("app.ml.processors.ocr_processor.pytesseract.image_to_data", return_value=WORD_DATA) as mock_image_to_data:
+        processor._run_tesseract(image, page_num=1)
+
+    # Verify Tesseract ran
+    mock_image_to_data.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_process_pdf_reuses_cached_result(pdf_path):
+    """Test that an identical PDF is not rendered or OCR'd again."""
+    # Create OCR processor
+    processor = OCRProcessor(max_concurrency=2)
+    processor._process_pil_image = AsyncMock(
+        side_effect=lambda image, page_num: {"text": f"Page {page_num}", "page": page_num}
+    )
+
+    # Mock dependencies
+    with patch("app.ml.processors.ocr_processor.pdfinfo_from_path", return_value={"Pages": 2}), \
+         patch("app.ml.processors.ocr_processor.convert_from_path", return_value=[MagicMock(), MagicMock()]) as mock_convert:
+
+        # Process the PDF twice, changing the first result in between
+        result = await processor.process(pdf_path)
+        result["pages"].clear()
+        cached_result = await processor.process(pdf_path)
+
+    # Verify the second run was served from the cache, unaffected by the change
+    mock_convert.assert_called_once()
+    assert processor._process_pil_image.call_count == 2
+    assert cached_result["text"] == "Page 1\n\nPage 2"
+    assert [page["page"] for page in cached_result["pages"]] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_process_pdf_cache_key_and_eviction(pdf_path, tmp_path):
+    """Test that cached results are keyed by content and settings, and evicted LRU."""
+    other_pdf_path = tmp_path / "other_document.pdf"
+    other_pdf_path.write_bytes(b"%PDF-1.4 other document")
+
+    # Create OCR processors with different blank page settings
+    processor = OCRProcessor()
+    processor_no_skip = OCRProcessor(skip_blank_pages=False)
+    for p in (processor, processor_no_skip):
+        p._process_pil_image = AsyncMock(return_value={"text": "Page 1", "page": 1})
+
+    # Mock dependencies, with room for one cached result
+    with patch("app.ml.processors.ocr_processor.PDF_RESULT_CACHE_SIZE", 1), \
+         patch("app.ml.processors.ocr_processor.pdfinfo_from_path", return_value={"Pages": 1}), \
+         patch("app.ml.processors.ocr_processor.convert_from_path", return_value=[MagicMock()]) as mock_convert:
+
+        # The same file under other settings is a miss
+        await processor.process(pdf_path)
+        await processor_no_skip.process(pdf_path)
+        assert mock_convert.call_count == 2
+
+        # A copy of the file under another name is a hit
+        copy_path = tmp_path / "copy.pdf"
+        copy_path.write_bytes(b"%PDF-1.4 test document")
+        await processor_no_skip.process(str(copy_path))
+        assert mock_convert.call_count == 2
+
+        # Another file evicts the only cached result
+        await processor_no_skip.process(str(other_pdf_path))
+        await processor_no_skip.process(pdf_path)
+        assert mock_convert.call_count == 4
+
+    # Verify the cache stayed within its size
+    assert len(_pdf_result_cache) == 1
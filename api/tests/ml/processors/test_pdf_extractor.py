@@ -0,0 +1,44 @@
+"""
+Tests for the PDF extractor.
+
+This module contains tests for the PDF extractor.
+"""
+
+import pytest
+
+from app.ml.processors.pdf_extractor import PDFExtractor
+
+
+def test_process_extracted_text():
+    """Test the result schema built from Marker's page texts."""
+    # Create PDF extractor
+    extractor = PDFExtractor()
+
+    # Process page texts
+    result = extractor._process_extracted_text(
+        ["Invoice INV-12345\nDate 2023-05-10", ""],
+        "test_document.pdf",
+    )
+
+    # Verify result
+    assert result == {
+        "text": "Invoice INV-12345\nDate 2023-05-10\n\n",
+        "pages": [
+            {"text": "Invoice INV-12345\nDate 2023-05-10", "page": 1, "word_count": 4},
+            {"text": "", "page": 2, "word_count": 0},
+        ],
+        "num_pages": 2,
+        "extraction_method": "marker-marker-base",
+    }
+
+
+@pytest.mark.asyncio
+async def test_process_rejects_other_formats():
+    """Test that only PDFs are accepted."""
+    # Create PDF extractor
+    extractor = PDFExtractor()
+
+    # Verify other formats are rejected before Marker is loaded
+    with pytest.raises(ValueError, match="Expected PDF file"):
+        await extractor.process("test_document.png")
+    assert extractor.model is None
@@ -9,19 +9,45 @@ import datetime
 import json
 import os
 import pytest
+from contextlib import nullcontext
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from sqlalchemy.orm import Session
 
 from app.models.document import Document
 from app.services.document_processor import (
+    close_callback_client,
     process_document,
     process_document_async,
     get_processing_status,
     _execute_workflow_background,
+    _send_callback,
+    get_document_preprocessor,
+    get_pdf_extractor,
+    get_ocr_processor,
+    get_layout_processor,
+    _get_extraction_agent_pool,
+    shutdown_extraction_agents,
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_processor_cache():
+    """Clear the shared processors so patched classes are used."""
+    getters = [
+        get_document_preprocessor,
+        get_pdf_extractor,
+        get_ocr_processor,
+        get_layout_processor,
+        _get_extraction_agent_pool,
+    ]
+    for getter in getters:
+        getter.cache_clear()
+    yield
+    for getter in getters:
+        getter.cache_clear()
+
+
 @pytest.fixture
 def mock_db_session():
     """Create a mock database session."""
@@ -47,6 +73,7 @@ async def test_process_document():
     with patch("app.services.document_processor.DocumentPreprocessor") as mock_preprocessor_class, \
          patch("app.services.document_processor.PDFExtractor") as mock_pdf_extractor_class, \
          patch("app.services.document_processor.LayoutProcessor") as mock_layout_processor_class, \
+         patch("app.services.workflow_service.get_model_manager"), \
          patch("app.services.document_processor.ExtractionAgent") as mock_extraction_agent_class:
         
         # Set up mock returns
@@ -98,11 +125,14 @@ async def test_process_document():
         )
     
     # Verify processors were called
-    mock_preprocessor.process.assert_called_once_with("test_document.pdf")
+    mock_preprocessor.process.assert_called_once_with("test_document.pdf", strategy="fast")
     mock_pdf_extractor.process.assert_called_once_with("test_document.pdf")
     mock_layout_processor.process.assert_called_once()
     mock_extraction_agent.extract.assert_called_once()
     
+    # Verify the pooled agent's context was dropped before it was returned
+    mock_extraction_agent.reasoning_engine.clear_context.assert_called_once()
+    
     # Verify result
     assert result["document_type"] == "invoice"
     assert "fields" in result
@@ -110,6 +140,40 @@ async def test_process_document():
     assert "confidence" in result
 
 
+def test_processors_are_shared():
+    """Test that processors are created once and reused."""
+    with patch("app.services.document_processor.OCRProcessor") as mock_ocr_processor_class:
+        ocr_processor = get_ocr_processor()
+        
+        # Verify the same processor is returned
+        assert get_ocr_processor() is ocr_processor
+    
+    mock_ocr_processor_class.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_extraction_agents_share_model_manager():
+    """Test that pooled agents use the workflow executors' model manager and shut down."""
+    with patch("app.services.workflow_service.get_model_manager") as mock_get_model_manager, \
+         patch("app.services.document_processor.ExtractionAgent") as mock_extraction_agent_class:
+        mock_extraction_agent_class.return_value.reasoning_engine.shutdown = AsyncMock()
+        
+        pool = _get_extraction_agent_pool()
+        
+        # Verify every agent got the shared model manager
+        for call in mock_extraction_agent_class.call_args_list:
+            assert call.kwargs["model_manager"] is mock_get_model_manager.return_value
+        
+        # Shut down the pool
+        await shutdown_extraction_agents()
+    
+    # Verify every agent was shut down and the pool dropped
+    agent = mock_extraction_agent_class.return_value
+    assert agent.reasoning_engine.shutdown.await_count == mock_extraction_agent_class.call_count
+    assert pool.empty()
+    assert _get_extraction_agent_pool.cache_info().currsize == 0
+
+
 @pytest.mark.asyncio
 async def test_process_document_async(mock_db_session, mock_document):
     """Test processing a document asynchronously."""
@@ -119,7 +183,7 @@ async def test_process_document_async(mock_db_session, mock_document):
     # Mock create_workflow
     with patch("app.services.document_processor.create_workflow") as mock_create_workflow, \
          patch("app.services.document_processor.asyncio.create_task") as mock_create_task, \
-         patch("app.services.document_processor.get_db", return_value=iter([mock_db_session])):
+         patch("app.db.session.session_scope", return_value=nullcontext(mock_db_session)):
         
         mock_create_workflow.return_value = "test_workflow"
         
@@ -137,6 +201,7 @@ async def test_process_document_async(mock_db_session, mock_document):
         template_id="test_template",
         options={"option1": "value1"},
         db=mock_db_session,
+        document=mock_document,
     )
     
     # Verify create_task was called
@@ -146,11 +211,39 @@ async def test_process_document_async(mock_db_session, mock_document):
     assert workflow_id == "test_workflow"
 
 
+@pytest.mark.asyncio
+async def test_process_document_async_request_session(mock_db_session, mock_document):
+    """Test that processing with a request's session and document opens no other session."""
+    # Mock create_workflow
+    with patch("app.services.document_processor.create_workflow") as mock_create_workflow, \
+         patch("app.services.document_processor.asyncio.create_task"), \
+         patch("app.db.session.session_scope") as mock_session_scope:
+        
+        mock_create_workflow.return_value = "test_workflow"
+        
+        # Process document asynchronously
+        workflow_id = await process_document_async(
+            document_path="test_document.pdf",
+            db=mock_db_session,
+            document=mock_document,
+        )
+    
+    # Verify the request's session was used as is
+    mock_session_scope.assert_not_called()
+    mock_db_session.query.assert_not_called()
+    assert mock_create_workflow.call_args.kwargs["db"] is mock_db_session
+    assert mock_create_workflow.call_args.kwargs["document"] is mock_document
+    
+    # Verify result
+    assert workflow_id == "test_workflow"
+
+
 @pytest.mark.asyncio
 async def test_execute_workflow_background():
     """Test executing a workflow in the background."""
-    # Mock execute_workflow
-    with patch("app.services.document_processor.execute_workflow") as mock_execute_workflow:
+    # Mock execute_workflow and the callback
+    with patch("app.services.document_processor.execute_workflow") as mock_execute_workflow, \
+         patch("app.services.document_processor._send_callback") as mock_send_callback:
         mock_execute_workflow.return_value = {"status": "completed"}
         
         # Execute workflow in background
@@ -161,6 +254,71 @@ async def test_execute_workflow_background():
     
     # Verify execute_workflow was called
     mock_execute_workflow.assert_called_once_with("test_workflow")
+    
+    # Verify the callback was sent
+    mock_send_callback.assert_called_once_with(
+        "http://example.com/callback",
+        {"workflow_id": "test_workflow", "status": "completed"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_execute_workflow_background_backpressure():
+    """Test that background workflows beyond the limit wait for a free slot."""
+    running = 0
+    peak = 0
+    
+    # Track how many workflows execute at once
+    async def execute_workflow(workflow_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"status": "completed"}
+    
+    with patch("app.services.document_processor._workflow_semaphore", asyncio.Semaphore(2)), \
+         patch("app.services.workflow_service.execute_workflow", side_effect=execute_workflow) as mock_execute_workflow:
+        
+        # Start more workflows than there are slots
+        await asyncio.gather(*(
+            _execute_workflow_background(workflow_id=f"test_workflow_{i}")
+            for i in range(8)
+        ))
+    
+    # Verify every workflow ran, at most two at a time
+    assert mock_execute_workflow.call_count == 8
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_send_callback_retries_server_errors():
+    """Test that callbacks are retried on server errors."""
+    responses = [MagicMock(status_code=503), MagicMock(status_code=200)]
+    
+    with patch("app.services.document_processor._callback_client") as mock_client, \
+         patch("app.services.document_processor.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+        mock_client.post = AsyncMock(side_effect=responses)
+        
+        # Send callback
+        await _send_callback("http://example.com/callback", {"status": "completed"})
+    
+    # Verify the callback was retried once
+    assert mock_client.post.call_count == 2
+    mock_sleep.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_close_callback_client():
+    """Test that the callback client is closed on shutdown."""
+    with patch("app.services.document_processor._callback_client") as mock_client:
+        mock_client.aclose = AsyncMock()
+        
+        # Close the client
+        await close_callback_client()
+    
+    # Verify the connections were closed
+    mock_client.aclose.assert_awaited_once()
 
 
 @pytest.mark.asyncio
@@ -203,7 +361,7 @@ async def test_get_processing_status_document(mock_db_session, mock_document):
     
     # Mock get_workflow_status
     with patch("app.services.document_processor.get_workflow_status") as mock_get_workflow_status, \
-         patch("app.services.document_processor.get_db", return_value=iter([mock_db_session])):
+         patch("app.db.session.session_scope", return_value=nullcontext(mock_db_session)):
         
         mock_get_workflow_status.return_value = {"status": "not_found"}
         
@@ -218,3 +376,30 @@ async def test_get_processing_status_document(mock_db_session, mock_document):
     assert status["document_id"] == "test_document"
     assert status["status"] == "completed"
     assert status["extraction_status"] == "success"
+
+
+@pytest.mark.asyncio
+async def test_get_processing_status_request_session(mock_db_session, mock_document):
+    """Test that the document fallback uses the request's session."""
+    # Set up mocks
+    mock_document.job_id = "test_job"
+    mock_document.created_at = None
+    mock_document.completed_at = None
+    
+    mock_db_session.query.return_value.filter.return_value.first.return_value = mock_document
+    
+    # Mock get_workflow_status
+    with patch("app.services.document_processor.get_workflow_status") as mock_get_workflow_status, \
+         patch("app.db.session.session_scope") as mock_session_scope:
+        
+        mock_get_workflow_status.return_value = {"status": "not_found"}
+        
+        # Get processing status
+        status = await get_processing_status("test_job", db=mock_db_session)
+    
+    # Verify the workflow status stays shared and no session was opened
+    mock_get_workflow_status.assert_called_once_with("test_job")
+    mock_session_scope.assert_not_called()
+    
+    # Verify result
+    assert status["document_id"] == "test_document"
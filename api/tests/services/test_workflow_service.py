@@ -11,8 +11,11 @@ import os
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from app.db.session import Base
 from app.models.document import Document
 from app.models.workflow import Workflow, Task, TaskStatus, TaskType, TaskDependency
 from app.services.workflow_service import (
@@ -21,6 +24,8 @@ from app.services.workflow_service import (
     get_workflow_status,
     _create_tasks,
     _create_task_dependencies,
+    _DEPENDENCY_EDGES,
+    _TASK_SPECS,
 )
 
 
@@ -31,6 +36,37 @@ def mock_db_session():
     return session
 
 
+@pytest.fixture
+def real_db_session():
+    """Create a session on an in-memory SQLite database with the app's tables."""
+    engine = create_engine(
+        "sqlite://",
+        # One shared connection, so worker threads see the same database
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def sql_statements(real_db_session):
+    """Record the SQL statements emitted through the real session."""
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    engine = real_db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
 @pytest.fixture
 def mock_document():
     """Create a mock document."""
@@ -62,8 +98,8 @@ async def test_create_workflow(mock_db_session, mock_document):
     # Set up mocks
     mock_db_session.query.return_value.filter.return_value.first.return_value = mock_document
     
-    # Mock UUID generation
-    with patch("uuid.uuid4", return_value=MagicMock(hex="1234567890")):
+    # Mock ID generation
+    with patch("app.services.workflow_service.token_hex", return_value="1234567890"):
         # Create workflow
         workflow_id = await create_workflow(
             document_id="test_document",
@@ -75,37 +111,58 @@ async def test_create_workflow(mock_db_session, mock_document):
     # Verify workflow was created
     assert workflow_id == "wf_1234567890"
     
-    # Verify workflow was added to database
+    # Verify workflow was added and tasks and dependencies were bulk inserted
     mock_db_session.add.assert_called()
-    mock_db_session.commit.assert_called()
+    assert mock_db_session.execute.call_count == 2
+    mock_db_session.commit.assert_called_once()
     
     # Verify document status was updated
     assert mock_document.status == "processing"
     assert mock_document.job_id == workflow_id
 
 
+@pytest.mark.asyncio
+async def test_create_workflow_with_loaded_document(mock_db_session, mock_document):
+    """Test creating a workflow for a document the caller already loaded."""
+    # Create workflow
+    workflow_id = await create_workflow(
+        document_id="test_document",
+        db=mock_db_session,
+        document=mock_document,
+    )
+    
+    # Verify the document was not looked up again
+    mock_db_session.query.assert_not_called()
+    assert mock_document.job_id == workflow_id
+
+
 @pytest.mark.asyncio
 async def test_execute_workflow(mock_db_session, mock_workflow):
     """Test executing a workflow."""
     # Set up mocks
     mock_db_session.query.return_value.filter.return_value.first.return_value = mock_workflow
     
-    # Mock workflow executor
-    with patch("app.services.workflow_service.WorkflowExecutor") as mock_executor_class:
-        mock_executor = mock_executor_class.return_value
-        mock_executor.execute_workflow = AsyncMock(return_value={"status": "completed"})
-        
+    # Mock workflow executor pool
+    mock_executor = MagicMock()
+    mock_executor.execute_workflow = AsyncMock(return_value={"status": "completed"})
+    executor_pool = asyncio.Queue()
+    executor_pool.put_nowait(mock_executor)
+    
+    with patch("app.services.workflow_service._get_executor_pool", return_value=executor_pool):
         # Execute workflow
         result = await execute_workflow(
             workflow_id="test_workflow",
             db=mock_db_session,
         )
     
-    # Verify workflow executor was created
-    mock_executor_class.assert_called_once_with(db_session=mock_db_session)
+    # Verify workflow was executed with the caller's session
+    mock_executor.execute_workflow.assert_called_once_with(
+        "test_workflow", db_session=mock_db_session
+    )
     
-    # Verify workflow was executed
-    mock_executor.execute_workflow.assert_called_once_with("test_workflow")
+    # Verify executor was returned to the pool without the session
+    assert executor_pool.get_nowait() is mock_executor
+    assert mock_executor.db_session is None
     
     # Verify result
     assert result == {"status": "completed"}
@@ -115,13 +172,13 @@ async def test_execute_workflow(mock_db_session, mock_workflow):
 async def test_get_workflow_status(mock_db_session, mock_workflow):
     """Test getting workflow status."""
     # Set up mocks
-    mock_workflow.tasks = [
-        MagicMock(status=TaskStatus.PENDING),
-        MagicMock(status=TaskStatus.RUNNING),
-        MagicMock(status=TaskStatus.COMPLETED),
-        MagicMock(status=TaskStatus.FAILED),
-    ]
     mock_db_session.query.return_value.filter.return_value.first.return_value = mock_workflow
+    mock_db_session.execute.return_value.all.return_value = [
+        (TaskStatus.PENDING, 1),
+        (TaskStatus.RUNNING, 1),
+        (TaskStatus.COMPLETED, 1),
+        (TaskStatus.FAILED, 1),
+    ]
     
     # Get workflow status
     status = await get_workflow_status(
@@ -141,6 +198,48 @@ async def test_get_workflow_status(mock_db_session, mock_workflow):
     assert status["progress"] == 25.0
 
 
+@pytest.mark.asyncio
+async def test_create_workflow_statement_count(real_db_session, sql_statements, mock_document):
+    """Test that creating a workflow inserts its rows in three statements."""
+    # Create workflow
+    workflow_id = await create_workflow(
+        document_id="test_document",
+        db=real_db_session,
+        document=mock_document,
+    )
+    
+    # Verify the workflow, its tasks and its dependencies took one insert each
+    inserts = [
+        statement for statement in sql_statements
+        if statement.lstrip().upper().startswith("INSERT")
+    ]
+    assert len(inserts) == 3
+    assert real_db_session.query(Task).filter(Task.workflow_id == workflow_id).count() == 8
+
+
+@pytest.mark.asyncio
+async def test_get_workflow_status_statement_count(real_db_session, sql_statements, mock_document):
+    """Test that the status of a workflow takes two queries however many tasks it has."""
+    # Create workflow
+    workflow_id = await create_workflow(
+        document_id="test_document",
+        db=real_db_session,
+        document=mock_document,
+    )
+    sql_statements.clear()
+    
+    # Get workflow status
+    status = await get_workflow_status(workflow_id=workflow_id, db=real_db_session)
+    
+    # Verify status
+    assert status["status"] == TaskStatus.PENDING.value
+    assert status["task_counts"]["total"] == 8
+    assert status["task_counts"]["pending"] == 8
+    
+    # Verify the workflow and the task counts took one query each
+    assert len(sql_statements) == 2
+
+
 def test_create_tasks():
     """Test creating tasks for a workflow."""
     # Create tasks
@@ -155,7 +254,7 @@ def test_create_tasks():
     assert len(tasks) == 8
     
     # Verify task types
-    task_types = [task.task_type for task in tasks]
+    task_types = [task["task_type"] for task in tasks]
     assert TaskType.PREPROCESS in task_types
     assert TaskType.EXTRACT_TEXT in task_types
     assert TaskType.ANALYZE_LAYOUT in task_types
@@ -167,35 +266,54 @@ def test_create_tasks():
     
     # Verify task parameters
     for task in tasks:
-        assert task.workflow_id == "test_workflow"
-        assert task.status == TaskStatus.PENDING
+        assert task["workflow_id"] == "test_workflow"
+        assert task["status"] == TaskStatus.PENDING
         
-        if task.task_type in [
+        if task["task_type"] in [
             TaskType.PREPROCESS,
             TaskType.EXTRACT_TEXT,
             TaskType.ANALYZE_LAYOUT,
         ]:
-            assert task.params["document_path"] == "test_document.pdf"
+            assert task["params"]["document_path"] == "test_document.pdf"
         
-        if task.task_type in [
+        if task["task_type"] in [
             TaskType.UNDERSTAND_DOCUMENT,
             TaskType.EXTRACT_FIELDS,
             TaskType.EXTRACT_TABLES,
         ]:
-            assert task.params["document_path"] == "test_document.pdf"
-            assert task.params["template_id"] == "test_template"
+            assert task["params"]["document_path"] == "test_document.pdf"
+            assert task["params"]["template_id"] == "test_template"
 
 
-def test_create_task_dependencies(mock_db_session):
-    """Test creating task dependencies."""
-    # Create tasks
-    tasks = _create_tasks(
-        workflow_id="test_workflow",
-        document_path="test_document.pdf",
-    )
+def test_create_tasks_spec_coverage():
+    """Test that the task specs cover each task type once."""
+    task_types = [task_type for _, task_type, _, _ in _TASK_SPECS]
     
+    # Verify task types
+    assert len(task_types) == 8
+    assert len(set(task_types)) == len(task_types)
+    
+    # Verify every dependency edge refers to a specified task
+    suffixes = {suffix for suffix, _, _, _ in _TASK_SPECS}
+    for dependent, dependency in _DEPENDENCY_EDGES:
+        assert dependent in suffixes
+        assert dependency in suffixes
+
+
+def test_create_task_dependencies():
+    """Test creating task dependencies."""
     # Create dependencies
-    _create_task_dependencies(tasks, mock_db_session)
+    dependencies = _create_task_dependencies("test_workflow")
+    
+    # Verify dependencies
+    assert len(dependencies) == 8
+    assert {
+        "dependent_task_id": "test_workflow_extract_text",
+        "dependency_task_id": "test_workflow_preprocess",
+    } in dependencies
     
-    # Verify dependencies were added to database
-    assert mock_db_session.add.call_count >= 8  # At least 8 dependencies
+    # Verify every dependency refers to a task of the workflow
+    task_ids = {task["id"] for task in _create_tasks("test_workflow", "test_document.pdf")}
+    for dependency in dependencies:
+        assert dependency["dependent_task_id"] in task_ids
+        assert dependency["dependency_task_id"] in task_ids
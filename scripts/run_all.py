@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Script to run all local model checks for Clary AI in one process.
+
+This script runs the model verification and the Reasoning Engine test on one
+event loop with a shared model manager, so the model is loaded only once.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Import Clary AI modules
+try:
+    from api.app.core.config import settings
+    from api.app.ml.llm.model_manager import ModelManager
+    from test_reasoning_engine import test_reasoning_engine
+    from verify_local_models import verify_models
+except ImportError as e:
+    logger.error(f"Error importing Clary AI modules: {e}")
+    logger.error("Make sure you're running this script from the project root directory.")
+    sys.exit(1)
+
+
+async def run_all():
+    """Run the model verification and the Reasoning Engine test with one model manager."""
+    model_dir = os.path.join(settings.MODEL_PATH, "llm")
+    os.makedirs(model_dir, exist_ok=True)
+    
+    # Share one model manager, so concurrent loads of the model wait for one
+    model_manager = ModelManager(model_dir=model_dir)
+    
+    try:
+        await asyncio.gather(
+            verify_models(model_manager=model_manager),
+            test_reasoning_engine(model_manager=model_manager),
+        )
+    finally:
+        # Unload models
+        model_manager.unload_all_models()
+    
+    logger.info("All checks complete.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all())
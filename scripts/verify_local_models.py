@@ -29,8 +29,31 @@ except ImportError as e:
     sys.exit(1)
 
 
-async def verify_models():
-    """Verify that local models are properly configured and can be loaded."""
+def _safe_stat(path):
+    """
+    Stat a file.
+    
+    Args:
+        path: Path of the file.
+        
+    Returns:
+        os.stat_result: File status, or None if the file does not exist.
+    """
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+async def verify_models(model_manager=None):
+    """
+    Verify that local models are properly configured and can be loaded.
+    
+    Args:
+        model_manager: Optional model manager shared with other checks. Its
+            models are left loaded for them; otherwise one is created and its
+            model unloaded at the end.
+    """
     logger.info("Verifying local model configuration...")
     
     # Check model directory
@@ -42,21 +65,31 @@ async def verify_models():
         os.makedirs(model_dir, exist_ok=True)
         logger.info(f"Created model directory: {model_dir}")
     
-    # Initialize model manager
-    model_manager = ModelManager(model_dir=model_dir)
+    # Initialize model manager unless one is shared
+    owns_model_manager = model_manager is None
+    if owns_model_manager:
+        model_manager = ModelManager(model_dir=model_dir)
     
     # Get available models
-    available_models = model_manager.get_available_models()
+    available_models = model_manager.list_available_models()
     logger.info(f"Available models: {available_models}")
     
-    # Check if model files exist
-    for model_name in available_models:
+    # Check if model files exist, statting them concurrently since each stat
+    # can be slow on a network filesystem
+    model_paths = [
+        os.path.join(model_dir, model_manager.model_configs[model_name]["filename"])
+        for model_name in available_models
+    ]
+    model_stats = await asyncio.gather(
+        *(asyncio.to_thread(_safe_stat, model_path) for model_path in model_paths)
+    )
+    
+    for model_name, model_path, model_stat in zip(available_models, model_paths, model_stats):
         config = model_manager.model_configs[model_name]
-        model_path = os.path.join(model_dir, config["filename"])
         
-        if os.path.exists(model_path):
+        if model_stat is not None:
             logger.info(f"Model file found: {model_path}")
-            logger.info(f"Model file size: {os.path.getsize(model_path) / (1024 * 1024):.2f} MB")
+            logger.info(f"Model file size: {model_stat.st_size / (1024 * 1024):.2f} MB")
         else:
             logger.warning(f"Model file not found: {model_path}")
             logger.info(f"Expected model file: {config['filename']}")
@@ -74,17 +107,20 @@ async def verify_models():
         # Test generation
         logger.info("Testing model generation...")
         prompt = "Hello, I am testing if you are working correctly. Please respond with a short greeting."
+        # A few greedy tokens are enough to show the model works
         response = await model_manager.generate(
             model_name=default_model,
             prompt=prompt,
-            max_tokens=50,
-            temperature=0.7,
+            max_tokens=8,
+            temperature=0.0,
+            top_p=1.0,
         )
         logger.info(f"Model response: {response}")
         
-        # Unload model
-        model_manager.unload_model(default_model)
-        logger.info(f"Model unloaded: {default_model}")
+        # Unload model unless it is shared
+        if owns_model_manager:
+            model_manager.unload_model(default_model)
+            logger.info(f"Model unloaded: {default_model}")
         
     except Exception as e:
         logger.error(f"Error loading model {default_model}: {e}")